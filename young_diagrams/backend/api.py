@@ -1,22 +1,36 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field
-from typing import Optional, Dict, List, Set, Union, Tuple
+from fastapi.responses import Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from typing import Any, Callable, Optional, Dict, List, Set, Union, Tuple
+import asyncio
 import json
-import os
-import uvicorn
+import math
 import numpy as np
-import io
+import os
+import secrets
 import base64
-from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
-import matplotlib.pyplot as plt
-from PIL import Image
 
-from diagrams2d import DiagramSimulator2D
-from diagrams3d import DiagramSimulator3D
 from common.utils import save_cells_to_file
+from common.jobs import JobManager, Job, JobQueueFull, JOB_FAILED, FINISHED_STATUSES
+from common.admission import DOWNGRADE, EXPENSIVE, REJECT, AdmissionController, CostModel
+from common.batch import MAX_BATCH_POINTS, Batch, expand_grid, point_key
+from common.cache import ResultCache, canonical_params, new_result_id, result_key
+from common.store import create_store
+from common.result import SimulationResult
+from common.compression import DEFAULT_MIN_SIZE, choose_encoding, compress, encoded_etag, etag_matches, make_etag
+from common.encoding import (FORMAT_MEDIA_TYPES, encode_json, encode_result, frontend_cells, negotiate_format,
+                             pack_binary)
+from common.limit_shape import (MAX_LIMIT_SHAPE_POINTS, encode_grid_json, get_limit_shape, get_limit_shape_image,
+                                height_summary, limit_shape_cache, limit_shape_points)
+from common.metrics import MetricsRegistry
+from common.profiling import PROFILE_ARTIFACTS
+from common.mesh import encode_mesh_json, get_surface, mesh_buffers, mesh_cache, mesh_info
+from common.streaming import stream_simulation
+from common.tiles import encode_tiles, get_pyramid, pyramid_cache
+from common.voxel_index import VoxelIndex, get_index
 
 # FastAPI app
 app = FastAPI(title="Young Diagrams API",
@@ -32,12 +46,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Максимальное время работы одной симуляции в секундах (ограничивает и time_budget из запроса)
+MAX_TIME_BUDGET = float(os.environ.get("YOUNG_MAX_TIME_BUDGET", "300"))
+
 # Модели данных для API
 class SimulationParams2D(BaseModel):
     steps: int = Field(100, ge=10, le=5000, description="Количество шагов симуляции")
     alpha: float = Field(1.0, ge=0.1, le=5.0, description="Параметр альфа для распределения")
     algorithm: str = Field("random", description="Алгоритм симуляции (random или plancherel)")
     runs: int = Field(1, ge=1, le=10, description="Количество повторений для агрегирования данных")
+    time_budget: Optional[float] = Field(None, gt=0, description="Ограничение времени симуляции в секундах")
+    request_id: Optional[str] = Field(None, max_length=64, description="Идентификатор запроса для отмены")
+    seed: Optional[int] = Field(None, ge=0, le=2**63 - 1, description="Зерно генератора случайных чисел")
+    reuse: bool = Field(True, description="Разрешить ответ готовым результатом с теми же параметрами, если seed не задан")
+    allow_downgrade: bool = Field(False, description="Разрешить уменьшить runs и steps при перегрузке вместо ответа 429")
+    profile: Optional[str] = Field(None, pattern="^(cprofile|sampling)$",
+                                   description="Выполнить под профилировщиком (cprofile или sampling); "
+                                               "файлы профиля сохраняются рядом с результатом")
 
 class SimulationParams3D(BaseModel):
     steps: int = Field(100, ge=10, le=5000, description="Количество шагов симуляции")
@@ -46,10 +71,350 @@ class SimulationParams3D(BaseModel):
     beta: Optional[float] = Field(1.0, ge=0.1, le=5.0, description="Параметр бета для распределения (для 3D)")
     gamma: Optional[float] = Field(1.0, ge=0.1, le=5.0, description="Параметр гамма для распределения (для 3D)")
     runs: int = Field(1, ge=1, le=10, description="Количество повторений для агрегирования данных")
+    time_budget: Optional[float] = Field(None, gt=0, description="Ограничение времени симуляции в секундах")
+    request_id: Optional[str] = Field(None, max_length=64, description="Идентификатор запроса для отмены")
+    seed: Optional[int] = Field(None, ge=0, le=2**63 - 1, description="Зерно генератора случайных чисел")
+    reuse: bool = Field(True, description="Разрешить ответ готовым результатом с теми же параметрами, если seed не задан")
+    allow_downgrade: bool = Field(False, description="Разрешить уменьшить runs и steps при перегрузке вместо ответа 429")
+    profile: Optional[str] = Field(None, pattern="^(cprofile|sampling)$",
+                                   description="Выполнить под профилировщиком (cprofile или sampling); "
+                                               "файлы профиля сохраняются рядом с результатом")
+
+# Минимальный размер тела ответа в байтах, начиная с которого оно сжимается
+COMPRESS_MIN_SIZE = int(os.environ.get("YOUNG_COMPRESS_MIN_BYTES", str(DEFAULT_MIN_SIZE)))
+
+# Пакет симуляций по сетке параметров: декартово произведение steps x alpha x runs
+class BatchParams2D(BaseModel):
+    steps: List[int] = Field(..., min_length=1, max_length=64, description="Значения числа шагов")
+    alpha: List[float] = Field(..., min_length=1, max_length=64, description="Значения параметра альфа")
+    runs: List[int] = Field([1], min_length=1, max_length=10, description="Значения числа повторений")
+    time_budget: Optional[float] = Field(None, gt=0, description="Ограничение времени каждой точки в секундах")
+    seed: Optional[int] = Field(None, ge=0, le=2**63 - 1, description="Зерно генератора для всех точек")
+    reuse: bool = Field(True, description="Разрешить ответ готовыми результатами с теми же параметрами")
+
+class BatchParams3D(BatchParams2D):
+    pass
+
+# Параметры выбора формата ответа с результатом (иначе формат выбирается по заголовку Accept)
+FORMAT_QUERY = Query(None, pattern="^(json|columnar|binary|msgpack)$",
+                     description="Формат ответа: json, columnar, binary или msgpack")
+LAYOUT_QUERY = Query("cells", pattern="^(cells|grid)$",
+                     description="Раскладка колонок: cells или grid (длины строк, только 2D)")
+RESULT_ID_QUERY = Query(None, max_length=128,
+                        description="Идентификатор результата; по умолчанию последний результат")
+
+# Метрики для /metrics; таймеры фаз и замер пиковой памяти задач включаются YOUNG_METRICS=1
+metrics = MetricsRegistry(enabled=os.environ.get("YOUNG_METRICS", "").lower() in ("1", "true", "yes"))
+
+# Очередь задач симуляции; вычисления выполняются в пуле процессов, а не в цикле событий
+job_manager = JobManager(max_workers=int(os.environ.get("YOUNG_JOB_WORKERS", "0")) or None,
+                         max_pending=int(os.environ.get("YOUNG_MAX_PENDING_JOBS", "64")),
+                         instrument=metrics.enabled)
+
+# Контроль допуска: дорогие симуляции выполняются в ограниченной полосе пула,
+# чтобы дешевые запросы не ждали за ними
+admission = AdmissionController(
+    CostModel(),
+    workers=job_manager.max_workers,
+    cheap_seconds=float(os.environ.get("YOUNG_CHEAP_SECONDS", "2")),
+    max_queue_wait=float(os.environ.get("YOUNG_MAX_QUEUE_WAIT", "120")),
+    target_latency=float(os.environ.get("YOUNG_TARGET_LATENCY", "5"))
+)
+job_manager.set_lane_limit(EXPENSIVE, admission.expensive_limit)
+
+# Общее для всех воркеров хранилище результатов (каталог на диске или memory://)
+result_store = create_store(os.environ.get("YOUNG_RESULT_STORE", "results_store"))
+
+# Кэш результатов по каноническим параметрам и зерну: LRU в памяти поверх хранилища
+result_cache = ResultCache(
+    result_store,
+    max_bytes=int(os.environ.get("YOUNG_CACHE_MEMORY_MB", "256")) * 1024 * 1024
+)
+
+# Задачи выполняющихся симуляций по request_id
+running_simulations: Dict[str, str] = {}
+
+# Как часто воркер проверяет в хранилище запросы отмены своих задач, поступившие через другие воркеры
+CANCEL_POLL_INTERVAL = float(os.environ.get("YOUNG_CANCEL_POLL_INTERVAL", "1"))
+
+
+def cached_result(dimension: int, params: Union[SimulationParams2D, SimulationParams3D]) -> Optional[SimulationResult]:
+    """Готовый результат с теми же параметрами (и зерном, если оно задано)"""
+    canonical = canonical_params(dimension, params.steps, params.alpha, params.runs)
+    if params.seed is not None:
+        return result_cache.get(result_key(canonical, params.seed))
+    if params.reuse:
+        return result_cache.find(canonical)
+    return None
+
+
+def submit_simulation(dimension: int, params: Union[SimulationParams2D, SimulationParams3D],
+                      allow_reject: bool = True, stream: bool = False) -> Job:
+    """Постановка симуляции в очередь задач или ответ готовым результатом из кэша"""
+    # Профиль и поток снимаются с настоящего вычисления, поэтому готовый результат не используется
+    fresh = bool(params.profile) or stream
+    cached = cached_result(dimension, params) if not fresh else None
+    if cached is None:
+        # Контроль допуска по оценке стоимости: сразу, в очередь полосы, упрощение или 429
+        decision = admission.decide(dimension, params.steps, params.runs, job_manager.lane_load(EXPENSIVE),
+                                    allow_downgrade=params.allow_downgrade, allow_reject=allow_reject)
+        if decision.action == REJECT:
+            raise HTTPException(status_code=429, detail=decision.reason,
+                                headers={"Retry-After": str(max(1, math.ceil(decision.retry_after)))})
+        if decision.action == DOWNGRADE:
+            params = params.model_copy(update={"steps": decision.steps, "runs": decision.runs})
+            cached = cached_result(dimension, params) if not fresh else None
+    
+    canonical = canonical_params(dimension, params.steps, params.alpha, params.runs)
+    if cached is not None:
+        job = job_manager.add_finished(dimension, dict(canonical, seed=cached.params.get("seed")), cached)
+        remember_result(job)
+        return job
+    
+    seed = params.seed if params.seed is not None else secrets.randbits(63)
+    time_limit = min(params.time_budget, MAX_TIME_BUDGET) if params.time_budget else MAX_TIME_BUDGET
+    job_params = dict(canonical, seed=seed, time_limit=time_limit)
+    if params.profile:
+        job_params["profile"] = params.profile
+    try:
+        job = job_manager.submit(dimension, job_params, lane=decision.lane, cost=decision.estimate, stream=stream)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    job.admission = decision.to_dict()
+    
+    result_store.put_job(job.to_dict())
+    job.future.add_done_callback(lambda future: remember_result(job))
+    return job
+
+
+def remember_result(job: Job) -> None:
+    """Сохранение результата завершенной задачи в хранилище и записи задачи для других воркеров"""
+    artifacts = job.result.artifacts if job.result is not None else {}
+    if artifacts:
+        # Файлы профиля хранятся по задаче, а не в памяти кэша: задачи с одним зерном
+        # дают один результат, но профиль у каждой свой
+        job.result.artifacts = {}
+        for name, data in artifacts.items():
+            result_store.put_artifact(job.id, name, data)
+        if job.stats and "profile" in job.stats:
+            job.stats["profile"]["artifacts"] = profile_links(job.id)
+    if job.result is not None and job.result.size:
+        job.result = store_result(job.dimension, job.result)
+    if not job.cached and job.result is not None:
+        # Фактическое время уточняет модель стоимости, задержка дешевых задач -- лимит дорогой полосы;
+        # время под профилировщиком и потоковых задач с передачей ячеек не показательно
+        if (job.result.elapsed and not job.result.truncated and not job.params.get("profile")
+                and job.progress is None):
+            admission.cost_model.observe(job.dimension, job.params["steps"], job.params["runs"],
+                                         job.result.elapsed, job.params["engine"])
+        admission.observe_latency(job.lane, job.finished_at - job.created_at)
+        job_manager.set_lane_limit(EXPENSIVE, admission.expensive_limit)
+    metrics.observe_job(job.dimension, job.status, job.cached,
+                        job.result.elapsed if job.result is not None else None,
+                        job.finished_at - job.created_at if job.finished_at is not None else None,
+                        job.stats)
+    result_store.put_job(job.to_dict())
+
+
+def profile_links(job_id: str) -> Dict[str, str]:
+    """Адреса файлов профиля задачи"""
+    return {name: f"/jobs/{job_id}/profile/{name}" for name in PROFILE_ARTIFACTS}
+
+
+def store_result(dimension: int, result: SimulationResult) -> SimulationResult:
+    """Сохранение результата в хранилище под идентификатором и отметка его как последнего"""
+    if result.result_id is None:
+        result_id = new_result_id(canonical_params(dimension, result.params["steps"], result.params["alpha"],
+                                                   result.params["runs"], result.params["engine"]),
+                                  result.params["seed"], truncated=result.truncated)
+        result = result_cache.put(result_id, result)
+    result_store.set_latest(dimension, result.result_id)
+    return result
+
+
+def load_result(dimension: int, result_id: Optional[str]) -> SimulationResult:
+    """Результат по идентификатору или последний результат данной размерности"""
+    if result_id is None:
+        result_id = result_store.latest(dimension)
+        if result_id is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Нет доступных данных симуляции. Запустите симуляцию сначала."
+            )
+    
+    result = result_cache.get(result_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Результат {result_id} не найден")
+    if result.dimension != dimension:
+        raise HTTPException(status_code=400, detail=f"Результат {result_id} не является {dimension}D")
+    return result
+
+
+async def send_response(request: Request, media_type: str, build: Callable[[], bytes],
+                        etag: Optional[str] = None, immutable: bool = False,
+                        compressible: bool = True, phase: str = "serialization") -> Response:
+    """
+    Ответ с проверкой If-None-Match и сжатием тела.
+    
+    При совпадении ETag тело не строится вовсе и возвращается 304. Иначе тело
+    строится и сжимается (gzip или brotli по Accept-Encoding, начиная с
+    COMPRESS_MIN_SIZE байт) в пуле потоков, не блокируя цикл событий.
+    Построение тела учитывается в метриках как фаза phase, сжатие -- как compression.
+    """
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if etag is not None:
+        # Результат по явному идентификатору не меняется; «последний» результат нужно перепроверять
+        headers["Cache-Control"] = "public, max-age=31536000, immutable" if immutable else "no-cache"
+        matched = etag_matches(request.headers.get("if-none-match"), etag)
+        if matched is not None:
+            return Response(status_code=304, headers=dict(headers, ETag=matched))
+    
+    endpoint = route_path(request)
+    
+    def timed_build() -> bytes:
+        with metrics.phase(phase, endpoint=endpoint):
+            return build()
+    
+    def timed_compress(data: bytes, encoding: str) -> bytes:
+        with metrics.phase("compression", endpoint=endpoint):
+            return compress(data, encoding)
+    
+    body = await run_in_threadpool(timed_build)
+    encoding = choose_encoding(request.headers.get("accept-encoding")) if compressible else None
+    if encoding is not None and len(body) >= COMPRESS_MIN_SIZE:
+        body = await run_in_threadpool(timed_compress, body, encoding)
+        headers["Content-Encoding"] = encoding
+    else:
+        encoding = None
+    if etag is not None:
+        headers["ETag"] = encoded_etag(etag, encoding)
+    return Response(body, media_type=media_type, headers=headers)
+
+
+def route_path(request: Request) -> str:
+    """Шаблон пути обработчика (например, /visualize/3d/{viz_type}) для меток метрик"""
+    route = request.scope.get("route")
+    return getattr(route, "path", request.url.path)
+
+
+def request_etag(request: Request, result: SimulationResult, *parts) -> Optional[str]:
+    """ETag представления результата: идентификатор результата, путь, параметры запроса"""
+    if result.result_id is None:
+        return None
+    return make_etag(result.result_id, request.url.path, sorted(request.query_params.multi_items()), *parts)
+
+
+def is_immutable(request: Request) -> bool:
+    """Запрошен ли результат по явному идентификатору (результата или задачи)"""
+    return ("result_id" in request.query_params or "result_id" in request.path_params
+            or "job_id" in request.path_params)
+
 
-# Глобальные переменные для хранения результатов последних симуляций
-last_2d_simulation = None
-last_3d_simulation = None
+async def encoded_response(request: Request, result: SimulationResult, legacy: Callable[[], Dict],
+                           format: Optional[str] = None, layout: str = "cells",
+                           extra: Optional[Dict] = None, cache: bool = True) -> Response:
+    """
+    Ответ с результатом в формате, выбранном по параметру format или заголовку Accept.
+    
+    Для application/json возвращается прежний формат legacy(); колоночные форматы
+    (columnar, binary, msgpack) строятся напрямую из массивов результата.
+    При cache=True ответ получает ETag и может быть отдан как 304.
+    """
+    try:
+        fmt = negotiate_format(request.headers.get("accept"), format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if fmt != "json" and layout == "grid" and result.dimension != 2:
+        raise HTTPException(status_code=400, detail="Раскладка grid поддерживается только для 2D")
+    
+    def build() -> bytes:
+        if fmt == "json":
+            return encode_json(legacy())
+        return encode_result(result, fmt, layout, extra)
+    
+    etag = request_etag(request, result, fmt) if cache else None
+    try:
+        return await send_response(request, FORMAT_MEDIA_TYPES[fmt], build, etag, immutable=is_immutable(request))
+    except RuntimeError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+
+
+async def run_simulation(dimension: int, params: Union[SimulationParams2D, SimulationParams3D]) -> Job:
+    """Запуск симуляции через очередь задач и ожидание результата"""
+    job = submit_simulation(dimension, params)
+    if params.request_id:
+        running_simulations[params.request_id] = job.id
+        result_store.put_request(params.request_id, job.id)
+    try:
+        await job_manager.wait(job)
+    finally:
+        if params.request_id:
+            running_simulations.pop(params.request_id, None)
+    
+    if job.status == JOB_FAILED:
+        raise RuntimeError(job.error)
+    if job.result is None:
+        raise HTTPException(status_code=409, detail="Симуляция была отменена до начала выполнения")
+    if not job.result.size and job.result.stop_reason == "cancelled":
+        raise HTTPException(status_code=409, detail="Симуляция отменена до завершения первого запуска")
+    if not job.result.size and job.result.truncated:
+        # Незавершённый запуск не входит в результат
+        raise HTTPException(status_code=422,
+                            detail=f"Симуляция остановлена ({job.result.stop_reason}) до завершения "
+                                   f"первого запуска; увеличьте time_budget или уменьшите steps")
+    if not job.result.size:
+        raise ValueError("Ошибка при обработке данных ячеек")
+    return job
+
+
+async def simulation_response(request: Request, job: Job, format: Optional[str], layout: str,
+                              cache: bool = False) -> Response:
+    """Ответ на запрос симуляции в согласованном формате"""
+    extra = {
+        "job_id": job.id,
+        "result_id": job.result.result_id,
+        "seed": job.params["seed"],
+        "cached": job.cached
+    }
+    if job.params.get("profile"):
+        extra["profile"] = profile_links(job.id)
+    legacy = lambda: dict(extra, cells=frontend_cells(job.result), status="success",
+                          truncated=job.result.truncated, stop_reason=job.result.stop_reason,
+                          runs_completed=job.result.runs_completed)
+    return await encoded_response(request, job.result, legacy, format, layout, extra, cache=cache)
+
+async def poll_cancellations():
+    """Отмена своих задач, для которых другой воркер записал запрос отмены в хранилище"""
+    while True:
+        await asyncio.sleep(CANCEL_POLL_INTERVAL)
+        for job_id in job_manager.active_ids():
+            if result_store.cancel_requested(job_id):
+                job_manager.cancel(job_id)
+
+def request_cancel(job_id: str) -> Optional[Dict[str, Any]]:
+    """Запрос отмены задачи, поставленной другим воркером; None, если задачи нет в хранилище"""
+    record = result_store.get_job(job_id)
+    if record is None:
+        return None
+    record = dict(record)
+    if record["status"] not in FINISHED_STATUSES:
+        result_store.request_cancel(job_id)
+        record["cancel_requested"] = True
+    return record
+
+@app.on_event("startup")
+async def start_cancel_polling():
+    """Проверка запросов отмены, поступивших через другие воркеры"""
+    app.state.cancel_polling = asyncio.create_task(poll_cancellations())
+
+@app.on_event("shutdown")
+async def shutdown_jobs():
+    """Остановка пула процессов при завершении приложения"""
+    polling = getattr(app.state, "cancel_polling", None)
+    if polling is not None:
+        polling.cancel()
+    job_manager.shutdown()
 
 # Endpoint для проверки статуса API (health check)
 @app.get("/")
@@ -68,74 +433,47 @@ async def check_status():
     return {
         "status": "ok",
         "message": "API работает",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "jobs": {
+            "pending": job_manager.pending_count(),
+            "max_pending": job_manager.max_pending,
+            "workers": job_manager.max_workers
+        },
+        "cache": result_cache.info(),
+        "admission": admission.info(),
+        "limit_shape_cache": limit_shape_cache.info(),
+        "mesh_cache": mesh_cache.info(),
+        "pyramid_cache": pyramid_cache.info()
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Метрики в текстовом формате Prometheus"""
+    cache = result_cache.info()
+    body = metrics.render({
+        "jobs_pending": ("gauge", job_manager.pending_count(), "Незавершённые задачи"),
+        "job_workers": ("gauge", job_manager.max_workers, "Процессы пула"),
+        "expensive_lane_limit": ("gauge", admission.expensive_limit, "Лимит полосы дорогих задач"),
+        "cheap_seconds": ("gauge", admission.cheap_seconds, "Порог оценки дешёвых запросов, с"),
+        "result_cache_memory_hits_total": ("counter", cache["memory_hits"], "Попадания в память кэша результатов"),
+        "result_cache_disk_hits_total": ("counter", cache["disk_hits"], "Попадания в хранилище результатов"),
+        "result_cache_misses_total": ("counter", cache["misses"], "Промахи кэша результатов"),
+        "result_cache_memory_bytes": ("gauge", cache["memory_bytes"], "Память кэша результатов"),
+        "phase_timers_enabled": ("gauge", int(metrics.enabled), "Включены ли таймеры фаз (YOUNG_METRICS)"),
+    })
+    return Response(body, media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # API для 2D диаграмм
 @app.post("/simulate/2d")
-async def simulate_2d(params: SimulationParams2D):
+async def simulate_2d(params: SimulationParams2D, request: Request,
+                      format: Optional[str] = FORMAT_QUERY, layout: str = LAYOUT_QUERY):
     """Запуск симуляции 2D диаграммы Юнга"""
-    global last_2d_simulation
-    
     try:
         print(f"Starting 2D simulation with params: {params}")
-        # Создаем экземпляр симулятора
-        simulator = DiagramSimulator2D()
-        
-        # Запускаем симуляцию
-        simulator.simulate(
-            n_steps=params.steps,
-            alpha=params.alpha,
-            runs=params.runs
-        )
-        
-        # Получаем результаты
-        result = simulator.get_json_data()
-        print(f"Result from 2D simulation: {result}")
-        
-        # Сохраняем результат в глобальную переменную
-        last_2d_simulation = result
-        
-        # Преобразуем ячейки в формат, который нужен фронтенду
-        cells = []
-        if "cells" in result and isinstance(result["cells"], list):
-            for cell in result["cells"]:
-                if isinstance(cell, dict) and "x" in cell and "y" in cell:
-                    cells.append({
-                        "x": cell["x"],
-                        "y": cell["y"],
-                        "value": cell.get("normalized_count", 1.0)
-                    })
-        else:
-            # Если cells не в ожидаемом формате, пытаемся использовать другой формат
-            print("Cell format unexpected, using alternative parsing")
-            for cell in result.get("cells", []):
-                if isinstance(cell, (list, tuple)) and len(cell) >= 2:
-                    cells.append({
-                        "x": cell[0],
-                        "y": cell[1],
-                        "value": 1.0
-                    })
-        
-        if not cells and 'error' not in result:
-            # Если ячеек нет, но ошибки тоже нет, возможно, формат другой
-            # Пытаемся получить данные непосредственно из total_cell_counts
-            print("No cells in standard format, attempting direct access")
-            # Для отладки - проверяем, что есть в симуляторе
-            print(f"Total cell counts: {simulator.total_cell_counts}")
-            
-            if simulator.total_cell_counts:
-                for (x, y), count in simulator.total_cell_counts.items():
-                    cells.append({
-                        "x": x,
-                        "y": y,
-                        "value": 1.0
-                    })
-        
-        if not cells:
-            raise ValueError("Ошибка при обработке данных ячеек")
-            
-        return {"cells": cells, "status": "success"}
+        job = await run_simulation(2, params)
+        return await simulation_response(request, job, format, layout)
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         error_traceback = traceback.format_exc()
@@ -145,33 +483,317 @@ async def simulate_2d(params: SimulationParams2D):
             detail=f"Ошибка при симуляции: {str(e)}"
         )
 
-@app.get("/visualize/2d")
-async def visualize_2d():
-    """Визуализация последней 2D симуляции"""
-    global last_2d_simulation
+@app.post("/simulate/cancel/{request_id}")
+async def cancel_simulation(request_id: str):
+    """Отмена выполняющейся симуляции по request_id"""
+    job_id = running_simulations.get(request_id)
+    if job_id is None:
+        # Запрос мог прийти на другой воркер: отмену выполнит он сам (см. poll_cancellations)
+        job_id = result_store.get_request(request_id)
+        record = request_cancel(job_id) if job_id is not None else None
+        if record is None or not record.get("cancel_requested"):
+            raise HTTPException(
+                status_code=404,
+                detail="Симуляция с таким request_id не выполняется"
+            )
+        return {"request_id": request_id, "job_id": job_id, "status": "cancelling"}
     
-    if not last_2d_simulation:
-        raise HTTPException(
-            status_code=404,
-            detail="Нет доступных данных симуляции. Запустите симуляцию сначала."
-        )
+    job_manager.cancel(job_id)
+    return {"request_id": request_id, "job_id": job_id, "status": "cancelling"}
+
+# API для фоновых задач симуляции
+@app.post("/jobs/2d", status_code=202)
+async def create_job_2d(params: SimulationParams2D):
+    """Постановка 2D симуляции в очередь; возвращает идентификатор задачи"""
+    return submit_simulation(2, params).to_dict()
+
+@app.post("/jobs/3d", status_code=202)
+async def create_job_3d(params: SimulationParams3D):
+    """Постановка 3D симуляции в очередь; возвращает идентификатор задачи"""
+    return submit_simulation(3, params).to_dict()
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = Query(0, ge=0, le=60,
+                                                   description="Сколько секунд ждать завершения задачи")):
+    """Статус задачи и результат, если она завершена"""
+    job = job_manager.get(job_id)
+    if job is None:
+        # Задача могла быть поставлена другим воркером: читаем её запись из хранилища
+        record = result_store.get_job(job_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail="Задача не найдена")
+        # Запись может быть объектом хранилища (memory://): результат добавляется в копию
+        record = dict(record)
+        if record.get("result_id"):
+            record["result"] = load_result(record["dimension"], record["result_id"]).to_json_data()
+        return record
     
+    if wait > 0:
+        await job_manager.wait(job, timeout=wait)
+    return job.to_dict(include_result=True)
+
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str, request: Request, format: Optional[str] = FORMAT_QUERY,
+                         layout: str = LAYOUT_QUERY):
+    """Результат завершенной задачи в согласованном формате"""
+    job = job_manager.get(job_id)
+    if job is None:
+        record = result_store.get_job(job_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail="Задача не найдена")
+        if not record.get("result_id"):
+            raise HTTPException(status_code=409, detail=f"Результат недоступен, статус задачи: {record['status']}")
+        return await get_result(record["result_id"], request, format, layout)
+    if job.result is None:
+        raise HTTPException(status_code=409, detail=f"Результат недоступен, статус задачи: {job.to_dict()['status']}")
+    return await simulation_response(request, job, format, layout, cache=True)
+
+@app.get("/results/{result_id}")
+async def get_result(result_id: str, request: Request, format: Optional[str] = FORMAT_QUERY,
+                     layout: str = LAYOUT_QUERY):
+    """Результат из хранилища по идентификатору в согласованном формате"""
+    result = result_cache.get(result_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Результат {result_id} не найден")
+    legacy = lambda: dict(result.metadata(), cells=frontend_cells(result), status="success")
+    return await encoded_response(request, result, legacy, format, layout, {"result_id": result_id})
+
+@app.get("/jobs/{job_id}/profile")
+async def get_profile(job_id: str):
+    """Файлы профиля задачи (для задач с profile)"""
+    names = [name for name in result_store.list_artifacts(job_id) if name in PROFILE_ARTIFACTS]
+    if not names:
+        raise HTTPException(status_code=404, detail=f"Профиль задачи {job_id} не найден")
+    links = profile_links(job_id)
+    return {"job_id": job_id, "artifacts": {name: links[name] for name in names}}
+
+@app.get("/jobs/{job_id}/profile/{name}")
+async def get_profile_artifact(job_id: str, name: str):
+    """Файл профиля: pstats, свёрнутые стеки для flamegraph или сводка"""
+    data = result_store.get_artifact(job_id, name) if name in PROFILE_ARTIFACTS else None
+    if data is None:
+        raise HTTPException(status_code=404, detail=f"Файл профиля {name} задачи {job_id} не найден")
+    return Response(data, media_type=PROFILE_ARTIFACTS[name],
+                    headers={"Content-Disposition": f'attachment; filename="{job_id}_{name}"'})
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Отмена задачи"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        # Задача другого воркера: запрос отмены записывается в хранилище
+        record = request_cancel(job_id)
+        if record is None:
+            raise HTTPException(status_code=404, detail="Задача не найдена")
+        return record
+    return job.to_dict()
+
+# Пакеты симуляций по сетке параметров
+def submit_batch(dimension: int, params: Union[BatchParams2D, BatchParams3D]) -> Batch:
+    """Проверка точек сетки и постановка их в очередь задач с дедупликацией"""
+    model = SimulationParams2D if dimension == 2 else SimulationParams3D
+    points = expand_grid(params.steps, params.alpha, params.runs)
+    if len(points) > MAX_BATCH_POINTS:
+        raise HTTPException(status_code=400, detail=f"Не больше {MAX_BATCH_POINTS} точек в пакете")
     try:
-        # Преобразуем ячейки в формат, который нужен фронтенду
-        cells = []
-        if "cells" in last_2d_simulation and isinstance(last_2d_simulation["cells"], list):
-            for cell in last_2d_simulation["cells"]:
-                if isinstance(cell, dict) and "x" in cell and "y" in cell:
-                    cells.append({
-                        "x": cell["x"],
-                        "y": cell["y"],
-                        "value": cell.get("normalized_count", 1.0)
-                    })
+        requests = [model(**point, seed=params.seed, reuse=params.reuse, time_budget=params.time_budget)
+                    for point in points]
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    if params.seed is not None:
+        points = [dict(point, seed=params.seed) for point in points]
+    
+    batch = Batch(dimension, points)
+    key = lambda point: point_key(dimension, point)
+    
+    # Места в очереди нужны только точкам, которых нет в кэше; проверяем заранее,
+    # чтобы не поставить в очередь половину пакета
+    missing = {key(point): request for point, request in zip(points, requests)
+               if cached_result(dimension, request) is None}
+    if len(missing) > job_manager.max_pending:
+        # Такой пакет не поместится в очередь даже на простаивающем сервере: повтор не поможет
+        raise HTTPException(status_code=413,
+                            detail=f"Пакету нужно {len(missing)} мест в очереди задач, а её вместимость "
+                                   f"{job_manager.max_pending}; разбейте сетку на несколько пакетов")
+    free = job_manager.max_pending - job_manager.pending_count()
+    if len(missing) > free:
+        raise HTTPException(status_code=503, detail=f"Очередь задач заполнена: нужно {len(missing)} мест, свободно {free}",
+                            headers={"Retry-After": "5"})
+    
+    # Допуск пакета целиком: дорогие точки встают в очередь дорогой полосы,
+    # и ожидание последней из них не должно превышать предела
+    load = job_manager.lane_load(EXPENSIVE)
+    for request in missing.values():
+        estimate = admission.cost_model.estimate(dimension, request.steps, request.runs)
+        if admission.classify(estimate) == EXPENSIVE:
+            load["held"] += 1
+            load["held_cost"] += estimate
+    wait = admission.expected_wait(load)
+    if wait > admission.max_queue_wait:
+        raise HTTPException(status_code=429,
+                            detail=f"Ожидание дорогих задач пакета около {wait:.1f} с превышает {admission.max_queue_wait:.0f} с",
+                            headers={"Retry-After": str(math.ceil(wait - admission.max_queue_wait))})
+    
+    by_key = {key(point): request for point, request in zip(points, requests)}
+    batch.submit(key, lambda point: submit_simulation(dimension, by_key[key(point)], allow_reject=False).id)
+    result_store.put_batch(batch.to_record())
+    return batch
+
+
+def batch_manifest(batch: Batch) -> Dict:
+    """Манифест пакета по текущим состояниям задач (своих или из хранилища)"""
+    jobs = {}
+    for job_id in set(batch.job_ids):
+        job = job_manager.get(job_id)
+        record = job.to_dict() if job is not None else result_store.get_job(job_id)
+        if record is not None:
+            jobs[job_id] = record
+    return batch.manifest(jobs)
+
+@app.post("/batch/2d", status_code=202)
+async def create_batch_2d(params: BatchParams2D):
+    """Пакет 2D симуляций по сетке параметров; возвращает манифест"""
+    return batch_manifest(submit_batch(2, params))
+
+@app.post("/batch/3d", status_code=202)
+async def create_batch_3d(params: BatchParams3D):
+    """Пакет 3D симуляций по сетке параметров; возвращает манифест"""
+    return batch_manifest(submit_batch(3, params))
+
+@app.get("/batch/{batch_id}")
+async def get_batch(batch_id: str, wait: float = Query(0, ge=0, le=600,
+                                                       description="Сколько секунд ждать завершения пакета")):
+    """Манифест пакета: идентификаторы результатов и время по каждой точке"""
+    record = result_store.get_batch(batch_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Пакет не найден")
+    batch = Batch.from_record(record)
+    
+    jobs = [job_manager.get(job_id) for job_id in set(batch.job_ids)]
+    jobs = [job for job in jobs if job is not None]
+    if wait > 0 and jobs:
+        await asyncio.wait([asyncio.ensure_future(job_manager.wait(job)) for job in jobs], timeout=wait)
+    return batch_manifest(batch)
+
+@app.delete("/batch/{batch_id}")
+async def cancel_batch(batch_id: str):
+    """Отмена всех незавершенных задач пакета"""
+    record = result_store.get_batch(batch_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Пакет не найден")
+    batch = Batch.from_record(record)
+    for job_id in set(batch.job_ids):
+        if job_manager.cancel(job_id) is None:
+            request_cancel(job_id)
+    return batch_manifest(batch)
+
+# Потоковая симуляция (Server-Sent Events)
+def stream_response(dimension: int, steps: int, alpha: float, runs: int, seed: Optional[int],
+                    fps: float, encoding: str, time_budget: Optional[float]) -> StreamingResponse:
+    """Постановка потоковой симуляции в очередь задач и формирование ответа text/event-stream"""
+    model = SimulationParams2D if dimension == 2 else SimulationParams3D
+    params = model(steps=steps, alpha=alpha, runs=runs, seed=seed, time_budget=time_budget, reuse=False)
+    # Допуск, лимит очереди и пул процессов -- те же, что у обычных задач; результат
+    # сохраняется по завершении задачи вне цикла событий (remember_result)
+    job = submit_simulation(dimension, params, stream=True)
+    events = stream_simulation(job_manager, job, dimension, fps=fps, encoding=encoding)
+    return StreamingResponse(events, media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/stream/2d")
+async def stream_2d(steps: int = Query(100, ge=10, le=5000),
+                    alpha: float = Query(1.0, ge=0.1, le=5.0),
+                    runs: int = Query(1, ge=1, le=10),
+                    seed: Optional[int] = Query(None, ge=0, le=2**63 - 1),
+                    fps: float = Query(10.0, gt=0, le=60, description="Частота отправки событий"),
+                    encoding: str = Query("json", pattern="^(json|base64)$"),
+                    time_budget: Optional[float] = Query(None, gt=0)):
+    """Потоковая 2D симуляция: новые ячейки и агрегаты по мере роста"""
+    return stream_response(2, steps, alpha, runs, seed, fps, encoding, time_budget)
+
+@app.get("/stream/3d")
+async def stream_3d(steps: int = Query(100, ge=10, le=5000),
+                    alpha: float = Query(1.0, ge=0.1, le=5.0),
+                    runs: int = Query(1, ge=1, le=10),
+                    seed: Optional[int] = Query(None, ge=0, le=2**63 - 1),
+                    fps: float = Query(10.0, gt=0, le=60, description="Частота отправки событий"),
+                    encoding: str = Query("json", pattern="^(json|base64)$"),
+                    time_budget: Optional[float] = Query(None, gt=0)):
+    """Потоковая 3D симуляция: новые ячейки и агрегаты по мере роста"""
+    return stream_response(3, steps, alpha, runs, seed, fps, encoding, time_budget)
+
+# Плитки с уровнями детализации для больших результатов
+async def tiles_response(request: Request, result: SimulationResult, lo: List[int], hi: List[Optional[int]],
+                         level: Optional[int], resolution: int) -> Response:
+    """Плитки пирамиды количеств, пересекающие область просмотра"""
+    def build() -> bytes:
+        # Пирамида строится один раз на результат, в пуле потоков
+        pyramid = get_pyramid(result)
+        shape = pyramid.levels[0].shape
+        upper = [shape[axis] if value is None else value for axis, value in enumerate(hi)]
+        chosen = pyramid.choose_level(lo, upper, resolution) if level is None else level
+        if chosen >= len(pyramid.levels):
+            raise HTTPException(status_code=400, detail=f"Доступны уровни 0..{len(pyramid.levels) - 1}")
         
-        if not cells:
+        data = encode_tiles(pyramid, chosen, pyramid.tiles(chosen, lo, upper))
+        data["result_id"] = result.result_id
+        data["levels"] = len(pyramid.levels)
+        data["shape"] = list(shape)
+        return encode_json(data)
+    
+    return await send_response(request, "application/json", build, request_etag(request, result),
+                               immutable=is_immutable(request))
+
+@app.get("/tiles/2d/info")
+async def tiles_2d_info(request: Request, result_id: Optional[str] = RESULT_ID_QUERY):
+    """Уровни пирамиды плиток 2D результата"""
+    result = load_result(2, result_id)
+    return await send_response(request, "application/json",
+                               lambda: encode_json(dict(get_pyramid(result).info(), result_id=result.result_id)),
+                               request_etag(request, result), immutable=is_immutable(request))
+
+@app.get("/tiles/2d")
+async def tiles_2d(request: Request, x0: int = Query(0, ge=0), y0: int = Query(0, ge=0),
+                   x1: Optional[int] = Query(None, ge=0), y1: Optional[int] = Query(None, ge=0),
+                   level: Optional[int] = Query(None, ge=0, description="Уровень; по умолчанию выбирается по resolution"),
+                   resolution: int = Query(1024, ge=16, le=8192, description="Разрешение области просмотра в пикселях"),
+                   result_id: Optional[str] = RESULT_ID_QUERY):
+    """Плитки сумм количеств 2D результата для области просмотра [x0, x1) x [y0, y1)"""
+    return await tiles_response(request, load_result(2, result_id), [x0, y0], [x1, y1], level, resolution)
+
+@app.get("/tiles/3d/info")
+async def tiles_3d_info(request: Request, result_id: Optional[str] = RESULT_ID_QUERY):
+    """Уровни пирамиды блоков 3D результата"""
+    result = load_result(3, result_id)
+    return await send_response(request, "application/json",
+                               lambda: encode_json(dict(get_pyramid(result).info(), result_id=result.result_id)),
+                               request_etag(request, result), immutable=is_immutable(request))
+
+@app.get("/tiles/3d")
+async def tiles_3d(request: Request, x0: int = Query(0, ge=0), y0: int = Query(0, ge=0), z0: int = Query(0, ge=0),
+                   x1: Optional[int] = Query(None, ge=0), y1: Optional[int] = Query(None, ge=0),
+                   z1: Optional[int] = Query(None, ge=0),
+                   level: Optional[int] = Query(None, ge=0, description="Уровень; по умолчанию выбирается по resolution"),
+                   resolution: int = Query(64, ge=4, le=512, description="Число вокселей по каждой оси области просмотра"),
+                   result_id: Optional[str] = RESULT_ID_QUERY):
+    """Блоки сумм количеств 3D результата для области [x0, x1) x [y0, y1) x [z0, z1)"""
+    return await tiles_response(request, load_result(3, result_id), [x0, y0, z0], [x1, y1, z1], level, resolution)
+
+@app.get("/visualize/2d")
+async def visualize_2d(request: Request, format: Optional[str] = FORMAT_QUERY,
+                       layout: str = LAYOUT_QUERY, result_id: Optional[str] = RESULT_ID_QUERY):
+    """Визуализация 2D результата по идентификатору или последней 2D симуляции"""
+    result = load_result(2, result_id)
+    
+    try:
+        if not result.size:
             raise ValueError("Ошибка при обработке данных ячеек")
-            
-        return {"cells": cells, "status": "success"}
+        
+        # Ячейки в формате фронтенда строятся, только если ответ не 304
+        legacy = lambda: {"cells": frontend_cells(result), "status": "success", "result_id": result.result_id}
+        return await encoded_response(request, result, legacy, format, layout, {"result_id": result.result_id})
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         error_traceback = traceback.format_exc()
@@ -181,93 +803,139 @@ async def visualize_2d():
             detail=f"Ошибка при визуализации: {str(e)}"
         )
 
-@app.get("/limit-shape/2d")
-async def get_limit_shape_2d_api():
+# Выборки из 3D результата по индексу: время ответа пропорционально его размеру
+async def voxel_index(result_id: Optional[str]) -> Tuple[SimulationResult, VoxelIndex]:
+    """3D результат и его индекс (строится один раз на результат, в пуле потоков)"""
+    result = load_result(3, result_id)
+    return result, await run_in_threadpool(get_index, result)
+
+async def subset_response(request: Request, result: SimulationResult, cells: Tuple, format: Optional[str],
+                          query: Dict) -> Response:
+    """Ответ с частью ячеек результата; значения нормированы на максимум всего результата"""
+    coords, counts = cells
+    subset = SimulationResult(3, coords, counts, result.params, runs_completed=result.runs_completed,
+                              truncated=result.truncated, stop_reason=result.stop_reason,
+                              result_id=result.result_id)
+    extra = {"result_id": result.result_id, "query": query, "result_max_count": result.max_count}
+    legacy = lambda: dict(extra, cells=frontend_cells(subset, result.max_count), count=subset.size,
+                          status="success")
+    return await encoded_response(request, subset, legacy, format, extra=extra)
+
+@app.get("/query/3d/info")
+async def query_3d_info(result_id: Optional[str] = RESULT_ID_QUERY):
+    """Размеры индекса 3D результата"""
+    result, index = await voxel_index(result_id)
+    return dict(index.info(), result_id=result.result_id)
+
+@app.get("/query/3d/slice")
+async def query_3d_slice(request: Request, axis: str = Query(..., pattern="^(x|y|z)$"),
+                         value: int = Query(..., ge=0), format: Optional[str] = FORMAT_QUERY,
+                         result_id: Optional[str] = RESULT_ID_QUERY):
+    """Ячейки плоскости axis = value"""
+    result, index = await voxel_index(result_id)
+    return await subset_response(request, result, index.slice(axis, value), format,
+                                 {"type": "slice", "axis": axis, "value": value})
+
+@app.get("/query/3d/column")
+async def query_3d_column(request: Request, x: int = Query(..., ge=0), y: int = Query(..., ge=0),
+                          format: Optional[str] = FORMAT_QUERY, result_id: Optional[str] = RESULT_ID_QUERY):
+    """Профиль столбца (x, y): ячейки столбца по возрастанию z"""
+    result, index = await voxel_index(result_id)
+    z, counts = index.column(x, y)
+    coords = np.column_stack([np.full(len(z), x), np.full(len(z), y), z])
+    return await subset_response(request, result, (coords, counts), format,
+                                 {"type": "column", "x": x, "y": y})
+
+@app.get("/query/3d/threshold")
+async def query_3d_threshold(request: Request, min_count: int = Query(..., ge=1),
+                             limit: Optional[int] = Query(None, ge=1, description="Наибольшее число ячеек в ответе"),
+                             format: Optional[str] = FORMAT_QUERY, result_id: Optional[str] = RESULT_ID_QUERY):
+    """Ячейки с количеством не меньше min_count, по убыванию количества"""
+    result, index = await voxel_index(result_id)
+    return await subset_response(request, result, index.threshold(min_count, limit), format,
+                                 {"type": "threshold", "min_count": min_count, "limit": limit})
+
+@app.get("/query/3d/heights")
+async def query_3d_heights(request: Request, format: str = Query("json", pattern="^(json|binary)$"),
+                           result_id: Optional[str] = RESULT_ID_QUERY):
+    """Карта высот: число ячеек в каждом столбце (x, y)"""
+    result, index = await voxel_index(result_id)
+    header = {"result_id": result.result_id, "shape": list(index.heights.shape)}
+    
+    def build() -> bytes:
+        if format == "binary":
+            return pack_binary(header, {"heights": index.heights})
+        return encode_json(dict(header, dtype="<u4", heights=base64.b64encode(
+            np.ascontiguousarray(index.heights, dtype="<u4").tobytes()).decode("ascii")))
+    
+    media_type = FORMAT_MEDIA_TYPES["binary"] if format == "binary" else "application/json"
+    return await send_response(request, media_type, build, request_etag(request, result),
+                               immutable=is_immutable(request))
+
+# Предельная форма по сохранённому результату
+async def limit_shape_response(request: Request, result: SimulationResult, format: str, image: bool,
+                               resolution: Optional[int], render: Dict, confidence: float = 0.95,
+                               target_half_width: Optional[float] = None) -> Response:
+    """Сетка предельной формы в компактном виде, полосы функции высоты и, по запросу, изображение"""
+    def build() -> bytes:
+        # Сетка и изображение кэшируются по result_id и параметрам рисования
+        if format == "png":
+            return get_limit_shape_image(result, resolution=resolution, **render)
+        header = {"result_id": result.result_id, "dimension": result.dimension,
+                  "heights": height_summary(result, confidence, target_half_width)}
+        arrays = get_limit_shape(result, resolution, confidence)
+        if format == "binary":
+            return pack_binary(header, arrays)
+        data = dict(header, **encode_grid_json(arrays))
+        if image:
+            png = get_limit_shape_image(result, resolution=resolution, **render)
+            data["image"] = f"data:image/png;base64,{base64.b64encode(png).decode('ascii')}"
+        return encode_json(data)
+    
+    points = limit_shape_points(result, resolution)
+    if points > MAX_LIMIT_SHAPE_POINTS:
+        raise HTTPException(status_code=413,
+                            detail=f"Вычисление сетки требует {points} точек, допустимо не больше "
+                                   f"{MAX_LIMIT_SHAPE_POINTS}; уменьшите resolution")
+    media_type = {"png": "image/png", "binary": FORMAT_MEDIA_TYPES["binary"]}.get(format, "application/json")
     try:
-        # Создаем симулятор
-        simulator = DiagramSimulator2D()
-        
-        # Создаем визуализацию предельной формы
-        fig = simulator.limit_shape_visualize()
-        
-        # Сохраняем изображение в формате base64
-        buf = io.BytesIO()
-        FigureCanvas(fig).print_png(buf)
-        buf.seek(0)
-        
-        # Кодируем изображение в base64
-        img_str = base64.b64encode(buf.read()).decode('utf-8')
-        
-        return {"image": f"data:image/png;base64,{img_str}"}
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Ошибка при получении предельной формы: {str(e)}"
-        )
+        return await send_response(request, media_type, build, request_etag(request, result),
+                                   immutable=is_immutable(request), compressible=format != "png",
+                                   phase="rendering" if format == "png" or image else "serialization")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Ошибка при получении предельной формы: {str(e)}")
+
+LIMIT_FORMAT_QUERY = Query("json", pattern="^(json|binary|png)$",
+                           description="json (массивы float32 в base64), binary или png")
+RESOLUTION_QUERY = Query(None, ge=10, le=400,
+                         description="Число узлов сетки по каждой оси; по умолчанию 100 для 2D и 50 для 3D")
+CONFIDENCE_QUERY = Query(0.95, gt=0, lt=1, description="Уровень доверия полос функции высоты")
+TARGET_HALF_WIDTH_QUERY = Query(None, gt=0, description="Целевая полуширина полосы для оценки нужного числа запусков")
+
+@app.get("/limit-shape/2d")
+async def get_limit_shape_2d_api(request: Request, result_id: Optional[str] = RESULT_ID_QUERY,
+                                 format: str = LIMIT_FORMAT_QUERY,
+                                 image: bool = Query(False, description="Добавить изображение PNG в ответ json"),
+                                 levels: int = Query(10, ge=2, le=50, description="Число линий уровня"),
+                                 dpi: int = Query(100, ge=50, le=300),
+                                 resolution: Optional[int] = RESOLUTION_QUERY,
+                                 confidence: float = CONFIDENCE_QUERY,
+                                 target_half_width: Optional[float] = TARGET_HALF_WIDTH_QUERY):
+    """Предельная форма 2D результата"""
+    return await limit_shape_response(request, load_result(2, result_id), format, image, resolution,
+                                      {"levels": levels, "dpi": dpi}, confidence, target_half_width)
 
 # API для 3D диаграмм
 @app.post("/simulate/3d")
-async def simulate_3d(params: SimulationParams3D):
+async def simulate_3d(params: SimulationParams3D, request: Request,
+                      format: Optional[str] = FORMAT_QUERY, layout: str = LAYOUT_QUERY):
     """Запуск симуляции 3D диаграммы Юнга"""
-    global last_3d_simulation
-    
     try:
         print(f"Starting 3D simulation with params: {params}")
-        # Создаем экземпляр симулятора
-        simulator = DiagramSimulator3D()
-        
-        # Запускаем симуляцию - передаём только те параметры, которые поддерживает метод
-        # Убираем все параметры, которые не поддерживаются
-        simulator.simulate(
-            n_steps=params.steps,
-            alpha=params.alpha,
-            runs=params.runs
-        )
-        
-        # Получаем результаты
-        result = simulator.get_json_data()
-        print(f"Result from 3D simulation: {result}")
-        
-        # Сохраняем результат в глобальную переменную
-        last_3d_simulation = result
-        
-        # Преобразуем ячейки в формат, который нужен фронтенду
-        cells = []
-        if "cells" in result and isinstance(result["cells"], list):
-            for cell in result["cells"]:
-                if isinstance(cell, dict) and "x" in cell and "y" in cell and "z" in cell:
-                    cells.append({
-                        "x": cell["x"],
-                        "y": cell["y"],
-                        "z": cell["z"],
-                        "value": cell.get("normalized_count", 1.0)
-                    })
-                elif isinstance(cell, (list, tuple)) and len(cell) >= 3:
-                    cells.append({
-                        "x": cell[0],
-                        "y": cell[1],
-                        "z": cell[2],
-                        "value": 1.0
-                    })
-        else:
-            # Если cells не в ожидаемом формате, пытаемся использовать другой формат
-            print("Cell format unexpected, using alternative parsing")
-            # Для отладки - проверяем, что есть в симуляторе
-            print(f"Total cell counts: {simulator.total_cell_counts}")
-            
-            if simulator.total_cell_counts:
-                for (x, y, z), count in simulator.total_cell_counts.items():
-                    cells.append({
-                        "x": x,
-                        "y": y,
-                        "z": z,
-                        "value": 1.0
-                    })
-        
-        if not cells:
-            raise ValueError("Ошибка при обработке данных ячеек")
-            
-        return {"cells": cells, "status": "success"}
+        job = await run_simulation(3, params)
+        return await simulation_response(request, job, format, layout)
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         error_traceback = traceback.format_exc()
@@ -277,45 +945,61 @@ async def simulate_3d(params: SimulationParams3D):
             detail=f"Ошибка при симуляции: {str(e)}"
         )
 
+@app.get("/limit-shape/3d")
+async def get_limit_shape_3d_api(request: Request, result_id: Optional[str] = RESULT_ID_QUERY,
+                                 format: str = LIMIT_FORMAT_QUERY,
+                                 image: bool = Query(False, description="Добавить изображение PNG в ответ json"),
+                                 level: float = Query(0.5, gt=0, lt=1, description="Уровень поверхности на изображении"),
+                                 dpi: int = Query(100, ge=50, le=300),
+                                 resolution: Optional[int] = Query(None, ge=10, le=200,
+                                                                   description="Число узлов сетки по каждой оси; по умолчанию 50"),
+                                 confidence: float = CONFIDENCE_QUERY,
+                                 target_half_width: Optional[float] = TARGET_HALF_WIDTH_QUERY):
+    """Предельная форма 3D результата"""
+    return await limit_shape_response(request, load_result(3, result_id), format, image, resolution,
+                                      {"level": level, "dpi": dpi}, confidence, target_half_width)
+
+@app.get("/mesh/3d")
+async def get_mesh_3d(request: Request, result_id: Optional[str] = RESULT_ID_QUERY,
+                      threshold: float = Query(0.5, gt=0, le=1, description="Порог частоты занятых ячеек"),
+                      format: str = Query("json", pattern="^(json|binary)$",
+                                          description="json (буферы в base64) или binary")):
+    """Поверхность 3D результата: открытые грани, объединённые в прямоугольники, как буферы вершин и индексов"""
+    result = load_result(3, result_id)
+    
+    def build() -> bytes:
+        surface = get_surface(result, threshold)
+        header = mesh_info(result, threshold, surface)
+        buffers = mesh_buffers(surface)
+        if format == "binary":
+            return pack_binary(header, buffers)
+        return encode_json(dict(header, buffers=encode_mesh_json(buffers)))
+    
+    media_type = FORMAT_MEDIA_TYPES["binary"] if format == "binary" else "application/json"
+    return await send_response(request, media_type, build, request_etag(request, result),
+                               immutable=is_immutable(request), phase="rendering")
+
 @app.get("/visualize/3d/{viz_type}")
-async def visualize_3d(viz_type: str):
+async def visualize_3d(viz_type: str, request: Request, format: Optional[str] = FORMAT_QUERY,
+                       result_id: Optional[str] = RESULT_ID_QUERY):
     """
-    Визуализация последней 3D симуляции
+    Визуализация 3D результата по идентификатору или последней 3D симуляции
     
     viz_type может быть одним из: solid, wireframe, heatmap
     """
-    global last_3d_simulation
-    
-    if not last_3d_simulation:
-        raise HTTPException(
-            status_code=404,
-            detail="Нет доступных данных симуляции. Запустите симуляцию сначала."
-        )
+    result = load_result(3, result_id)
     
     try:
-        # Преобразуем ячейки в формат, который нужен фронтенду
-        cells = []
-        if "cells" in last_3d_simulation and isinstance(last_3d_simulation["cells"], list):
-            for cell in last_3d_simulation["cells"]:
-                if isinstance(cell, dict) and "x" in cell and "y" in cell and "z" in cell:
-                    cells.append({
-                        "x": cell["x"],
-                        "y": cell["y"],
-                        "z": cell["z"],
-                        "value": cell.get("normalized_count", 1.0)
-                    })
-                elif isinstance(cell, (list, tuple)) and len(cell) >= 3:
-                    cells.append({
-                        "x": cell[0],
-                        "y": cell[1],
-                        "z": cell[2],
-                        "value": 1.0
-                    })
-        
-        if not cells:
+        if not result.size:
             raise ValueError("Ошибка при обработке данных ячеек")
-            
-        return {"cells": cells, "status": "success", "visualization_type": viz_type}
+        
+        # Ячейки в формате фронтенда строятся, только если ответ не 304
+        legacy = lambda: {"cells": frontend_cells(result), "status": "success", "visualization_type": viz_type,
+                          "result_id": result.result_id}
+        return await encoded_response(request, result, legacy, format,
+                                      extra={"visualization_type": viz_type, "result_id": result.result_id})
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         error_traceback = traceback.format_exc()
@@ -326,4 +1010,5 @@ async def visualize_3d(viz_type: str):
         )
 
 if __name__ == "__main__":
+    import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000) 
\ No newline at end of file
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Бенчмарки движков и конвейера обработки результатов.
+
+Каждый случай замеряется на нескольких размерах (шаги роста, число запусков
+или число ячеек результата), и по точкам подгоняется показатель сложности k
+в t ~ c * n^k. Отчёт сохраняется в JSON с меткой машины; базовые замеры
+хранятся по файлу на машину, и сравнение с ними завершается кодом 1 при
+регрессии времени или показателя сложности:
+
+    python benchmark.py --save-baseline
+    python benchmark.py --check
+    python benchmark.py --cases steps_2d limit_shape_3d --quick
+
+Абсолютные времена сравниваются только с замерами той же машины, показатели
+сложности -- с любыми.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from common.benchmark import BENCHMARK_VERSION, CASES, compare_runs, machine_info, machine_tag, run_case
+from common.result import ENGINE_VERSION
+
+DEFAULT_BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "baselines")
+
+
+def git_commit() -> Optional[str]:
+    """
+    Текущий коммит репозитория, если он доступен.
+    """
+    import subprocess
+
+    try:
+        completed = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return completed.stdout.strip() or None
+
+
+def print_case(name: str, case: Dict[str, Any]) -> None:
+    """
+    Строка случая: времена по размерам и подогнанный показатель.
+    """
+    points = ", ".join(f"{point['n']}: {point['seconds'] * 1000:.1f}" for point in case["points"])
+    print(f"{name:<20} k={case['exponent']:5.2f} (R2={case['r2']:.3f})  {case['axis']} -> ms: {points}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Замеры, отчёт и сравнение с базовыми замерами.
+    """
+    parser = argparse.ArgumentParser(description='Бенчмарки движков и конвейера обработки результатов')
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES),
+                      help='Замеряемые случаи (по умолчанию: все)')
+    parser.add_argument('--quick', action='store_true',
+                      help='Три наименьших размера и один повтор: быстрая проверка')
+    parser.add_argument('--repeat', type=int, default=3,
+                      help='Число повторов на размер, берётся наименьшее время (по умолчанию: 3)')
+    parser.add_argument('--output', type=str, default=None, help='Файл для сохранения отчёта JSON')
+    parser.add_argument('--baseline-dir', type=str, default=DEFAULT_BASELINE_DIR,
+                      help='Директория базовых замеров, по файлу на машину (по умолчанию: benchmarks/baselines)')
+    parser.add_argument('--save-baseline', action='store_true',
+                      help='Сохранить отчёт как базовые замеры этой машины')
+    parser.add_argument('--check', action='store_true',
+                      help='Сравнить с базовыми замерами этой машины; при регрессии код возврата 1')
+    parser.add_argument('--baseline', type=str, default=None,
+                      help='Отчёт JSON для сравнения вместо базовых замеров этой машины')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                      help='Допустимый относительный рост времени (по умолчанию: 0.25)')
+    parser.add_argument('--min-delta-ms', type=float, default=5.0,
+                      help='Рост времени меньше этого значения не считается регрессией (по умолчанию: 5)')
+    parser.add_argument('--max-exponent-increase', type=float, default=0.2,
+                      help='Допустимый рост показателя сложности (по умолчанию: 0.2)')
+    args = parser.parse_args(argv)
+
+    machine = machine_info()
+    tag = machine_tag(machine)
+    baseline_path = args.baseline or os.path.join(args.baseline_dir, f"{tag}.json")
+    if (args.check or args.baseline) and not os.path.exists(baseline_path):
+        print(f"Ошибка: нет базовых замеров {baseline_path} (сохраните их с --save-baseline)", file=sys.stderr)
+        return 1
+
+    print(f"Машина: {tag}, движок: {ENGINE_VERSION}")
+    started = time.perf_counter()
+    cases = {}
+    for name in args.cases:
+        sizes = CASES[name][2][:3] if args.quick else None
+        cases[name] = run_case(name, sizes, repeat=1 if args.quick else args.repeat)
+        print_case(name, cases[name])
+
+    report = {
+        "version": BENCHMARK_VERSION,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": git_commit(),
+        "engine": ENGINE_VERSION,
+        "machine": machine,
+        "machine_tag": tag,
+        "config": {"quick": args.quick, "repeat": 1 if args.quick else args.repeat},
+        "duration_seconds": time.perf_counter() - started,
+        "cases": cases,
+    }
+    print(f"Время замеров: {report['duration_seconds']:.1f} с")
+
+    outputs = [args.output] if args.output else []
+    if args.save_baseline:
+        outputs.append(os.path.join(args.baseline_dir, f"{tag}.json"))
+    for path in outputs:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Отчёт сохранён: {path}")
+
+    if args.check or args.baseline:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems, warnings = compare_runs(report, baseline, args.max_regression, args.min_delta_ms,
+                                          args.max_exponent_increase)
+        for warning in warnings:
+            print(warning)
+        if problems:
+            print(f"РЕГРЕССИЯ относительно {baseline_path}:")
+            for problem in problems:
+                print(f"  {problem}")
+            return 1
+        print(f"Регрессий относительно {baseline_path} нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
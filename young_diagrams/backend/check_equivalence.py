@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Статистическая проверка, что движок сэмплирует тот же процесс роста, что и эталон.
+
+Эталон -- Diagram2D и Diagram3D. Кандидат (класс диаграммы с тем же
+интерфейсом или функция-сэмплер, см. common.equivalence) запускается на
+малом числе шагов с множеством зёрен; сравниваются частоты попадания ячеек
+и распределения наблюдаемых запусков с эталоном, а при малом числе шагов --
+частоты диаграмм и ячеек с точными вероятностями. Решение принимается по
+всему семейству проверок с поправкой Холма: для правильного движка ложная
+тревога случается с вероятностью не больше --level. При отклонении код
+возврата 1:
+
+    python check_equivalence.py --candidate fast_engine:Diagram2DFast --dimension 2
+    python check_equivalence.py --candidate fast_engine:sample_batched --runs 5000
+
+Без --candidate эталон проверяется против самого себя (контроль ложных тревог).
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List, Optional
+
+from common.equivalence import check_equivalence, diagram_sampler, load_sampler, reference_class
+
+# Число шагов для точных вероятностей: число диаграмм растёт как число (плоских) разбиений
+DEFAULT_EXACT_STEPS = {2: 8, 3: 6}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Проверка кандидата в каждой размерности и итог.
+    """
+    parser = argparse.ArgumentParser(description='Статистическая проверка эквивалентности движка эталону')
+    parser.add_argument('--candidate', type=str, default=None,
+                      help='Кандидат в виде модуль:имя -- класс диаграммы или функция-сэмплер '
+                           '(по умолчанию: эталон)')
+    parser.add_argument('--dimension', type=int, choices=[2, 3], nargs='+', default=[2, 3],
+                      help='Проверяемые размерности (по умолчанию: 2 3)')
+    parser.add_argument('--steps', type=int, default=20,
+                      help='Число шагов запусков для сравнения с эталоном (по умолчанию: 20)')
+    parser.add_argument('--runs', type=int, default=2000,
+                      help='Число запусков каждого движка (по умолчанию: 2000)')
+    parser.add_argument('--alpha', type=float, default=1.0,
+                      help='Параметр роста (по умолчанию: 1.0)')
+    parser.add_argument('--exact-steps', type=int, default=None,
+                      help='Число шагов для сравнения с точными вероятностями '
+                           '(по умолчанию: 8 в 2D, 6 в 3D; 0 -- без него)')
+    parser.add_argument('--level', type=float, default=0.01,
+                      help='Допустимая вероятность ложной тревоги для всех проверок размерности '
+                           '(по умолчанию: 0.01)')
+    parser.add_argument('--seed', type=int, default=0, help='Начальное зерно (по умолчанию: 0)')
+    parser.add_argument('--output', type=str, default=None, help='Файл для сохранения отчёта JSON')
+    args = parser.parse_args(argv)
+
+    reports = {}
+    for dimension in args.dimension:
+        candidate = load_sampler(args.candidate) if args.candidate \
+            else diagram_sampler(reference_class(dimension))
+        exact_steps = DEFAULT_EXACT_STEPS[dimension] if args.exact_steps is None else args.exact_steps or None
+        started = time.perf_counter()
+        report = check_equivalence(candidate, dimension, n_steps=args.steps, runs=args.runs, alpha=args.alpha,
+                                   level=args.level, seed=args.seed, exact_steps=exact_steps)
+        report["seconds"] = time.perf_counter() - started
+        reports[f"{dimension}d"] = report
+
+        verdict = "эквивалентен" if report["equivalent"] else "ОТКЛОНЁН"
+        print(f"{dimension}D: {verdict}: проверок {len(report['tests'])}, отклонено {report['rejected']}, "
+              f"наименьшее p = {report['min_p_value']:.2e} ({report['seconds']:.1f} с)")
+        worst = sorted(report["tests"].items(), key=lambda item: item[1]["p_value"])[:5]
+        for name, result in worst:
+            mark = "  *" if result["rejected"] else "   "
+            print(f"{mark} {name:<28} {result['test']:<10} p = {result['p_value']:.2e}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"candidate": args.candidate or "reference", "reports": reports}, f,
+                      ensure_ascii=False, indent=2, default=str)
+    return 0 if all(report["equivalent"] for report in reports.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
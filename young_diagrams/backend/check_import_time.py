@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Проверка времени запуска API и CLI по `python -X importtime`.
+
+Каждый модуль импортируется в отдельном интерпретаторе; суммарное время
+импорта сравнивается с бюджетом, а тяжёлые зависимости визуализации не должны
+загружаться при старте. Код возврата 1, если какая-то проверка не прошла,
+поэтому скрипт можно запускать в CI (те же проверки с бюджетами по умолчанию
+выполняет tests/test_import_time.py):
+
+    python check_import_time.py
+    python check_import_time.py --budget api=800 --repeat 5
+"""
+import argparse
+import os
+import sys
+from typing import Dict, List
+
+from common.import_time import DEFAULT_BUDGETS, check_import
+
+
+def parse_budgets(values: List[str]) -> Dict[str, float]:
+    """
+    Разбор параметров --budget вида module=milliseconds.
+    """
+    budgets = dict(DEFAULT_BUDGETS)
+    for value in values:
+        module, _, milliseconds = value.partition("=")
+        budgets[module] = float(milliseconds)
+    return budgets
+
+
+def main():
+    """
+    Измерение времени импорта и сравнение с бюджетами.
+    """
+    parser = argparse.ArgumentParser(description='Проверка времени запуска API и CLI')
+    parser.add_argument('--budget', action='append', default=[],
+                      help='Бюджет модуля в миллисекундах, например api=1500 (можно повторять)')
+    parser.add_argument('--repeat', type=int, default=3,
+                      help='Число измерений; берется минимальное (по умолчанию: 3)')
+    args = parser.parse_args()
+
+    budgets = parse_budgets(args.budget)
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    failed = False
+
+    for module, budget in budgets.items():
+        elapsed, eager = check_import(module, cwd, args.repeat)
+
+        status = "OK"
+        if elapsed > budget:
+            status = "SLOW"
+            failed = True
+        if eager:
+            status = "EAGER"
+            failed = True
+        print(f"{module:<20} {elapsed:8.1f} ms  (бюджет {budget:.0f} ms)  {status}")
+        if eager:
+            print(f"    при старте загружены: {', '.join(eager)}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
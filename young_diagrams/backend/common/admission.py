@@ -0,0 +1,300 @@
+import math
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import numpy as np
+
+from common.result import ENGINE_VERSION
+
+# Начальные коэффициенты модели seconds = coefficient * runs * steps ** exponent,
+# измеренные на эталонном движке; уточняются по фактическому времени задач
+DEFAULT_COST_COEFFICIENTS = {
+    (2, "reference-1"): (3.3e-7, 2.0),
+    (3, "reference-1"): (1.4e-6, 1.9),
+}
+
+# Решения контроля допуска
+ADMIT = "admit"
+QUEUE = "queue"
+DOWNGRADE = "downgrade"
+REJECT = "reject"
+
+CHEAP = "cheap"
+EXPENSIVE = "expensive"
+
+
+class CostModel:
+    """
+    Оценка стоимости симуляции в CPU-секундах.
+
+    Время одного запуска растёт степенным образом от числа шагов, поэтому модель --
+    seconds = coefficient * runs * steps ** exponent для каждой пары (размерность, движок).
+    Коэффициенты подбираются методом наименьших квадратов в логарифмах по
+    последним наблюдениям; до накопления наблюдений используются значения по умолчанию.
+
+    Наблюдения хранятся в памяти процесса и не сохраняются: у каждого воркера
+    API своя модель, и после перезапуска она снова начинает со значений по умолчанию.
+    """
+    def __init__(self, window: int = 200, min_observations: int = 8):
+        """
+        Параметры:
+        -----------
+        window : int, default=200
+            Сколько последних наблюдений учитывать для каждой пары (размерность, движок).
+        min_observations : int, default=8
+            Минимальное число наблюдений для подбора коэффициентов.
+        """
+        self.window = window
+        self.min_observations = min_observations
+        self.coefficients: Dict[Tuple[int, str], Tuple[float, float]] = dict(DEFAULT_COST_COEFFICIENTS)
+        self._observations: Dict[Tuple[int, str], Deque[Tuple[float, float]]] = {}
+        self._lock = threading.Lock()
+
+    def estimate(self, dimension: int, steps: int, runs: int, engine: str = ENGINE_VERSION) -> float:
+        """
+        Оценка времени симуляции в секундах.
+        """
+        coefficient, exponent = self.coefficients.get((dimension, engine),
+                                                      DEFAULT_COST_COEFFICIENTS[(dimension, ENGINE_VERSION)])
+        return coefficient * runs * steps ** exponent
+
+    def max_steps(self, dimension: int, runs: int, seconds: float, engine: str = ENGINE_VERSION) -> int:
+        """
+        Наибольшее число шагов, укладывающееся в seconds при данном числе запусков.
+        """
+        coefficient, exponent = self.coefficients.get((dimension, engine),
+                                                      DEFAULT_COST_COEFFICIENTS[(dimension, ENGINE_VERSION)])
+        return int((seconds / (coefficient * runs)) ** (1.0 / exponent))
+
+    def observe(self, dimension: int, steps: int, runs: int, elapsed: float,
+                engine: str = ENGINE_VERSION) -> None:
+        """
+        Учёт фактического времени завершённой симуляции и пересчёт коэффициентов.
+        """
+        if elapsed <= 0 or steps <= 0 or runs <= 0:
+            return
+        key = (dimension, engine)
+        with self._lock:
+            observations = self._observations.setdefault(key, deque(maxlen=self.window))
+            observations.append((math.log(steps), math.log(elapsed / runs)))
+            if len(observations) < self.min_observations:
+                return
+            x, y = np.array(observations).T
+            if np.ptp(x) < math.log(2):
+                # Все наблюдения при близком числе шагов: подбираем только коэффициент
+                _, exponent = self.coefficients.get(key, DEFAULT_COST_COEFFICIENTS[(dimension, ENGINE_VERSION)])
+                self.coefficients[key] = (math.exp(float(np.mean(y - exponent * x))), exponent)
+            else:
+                exponent, intercept = np.polyfit(x, y, 1)
+                self.coefficients[key] = (math.exp(intercept), float(exponent))
+
+    def info(self) -> Dict[str, Any]:
+        """
+        Текущие коэффициенты и число наблюдений.
+        """
+        with self._lock:
+            return {
+                f"{dimension}d/{engine}": {
+                    "coefficient": coefficient,
+                    "exponent": exponent,
+                    "observations": len(self._observations.get((dimension, engine), ())),
+                }
+                for (dimension, engine), (coefficient, exponent) in self.coefficients.items()
+            }
+
+
+class AdmissionDecision:
+    """
+    Решение по запросу на симуляцию.
+    """
+    def __init__(self, action: str, estimate: float, lane: str, runs: int, steps: int,
+                 retry_after: Optional[float] = None, reason: Optional[str] = None):
+        self.action = action
+        self.estimate = estimate
+        self.lane = lane
+        self.runs = runs
+        self.steps = steps
+        self.retry_after = retry_after
+        self.reason = reason
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "action": self.action,
+            "estimate_seconds": self.estimate,
+            "lane": self.lane,
+            "runs": self.runs,
+            "steps": self.steps,
+            "retry_after": self.retry_after,
+            "reason": self.reason,
+        }
+
+
+class AdmissionController:
+    """
+    Контроль допуска симуляций по оценке их стоимости.
+
+    Дешёвые запросы (оценка не больше cheap_seconds) допускаются сразу. Дорогие
+    выполняются в отдельной полосе, которая занимает не все процессы пула: сверх
+    её лимита они ждут в очереди допуска, не загораживая дешёвым запросам пул.
+    Если ожидаемое ожидание дорогого запроса больше max_queue_wait, запрос
+    упрощается (если клиент это разрешил) или отклоняется с Retry-After.
+
+    Лимит полосы дорогих задач и порог дешёвых запросов подстраиваются по p99
+    задержки дешёвых: пока он выше target_latency, полоса дорогих задач
+    сужается на один процесс (не меньше одного), а когда сужать уже некуда
+    (например, при одном-двух процессах), порог cheap_seconds уменьшается вдвое
+    (не ниже восьмой части исходного), и средние запросы уходят в полосу дорогих.
+    Когда p99 опускается ниже target_latency / 2, настройки возвращаются в
+    обратном порядке. Как и модель стоимости, это состояние своё у каждого процесса API.
+    """
+    def __init__(self, cost_model: CostModel, workers: int, cheap_seconds: float = 2.0,
+                 max_queue_wait: float = 120.0, target_latency: float = 5.0, window: int = 200):
+        """
+        Параметры:
+        -----------
+        cost_model : CostModel
+            Модель стоимости.
+        workers : int
+            Количество процессов пула.
+        cheap_seconds : float, default=2.0
+            Порог оценки, ниже которого запрос считается дешёвым.
+        max_queue_wait : float, default=120.0
+            Наибольшее ожидаемое ожидание дорогого запроса в очереди допуска, в секундах.
+        target_latency : float, default=5.0
+            Целевое значение p99 задержки дешёвых запросов, в секундах.
+        window : int, default=200
+            Сколько последних дешёвых запросов учитывать при расчёте p99.
+        """
+        self.cost_model = cost_model
+        self.workers = workers
+        self.base_cheap_seconds = cheap_seconds
+        self.cheap_seconds = cheap_seconds
+        self.max_queue_wait = max_queue_wait
+        self.target_latency = target_latency
+        # Один процесс остаётся дешёвым запросам, если процессов больше одного
+        self.base_expensive_limit = max(1, workers - 1)
+        self.expensive_limit = self.base_expensive_limit
+        self._latencies: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.stats = {ADMIT: 0, QUEUE: 0, DOWNGRADE: 0, REJECT: 0}
+
+    def classify(self, estimate: float) -> str:
+        """
+        Полоса запроса по оценке его стоимости.
+        """
+        return CHEAP if estimate <= self.cheap_seconds else EXPENSIVE
+
+    def expected_wait(self, load: Dict[str, float]) -> float:
+        """
+        Ожидаемое время до начала нового дорогого запроса.
+
+        Параметры:
+        -----------
+        load : Dict[str, float]
+            Загрузка полосы дорогих задач (JobManager.lane_load): in_flight, held,
+            running_cost и held_cost.
+        """
+        if load["in_flight"] < self.expensive_limit and not load["held"]:
+            return 0.0
+        # Выполняющиеся задачи в среднем пройдены наполовину
+        return (load["held_cost"] + load["running_cost"] / 2) / self.expensive_limit
+
+    def decide(self, dimension: int, steps: int, runs: int, load: Dict[str, float],
+               allow_downgrade: bool = False, allow_reject: bool = True, min_steps: int = 10,
+               engine: str = ENGINE_VERSION) -> AdmissionDecision:
+        """
+        Решение по запросу.
+
+        Параметры:
+        -----------
+        dimension, steps, runs : int
+            Параметры симуляции.
+        load : Dict[str, float]
+            Загрузка полосы дорогих задач (см. expected_wait).
+        allow_downgrade : bool, default=False
+            Можно ли уменьшить runs и steps вместо отказа.
+        allow_reject : bool, default=True
+            Можно ли отклонить запрос; иначе дорогой запрос всегда ставится в очередь.
+        min_steps : int, default=10
+            Наименьшее допустимое число шагов при упрощении.
+        """
+        estimate = self.cost_model.estimate(dimension, steps, runs, engine)
+        lane = self.classify(estimate)
+        if lane == CHEAP:
+            return self._count(AdmissionDecision(ADMIT, estimate, lane, runs, steps))
+
+        wait = self.expected_wait(load)
+        if wait <= 0:
+            return self._count(AdmissionDecision(ADMIT, estimate, lane, runs, steps))
+        if wait <= self.max_queue_wait or not allow_reject:
+            return self._count(AdmissionDecision(QUEUE, estimate, lane, runs, steps))
+
+        retry_after = wait - self.max_queue_wait
+        if allow_downgrade:
+            # Сначала уменьшаем число запусков, затем число шагов, пока запрос не станет дешёвым
+            budget = self.cheap_seconds
+            new_runs = max(1, min(runs, int(budget / self.cost_model.estimate(dimension, steps, 1, engine))))
+            new_steps = min(steps, self.cost_model.max_steps(dimension, new_runs, budget, engine))
+            if new_steps >= min_steps:
+                new_estimate = self.cost_model.estimate(dimension, new_steps, new_runs, engine)
+                return self._count(AdmissionDecision(
+                    DOWNGRADE, new_estimate, CHEAP, new_runs, new_steps,
+                    reason=f"Ожидание дорогих задач около {wait:.1f} с; запрос упрощен"))
+        return self._count(AdmissionDecision(
+            REJECT, estimate, lane, runs, steps, retry_after=retry_after,
+            reason=f"Ожидание дорогих задач около {wait:.1f} с превышает {self.max_queue_wait:.0f} с"))
+
+    def _count(self, decision: AdmissionDecision) -> AdmissionDecision:
+        with self._lock:
+            self.stats[decision.action] += 1
+        return decision
+
+    def observe_latency(self, lane: str, latency: float) -> None:
+        """
+        Учёт задержки завершённой задачи и подстройка лимита полосы дорогих задач
+        и порога дешёвых запросов (по одному шагу на окно наблюдений).
+        """
+        if lane != CHEAP:
+            return
+        with self._lock:
+            self._latencies.append(latency)
+            if len(self._latencies) < 20:
+                return
+            p99 = float(np.percentile(self._latencies, 99))
+            limit, cheap_seconds = self.expensive_limit, self.cheap_seconds
+            if p99 > self.target_latency:
+                if limit > 1:
+                    limit -= 1
+                else:
+                    cheap_seconds = max(self.base_cheap_seconds / 8, cheap_seconds / 2)
+            elif p99 < self.target_latency / 2:
+                if cheap_seconds < self.base_cheap_seconds:
+                    cheap_seconds = min(self.base_cheap_seconds, cheap_seconds * 2)
+                else:
+                    limit = min(self.base_expensive_limit, limit + 1)
+            if (limit, cheap_seconds) != (self.expensive_limit, self.cheap_seconds):
+                self.expensive_limit, self.cheap_seconds = limit, cheap_seconds
+                # Следующий шаг -- по задержкам, измеренным уже с новыми настройками
+                self._latencies.clear()
+
+    def cheap_p99(self) -> Optional[float]:
+        """
+        p99 задержки дешёвых запросов по последним наблюдениям.
+        """
+        with self._lock:
+            return float(np.percentile(self._latencies, 99)) if self._latencies else None
+
+    def info(self) -> Dict[str, Any]:
+        """
+        Настройки, счётчики решений и текущий лимит полосы дорогих задач.
+        """
+        return {
+            "cheap_seconds": self.cheap_seconds,
+            "max_queue_wait": self.max_queue_wait,
+            "target_latency": self.target_latency,
+            "expensive_limit": self.expensive_limit,
+            "cheap_p99": self.cheap_p99(),
+            "decisions": dict(self.stats),
+            "cost_model": self.cost_model.info(),
+        }
@@ -0,0 +1,170 @@
+import itertools
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from common.cache import params_key
+from common.jobs import FINISHED_STATUSES, JOB_DONE
+
+# Максимальное число точек в одном пакете
+MAX_BATCH_POINTS = 512
+
+
+def expand_grid(steps: Sequence[int], alpha: Sequence[float], runs: Sequence[int]) -> List[Dict[str, Any]]:
+    """
+    Декартово произведение значений параметров.
+
+    Параметры:
+    -----------
+    steps : Sequence[int]
+        Значения числа шагов.
+    alpha : Sequence[float]
+        Значения параметра альфа.
+    runs : Sequence[int]
+        Значения числа повторений.
+
+    Возвращает:
+    --------
+    List[Dict[str, Any]]
+        Точки {"steps", "alpha", "runs"} в порядке steps, alpha, runs.
+    """
+    return [{"steps": s, "alpha": a, "runs": r} for s, a, r in itertools.product(steps, alpha, runs)]
+
+
+class Batch:
+    """
+    Пакет симуляций по сетке параметров.
+
+    Каждая точка ссылается на задачу; одинаковые после канонизации точки
+    ссылаются на одну задачу, а уже посчитанные обслуживаются из кэша.
+    """
+    def __init__(self, dimension: int, points: List[Dict[str, Any]], batch_id: Optional[str] = None):
+        """
+        Параметры:
+        -----------
+        dimension : int
+            Размерность диаграммы (2 или 3).
+        points : List[Dict[str, Any]]
+            Точки сетки параметров.
+        batch_id : str, optional
+            Идентификатор пакета. По умолчанию генерируется.
+        """
+        self.id = batch_id or uuid.uuid4().hex
+        self.dimension = dimension
+        self.points = points
+        self.job_ids: List[Optional[str]] = [None] * len(points)
+        self.duplicate_of: List[Optional[int]] = [None] * len(points)
+        self.created_at = time.time()
+
+    def submit(self, key: Callable[[Dict[str, Any]], str], submit: Callable[[Dict[str, Any]], str]) -> None:
+        """
+        Ставит точки в очередь, объединяя одинаковые.
+
+        Параметры:
+        -----------
+        key : Callable
+            Ключ точки для дедупликации внутри пакета.
+        submit : Callable
+            Постановка точки в очередь (или ответ из кэша); возвращает идентификатор задачи.
+        """
+        first: Dict[str, int] = {}
+        for index, point in enumerate(self.points):
+            point_key = key(point)
+            if point_key in first:
+                self.duplicate_of[index] = first[point_key]
+                self.job_ids[index] = self.job_ids[first[point_key]]
+                continue
+            first[point_key] = index
+            self.job_ids[index] = submit(point)
+
+    def unique_count(self) -> int:
+        """
+        Количество различных точек пакета.
+        """
+        return sum(1 for duplicate in self.duplicate_of if duplicate is None)
+
+    def to_record(self) -> Dict[str, Any]:
+        """
+        Запись пакета для хранилища.
+        """
+        return {
+            "batch_id": self.id,
+            "dimension": self.dimension,
+            "points": self.points,
+            "job_ids": self.job_ids,
+            "duplicate_of": self.duplicate_of,
+            "created_at": self.created_at,
+        }
+
+    @classmethod
+    def from_record(cls, record: Dict[str, Any]) -> "Batch":
+        """
+        Восстановление пакета из записи хранилища.
+        """
+        batch = cls(record["dimension"], record["points"], batch_id=record["batch_id"])
+        batch.job_ids = record["job_ids"]
+        batch.duplicate_of = record["duplicate_of"]
+        batch.created_at = record["created_at"]
+        return batch
+
+    def manifest(self, jobs: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Манифест пакета: идентификаторы результатов и время по каждой точке.
+
+        Параметры:
+        -----------
+        jobs : Dict[str, Dict[str, Any]]
+            Описания задач пакета (Job.to_dict()) по идентификатору.
+        """
+        points = []
+        statuses: Dict[str, int] = {}
+        compute_total = 0.0
+        finished_at = []
+        for index, (point, job_id) in enumerate(zip(self.points, self.job_ids)):
+            job = jobs.get(job_id) or {}
+            status = job.get("status", "unknown")
+            duplicate = self.duplicate_of[index] is not None
+            compute = job.get("compute_seconds")
+            wall = None
+            if job.get("finished_at") is not None:
+                wall = max(0.0, job["finished_at"] - job["created_at"])
+                finished_at.append(job["finished_at"])
+            if compute is not None and not duplicate and not job.get("cached"):
+                compute_total += compute
+            statuses[status] = statuses.get(status, 0) + 1
+            points.append({
+                "index": index,
+                "params": point,
+                "job_id": job_id,
+                "status": status,
+                "result_id": job.get("result_id"),
+                "seed": (job.get("params") or {}).get("seed"),
+                "cached": bool(job.get("cached")),
+                "duplicate_of": self.duplicate_of[index],
+                "error": job.get("error"),
+                "timing": {"wall_seconds": wall, "compute_seconds": compute},
+            })
+
+        done = all(point["status"] in FINISHED_STATUSES for point in points)
+        elapsed = (max(finished_at) if done and finished_at else time.time()) - self.created_at
+        return {
+            "batch_id": self.id,
+            "dimension": self.dimension,
+            "status": "done" if done else "running",
+            "total": len(points),
+            "unique": self.unique_count(),
+            "statuses": statuses,
+            "succeeded": statuses.get(JOB_DONE, 0),
+            "created_at": self.created_at,
+            "elapsed_seconds": elapsed,
+            "compute_seconds": compute_total,
+            "points": points,
+        }
+
+
+def point_key(dimension: int, point: Dict[str, Any]) -> str:
+    """
+    Ключ точки для дедупликации: канонические параметры и зерно, если оно задано.
+    """
+    key = params_key(dict(point, dimension=dimension))
+    return key if point.get("seed") is None else f"{key}-{point['seed']}"
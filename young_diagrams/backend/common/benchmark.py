@@ -0,0 +1,293 @@
+import contextlib
+import gc
+import hashlib
+import io
+import os
+import platform
+import random
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from common.result import ENGINE_VERSION, SimulationResult
+
+BENCHMARK_VERSION = 1
+
+# Размеры по умолчанию: шаги, запуски или ячейки результата -- в зависимости от случая
+STEP_SIZES_2D = (250, 500, 1000, 2000)
+STEP_SIZES_3D = (100, 200, 400, 800)
+RUN_SIZES = (1, 2, 4, 8)
+CELL_SIZES = (5000, 20000, 80000, 320000)
+RENDER_SIZES = (5000, 20000, 80000)
+
+# Шаги одного запуска в случаях накопления по числу запусков
+ACCUMULATE_STEPS = {2: 300, 3: 150}
+
+
+def machine_info() -> Dict[str, Any]:
+    """
+    Описание машины, от которой зависят абсолютные времена.
+    """
+    return {
+        "node": platform.node(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+    }
+
+
+def machine_tag(machine: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Короткая метка машины для имени файла базовых замеров: имя узла и хэш описания.
+    """
+    machine = machine or machine_info()
+    digest = hashlib.sha1(repr(sorted(machine.items())).encode("utf-8")).hexdigest()[:8]
+    node = "".join(c if c.isalnum() or c in "-_" else "_" for c in str(machine["node"])) or "machine"
+    return f"{node}-{digest}"
+
+
+def synthetic_result(dimension: int, cells: int, runs: int = 100) -> SimulationResult:
+    """
+    Детерминированный результат около cells ячеек для замеров, не зависящих от симуляции.
+
+    Ячейки -- часть шара (x^2 + y^2 [+ z^2] < r^2) в положительном октанте;
+    количество убывает с расстоянием до начала координат, поэтому ячейки
+    образуют допустимую диаграмму с невозрастающими вдоль осей частотами, как
+    у накопленного ансамбля.
+    """
+    # Объём части шара: pi r^2 / 4 в 2D и pi r^3 / 6 в 3D
+    radius = (4 * cells / np.pi) ** 0.5 if dimension == 2 else (6 * cells / np.pi) ** (1 / 3)
+    extent = int(np.ceil(radius))
+    grid = np.indices((extent,) * dimension).reshape(dimension, -1).T
+    distance = np.sqrt((grid.astype(np.float64) ** 2).sum(axis=1))
+    inside = distance < radius
+    coords = grid[inside].astype(np.int32)
+    counts = np.maximum(1, np.round(runs * (1 - distance[inside] / radius))).astype(np.uint32)
+    params = {"steps": len(coords), "alpha": 1.0, "runs": runs, "seed": 0, "engine": ENGINE_VERSION}
+    return SimulationResult(dimension, coords, counts, params)
+
+
+def _quiet(function: Callable[[], Any]) -> Callable[[], Any]:
+    """
+    Вызов без вывода в stdout (симуляторы печатают ход запусков).
+    """
+    def call() -> Any:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return function()
+    return call
+
+
+def _simulator(dimension: int) -> Any:
+    if dimension == 2:
+        from diagrams2d import DiagramSimulator2D
+        return DiagramSimulator2D()
+    from diagrams3d import DiagramSimulator3D
+    return DiagramSimulator3D()
+
+
+def _diagram(dimension: int) -> Any:
+    if dimension == 2:
+        from diagrams2d.young_diagram import Diagram2D
+        return Diagram2D
+    from diagrams3d.young_diagram import Diagram3D
+    return Diagram3D
+
+
+def _steps_case(dimension: int) -> Callable[[int], Tuple[Callable[[], Any], int]]:
+    diagram_class = _diagram(dimension)
+
+    def prepare(size: int) -> Tuple[Callable[[], Any], int]:
+        return lambda: diagram_class(rng=random.Random(0)).simulate(n_steps=size, alpha=1.0), size
+    return prepare
+
+
+def _accumulate_case(dimension: int) -> Callable[[int], Tuple[Callable[[], Any], int]]:
+    def prepare(size: int) -> Tuple[Callable[[], Any], int]:
+        simulator = _simulator(dimension)
+        return _quiet(lambda: simulator.simulate(n_steps=ACCUMULATE_STEPS[dimension], alpha=1.0,
+                                                 runs=size, seed=0)), size
+    return prepare
+
+
+def _limit_shape_case(dimension: int) -> Callable[[int], Tuple[Callable[[], Any], int]]:
+    from common.limit_shape import limit_shape_grid
+
+    def prepare(size: int) -> Tuple[Callable[[], Any], int]:
+        result = synthetic_result(dimension, size)
+        return lambda: limit_shape_grid(result), result.size
+    return prepare
+
+
+def _render_case(dimension: int) -> Callable[[int], Tuple[Callable[[], Any], int]]:
+    from common.rendering import use_headless_backend
+
+    use_headless_backend()
+
+    def prepare(size: int) -> Tuple[Callable[[], Any], int]:
+        import matplotlib.pyplot as plt
+
+        result = synthetic_result(dimension, size)
+        simulator = _simulator(dimension)
+        simulator.load_result(result)
+        filename = os.path.join(tempfile.gettempdir(), f"young_benchmark_{os.getpid()}.png")
+
+        def render() -> None:
+            plt.close(simulator.visualize(filename=filename, show=False))
+        return render, result.size
+    return prepare
+
+
+def _serialize_case(dimension: int, fmt: str) -> Callable[[int], Tuple[Callable[[], Any], int]]:
+    from common.encoding import encode_json, encode_result, frontend_cells
+
+    def prepare(size: int) -> Tuple[Callable[[], Any], int]:
+        result = synthetic_result(dimension, size)
+        if fmt == "json":
+            # Как ответ API по умолчанию: список словарей ячеек фронтенда
+            return lambda: encode_json({"cells": frontend_cells(result)}), result.size
+        return lambda: encode_result(result, fmt), result.size
+    return prepare
+
+
+# Случаи: имя -> (описание, что откладывается по оси n, размеры, подготовка)
+# Подготовка по размеру возвращает замеряемую функцию без аргументов и фактическое n.
+CASES: Dict[str, Tuple[str, str, Tuple[int, ...], Callable[[], Callable[[int], Tuple[Callable[[], Any], int]]]]] = {
+    "steps_2d": ("Рост одной 2D диаграммы", "шаги", STEP_SIZES_2D, lambda: _steps_case(2)),
+    "steps_3d": ("Рост одной 3D диаграммы", "шаги", STEP_SIZES_3D, lambda: _steps_case(3)),
+    "accumulate_2d": ("Ансамбль 2D с накоплением", "запуски", RUN_SIZES, lambda: _accumulate_case(2)),
+    "accumulate_3d": ("Ансамбль 3D с накоплением", "запуски", RUN_SIZES, lambda: _accumulate_case(3)),
+    "limit_shape_2d": ("Предельная форма 2D на сетке", "ячейки", CELL_SIZES, lambda: _limit_shape_case(2)),
+    "limit_shape_3d": ("Предельная форма 3D на сетке", "ячейки", CELL_SIZES, lambda: _limit_shape_case(3)),
+    "render_2d": ("Растровая визуализация 2D в PNG", "ячейки", RENDER_SIZES, lambda: _render_case(2)),
+    "render_3d": ("Растровая визуализация 3D в PNG", "ячейки", RENDER_SIZES, lambda: _render_case(3)),
+    "serialize_json_2d": ("Ответ API 2D в JSON", "ячейки", CELL_SIZES, lambda: _serialize_case(2, "json")),
+    "serialize_json_3d": ("Ответ API 3D в JSON", "ячейки", CELL_SIZES, lambda: _serialize_case(3, "json")),
+    "serialize_binary_3d": ("Ответ API 3D в бинарном формате", "ячейки", CELL_SIZES,
+                            lambda: _serialize_case(3, "binary")),
+}
+
+
+def measure(function: Callable[[], Any], repeat: int = 3) -> float:
+    """
+    Наименьшее время из repeat вызовов в секундах.
+
+    Как timeit: сборщик мусора на время вызова отключается, а наименьшее
+    время меньше всего зависит от посторонней нагрузки на машину.
+    """
+    best = float("inf")
+    for _ in range(max(1, repeat)):
+        gc.collect()
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - started)
+        finally:
+            if enabled:
+                gc.enable()
+    return best
+
+
+def fit_exponent(sizes: List[float], seconds: List[float]) -> Dict[str, float]:
+    """
+    Эмпирический показатель сложности: наклон прямой МНК в координатах log n, log t.
+
+    Параметры:
+    -----------
+    sizes : List[float]
+        Размеры задачи n.
+    seconds : List[float]
+        Времена при этих размерах.
+
+    Возвращает:
+    --------
+    Dict[str, float]
+        exponent -- показатель k в t ~ c * n^k, coefficient -- c, r2 -- доля
+        объяснённой дисперсии log t (близость к степенному закону).
+    """
+    x, y = np.log(np.asarray(sizes, dtype=np.float64)), np.log(np.asarray(seconds, dtype=np.float64))
+    if len(x) < 2 or np.ptp(x) == 0:
+        return {"exponent": float("nan"), "coefficient": float("nan"), "r2": float("nan")}
+    slope, intercept = np.polyfit(x, y, 1)
+    residual = y - (slope * x + intercept)
+    total = ((y - y.mean()) ** 2).sum()
+    r2 = 1 - (residual ** 2).sum() / total if total > 0 else 1.0
+    return {"exponent": float(slope), "coefficient": float(np.exp(intercept)), "r2": float(r2)}
+
+
+def run_case(name: str, sizes: Optional[Tuple[int, ...]] = None, repeat: int = 3) -> Dict[str, Any]:
+    """
+    Замер одного случая на всех размерах и подгонка показателя сложности.
+
+    Параметры:
+    -----------
+    name : str
+        Имя случая из CASES.
+    sizes : Tuple[int, ...], optional
+        Размеры вместо размеров случая по умолчанию.
+    repeat : int, default=3
+        Число повторов на размер (берётся наименьшее время).
+
+    Возвращает:
+    --------
+    Dict[str, Any]
+        Описание, ось n, точки {size, n, seconds} и подгонка fit_exponent.
+    """
+    description, axis, default_sizes, factory = CASES[name]
+    prepare = factory()
+    points = []
+    for index, size in enumerate(sizes or default_sizes):
+        function, n = prepare(size)
+        if index == 0:
+            # Первый вызов платит за импорты и прогрев кэшей -- он не замеряется
+            function()
+        points.append({"size": size, "n": n, "seconds": measure(function, repeat)})
+    fit = fit_exponent([point["n"] for point in points], [point["seconds"] for point in points])
+    return {"description": description, "axis": axis, "points": points, **fit}
+
+
+def compare_runs(report: Dict[str, Any], baseline: Dict[str, Any], max_regression: float = 0.25,
+                 min_delta_ms: float = 5.0, max_exponent_increase: float = 0.2) -> Tuple[List[str], List[str]]:
+    """
+    Регрессии относительно базовых замеров.
+
+    Время на размере считается регрессией, если оно выросло больше чем в
+    1 + max_regression раз и больше чем на min_delta_ms; это сравнение имеет
+    смысл только на той же машине, поэтому при другой метке машины оно
+    пропускается. Показатель сложности от машины почти не зависит и
+    сравнивается всегда: рост больше чем на max_exponent_increase --
+    регрессия масштабируемости.
+
+    Возвращает:
+    --------
+    Tuple[List[str], List[str]]
+        Регрессии и предупреждения о несопоставимых условиях замеров.
+    """
+    problems, warnings = [], []
+    same_machine = baseline.get("machine_tag") == report["machine_tag"]
+    if not same_machine:
+        warnings.append(f"предупреждение: базовые замеры сняты на другой машине ({baseline.get('machine_tag')}), "
+                        f"сравниваются только показатели сложности")
+    if baseline.get("engine") != report["engine"]:
+        warnings.append(f"предупреждение: версия движка {baseline.get('engine')} -> {report['engine']}")
+    for name, case in report["cases"].items():
+        old = baseline.get("cases", {}).get(name)
+        if not old:
+            continue
+        if same_machine:
+            before_by_size = {point["size"]: point["seconds"] for point in old["points"]}
+            for point in case["points"]:
+                before, after = before_by_size.get(point["size"]), point["seconds"]
+                if before is not None and after > before * (1 + max_regression) \
+                        and (after - before) * 1000 > min_delta_ms:
+                    problems.append(f"{name}: n={point['n']}: {before * 1000:.1f} -> {after * 1000:.1f} ms")
+        if [point["size"] for point in old["points"]] != [point["size"] for point in case["points"]]:
+            warnings.append(f"предупреждение: {name}: показатели подогнаны по разным размерам")
+        if case["exponent"] > old["exponent"] + max_exponent_increase:
+            problems.append(f"{name}: показатель сложности {old['exponent']:.2f} -> {case['exponent']:.2f}")
+    return problems, warnings
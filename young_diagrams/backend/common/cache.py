@@ -0,0 +1,158 @@
+import hashlib
+import json
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from common.result import SimulationResult, ENGINE_VERSION
+from common.store import ResultStore
+
+
+def canonical_params(dimension: int, steps: int, alpha: float, runs: int,
+                     engine: str = ENGINE_VERSION) -> Dict[str, Any]:
+    """
+    Канонический вид параметров симуляции, не зависящий от способа их передачи.
+    """
+    return {
+        "dimension": int(dimension),
+        "steps": int(steps),
+        "alpha": round(float(alpha), 12),
+        "runs": int(runs),
+        "engine": engine,
+    }
+
+
+def params_key(params: Dict[str, Any]) -> str:
+    """
+    Хэш канонических параметров симуляции (без зерна).
+    """
+    canonical = canonical_params(params["dimension"], params["steps"], params["alpha"],
+                                 params["runs"], params.get("engine", ENGINE_VERSION))
+    payload = json.dumps(canonical, sort_keys=True).encode("utf-8")
+    return hashlib.sha256(payload).hexdigest()[:24]
+
+
+def result_key(params: Dict[str, Any], seed: int) -> str:
+    """
+    Ключ результата: хэш параметров и зерно генератора.
+    """
+    return f"{params_key(params)}-{int(seed)}"
+
+
+def new_result_id(params: Dict[str, Any], seed: int, truncated: bool = False) -> str:
+    """
+    Идентификатор нового результата.
+
+    Полный результат адресуется ключом параметров и зерна, поэтому повторные
+    симуляции дедуплицируются; досрочно остановленный получает уникальный
+    идентификатор и не находится поиском по параметрам.
+    """
+    if truncated:
+        return f"partial-{uuid.uuid4().hex}"
+    return result_key(params, seed)
+
+
+class ResultCache:
+    """
+    Кэш результатов симуляций поверх общего хранилища.
+
+    Первый уровень -- LRU в памяти процесса с ограничением по суммарному размеру
+    массивов, второй -- ResultStore, общий для всех воркеров. Ключ полного результата
+    строится из канонических параметров и зерна генератора, поэтому запрос без зерна
+    может быть обслужен любым уже посчитанным результатом с теми же параметрами.
+    """
+    def __init__(self, store: ResultStore, max_bytes: int = 256 * 1024 * 1024):
+        """
+        Параметры:
+        -----------
+        store : ResultStore
+            Общее хранилище результатов.
+        max_bytes : int, default=256 MiB
+            Ограничение суммарного размера результатов в памяти.
+        """
+        self.store = store
+        self.max_bytes = max_bytes
+        self._memory: "OrderedDict[str, SimulationResult]" = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: str) -> Optional[SimulationResult]:
+        """
+        Поиск результата по ключу: сначала в памяти, затем в хранилище.
+        """
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return result
+
+        try:
+            result = self.store.get(key)
+        except ValueError:
+            result = None
+        with self._lock:
+            if result is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+            return self._remember(key, result)
+
+    def find(self, params: Dict[str, Any]) -> Optional[SimulationResult]:
+        """
+        Поиск любого полного результата с данными параметрами, независимо от зерна.
+        """
+        prefix = params_key(params) + "-"
+        with self._lock:
+            for key in reversed(self._memory):
+                if key.startswith(prefix):
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return self._memory[key]
+
+        for key in self.store.find(prefix):
+            result = self.get(key)
+            if result is not None:
+                return result
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, key: str, result: SimulationResult) -> SimulationResult:
+        """
+        Сохранение результата в хранилище и в память.
+
+        Возвращает:
+        --------
+        SimulationResult
+            Результат, закреплённый за ключом (уже сохранённый ранее, если он был).
+        """
+        result.result_id = key
+        self.store.put(key, result)
+        with self._lock:
+            return self._remember(key, result)
+
+    def _remember(self, key: str, result: SimulationResult) -> SimulationResult:
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+        if result.nbytes > self.max_bytes:
+            return result
+        self._memory[key] = result
+        self._memory_bytes += result.nbytes
+        while self._memory_bytes > self.max_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.nbytes
+            self.stats["evictions"] += 1
+        return result
+
+    def info(self) -> Dict[str, Any]:
+        """
+        Счётчики попаданий и промахов и заполненность памяти.
+        """
+        with self._lock:
+            return dict(self.stats, entries=len(self._memory), memory_bytes=self._memory_bytes,
+                        max_bytes=self.max_bytes, store=type(self.store).__name__)
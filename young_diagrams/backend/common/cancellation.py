@@ -0,0 +1,101 @@
+import threading
+import time
+from typing import Any, Optional
+
+
+class CancellationToken:
+    """
+    Токен отмены симуляции.
+
+    Вызывающий код вызывает cancel(), а симуляция проверяет флаг cancelled между
+    порциями шагов. По умолчанию используется threading.Event; для передачи токена
+    в другой процесс можно подставить событие multiprocessing.Manager().Event().
+    """
+    def __init__(self, event: Optional[Any] = None):
+        """
+        Параметры:
+        -----------
+        event : Any, optional
+            Объект с методами set() и is_set(). Если None, создаётся threading.Event.
+        """
+        self._event = event if event is not None else threading.Event()
+
+    def cancel(self) -> None:
+        """
+        Запрашивает остановку симуляции.
+        """
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        """
+        True, если остановка была запрошена.
+        """
+        return self._event.is_set()
+
+
+class SimulationBudget:
+    """
+    Бюджет симуляции: ограничение по времени, по числу шагов и токен отмены.
+
+    Симулятор вызывает start() перед началом работы, consume() после каждой порции
+    шагов и проверяет exhausted(). Причина остановки сохраняется в атрибуте reason.
+    """
+    def __init__(self, time_limit: Optional[float] = None,
+                 max_steps: Optional[int] = None,
+                 token: Optional[CancellationToken] = None):
+        """
+        Параметры:
+        -----------
+        time_limit : float, optional
+            Ограничение по времени работы в секундах.
+        max_steps : int, optional
+            Ограничение на суммарное количество шагов по всем запускам.
+        token : CancellationToken, optional
+            Токен отмены.
+        """
+        self.time_limit = time_limit
+        self.max_steps = max_steps
+        self.token = token
+        self.steps_done = 0
+        self.reason: Optional[str] = None
+        self._started: Optional[float] = None
+
+    def start(self) -> None:
+        """
+        Запускает отсчёт времени и обнуляет счётчик шагов.
+        """
+        self._started = time.monotonic()
+        self.steps_done = 0
+        self.reason = None
+
+    def elapsed(self) -> float:
+        """
+        Время в секундах с момента вызова start().
+        """
+        if self._started is None:
+            return 0.0
+        return time.monotonic() - self._started
+
+    def consume(self, steps: int) -> None:
+        """
+        Учитывает выполненные шаги.
+        """
+        self.steps_done += steps
+
+    def exhausted(self) -> bool:
+        """
+        Проверяет, нужно ли остановить симуляцию.
+
+        Возвращает:
+        --------
+        bool
+            True, если симуляция отменена или бюджет исчерпан.
+        """
+        if self.token is not None and self.token.cancelled:
+            self.reason = "cancelled"
+        elif self.time_limit is not None and self.elapsed() >= self.time_limit:
+            self.reason = "time_limit"
+        elif self.max_steps is not None and self.steps_done >= self.max_steps:
+            self.reason = "step_limit"
+        return self.reason is not None
@@ -0,0 +1,120 @@
+import gzip
+import hashlib
+from typing import Any, Optional
+
+# Ответы меньше порога отправляются без сжатия: выигрыш не окупает заголовки и CPU
+DEFAULT_MIN_SIZE = 1024
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def _brotli():
+    """
+    Модуль brotli, если он установлен (brotli или brotlicffi), иначе None.
+    """
+    try:
+        import brotli
+        return brotli
+    except ImportError:
+        pass
+    try:
+        import brotlicffi
+        return brotlicffi
+    except ImportError:
+        return None
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Выбор кодирования содержимого по заголовку Accept-Encoding.
+
+    Параметры:
+    -----------
+    accept_encoding : str, optional
+        Значение заголовка Accept-Encoding.
+
+    Возвращает:
+    --------
+    str or None
+        "br" (если доступен модуль brotli), "gzip" или None -- без сжатия.
+    """
+    accepted = {}
+    for part in (accept_encoding or "").split(","):
+        fields = [field.strip() for field in part.split(";")]
+        quality = 1.0
+        for field in fields[1:]:
+            if field.startswith("q="):
+                try:
+                    quality = float(field[2:])
+                except ValueError:
+                    quality = 0.0
+        if fields[0]:
+            accepted[fields[0].lower()] = quality
+
+    candidates = ["br", "gzip"] if _brotli() is not None else ["gzip"]
+    best, best_quality = None, 0.0
+    for encoding in candidates:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    """
+    Сжатие тела ответа в выбранном кодировании.
+    """
+    if encoding == "gzip":
+        # mtime=0: одинаковое тело всегда сжимается в одинаковые байты
+        return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == "br":
+        return _brotli().compress(data, quality=BROTLI_QUALITY)
+    raise ValueError(f"Неизвестное кодирование: {encoding}")
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    Сильный ETag по частям, однозначно определяющим представление.
+
+    Результаты неизменяемы, поэтому идентификатора результата вместе с путём,
+    параметрами запроса и выбранным форматом достаточно, чтобы не кодировать
+    тело ради вычисления хэша.
+    """
+    digest = hashlib.sha256("\x1f".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def encoded_etag(etag: str, encoding: Optional[str]) -> str:
+    """
+    ETag сжатого представления: сильный валидатор различается для разных кодирований.
+    """
+    if encoding is None:
+        return etag
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    """
+    Проверка заголовка If-None-Match.
+
+    Сравнение слабое, как требует RFC 9110 для If-None-Match: префикс W/ и
+    суффикс кодирования не учитываются.
+
+    Возвращает:
+    --------
+    str or None
+        Совпавший ETag клиента (его и нужно вернуть в ответе 304) или None.
+    """
+    if not if_none_match:
+        return None
+    base = etag.strip('"')
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return etag
+        tag = candidate[2:] if candidate.startswith("W/") else candidate
+        value = tag.strip('"')
+        if value == base or value.split("-", 1)[0] == base:
+            return candidate
+    return None
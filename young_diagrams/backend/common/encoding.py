@@ -0,0 +1,245 @@
+import json
+import struct
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from common.result import SimulationResult
+
+# Типы содержимого, между которыми выбирает согласование форматов
+JSON_MEDIA_TYPE = "application/json"
+COLUMNAR_MEDIA_TYPE = "application/vnd.young.columnar+json"
+BINARY_MEDIA_TYPE = "application/octet-stream"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+FORMAT_MEDIA_TYPES = {
+    "json": JSON_MEDIA_TYPE,
+    "columnar": COLUMNAR_MEDIA_TYPE,
+    "binary": BINARY_MEDIA_TYPE,
+    "msgpack": MSGPACK_MEDIA_TYPE,
+}
+
+MEDIA_TYPE_FORMATS = {
+    JSON_MEDIA_TYPE: "json",
+    COLUMNAR_MEDIA_TYPE: "columnar",
+    BINARY_MEDIA_TYPE: "binary",
+    MSGPACK_MEDIA_TYPE: "msgpack",
+    "application/x-msgpack": "msgpack",
+}
+
+# Сигнатура бинарного формата: magic, затем длина JSON-заголовка (uint32 LE),
+# JSON-заголовок, выравнивание нулями до 4 байт и массивы из заголовка подряд
+BINARY_MAGIC = b"YDC1"
+
+AXES = ("x", "y", "z")
+
+
+def negotiate_format(accept: Optional[str], requested: Optional[str] = None) -> str:
+    """
+    Выбор формата ответа по параметру запроса или заголовку Accept.
+
+    Параметры:
+    -----------
+    accept : str, optional
+        Значение заголовка Accept.
+    requested : str, optional
+        Явно запрошенный формат (json, columnar, binary, msgpack), имеет приоритет.
+
+    Возвращает:
+    --------
+    str
+        Имя формата; по умолчанию "json" для совместимости.
+    """
+    if requested:
+        if requested not in FORMAT_MEDIA_TYPES:
+            raise ValueError(f"Неизвестный формат: {requested}")
+        return requested
+
+    best, best_quality = "json", 0.0
+    for part in (accept or "").split(","):
+        fields = [field.strip() for field in part.split(";")]
+        media_type = fields[0].lower()
+        quality = 1.0
+        for field in fields[1:]:
+            if field.startswith("q="):
+                try:
+                    quality = float(field[2:])
+                except ValueError:
+                    quality = 0.0
+        if media_type in MEDIA_TYPE_FORMATS and quality > best_quality:
+            best, best_quality = MEDIA_TYPE_FORMATS[media_type], quality
+    return best
+
+
+def encode_json(data: Any) -> bytes:
+    """
+    Компактный JSON в UTF-8, как в JSONResponse.
+    """
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def frontend_cells(result: SimulationResult, max_count: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Ячейки в формате фронтенда: список словарей {"x", "y", ["z",] "value"}.
+
+    Словари строятся один раз напрямую из массивов результата. Значения
+    нормируются на max_count (по умолчанию -- максимум самого результата;
+    для выборки из результата передаётся максимум всего результата).
+    """
+    if not result.size:
+        return []
+    values = (result.counts / (max_count or result.max_count)).tolist()
+    columns = [result.coords[:, i].tolist() for i in range(result.dimension)]
+    if result.dimension == 2:
+        return [{"x": x, "y": y, "value": v} for x, y, v in zip(columns[0], columns[1], values)]
+    return [{"x": x, "y": y, "z": z, "value": v}
+            for x, y, z, v in zip(columns[0], columns[1], columns[2], values)]
+
+
+def grid_layout(result: SimulationResult) -> Dict[str, np.ndarray]:
+    """
+    Представление 2D результата длинами строк и количествами по строкам.
+
+    Объединение диаграмм Юнга -- тоже диаграмма Юнга, поэтому строка y занимает
+    ячейки x = 0 .. row_lengths[y] - 1. Количества идут подряд по строкам
+    (сначала вся строка y = 0, затем y = 1 и т.д.).
+
+    Возвращает:
+    --------
+    Dict[str, np.ndarray]
+        row_lengths (uint32) и counts (uint32).
+    """
+    if result.dimension != 2:
+        raise ValueError("Раскладка по строкам поддерживается только для 2D")
+    if not result.size:
+        return {"row_lengths": np.zeros(0, dtype=np.uint32), "counts": np.zeros(0, dtype=np.uint32)}
+
+    x, y = result.coords[:, 0], result.coords[:, 1]
+    order = np.lexsort((x, y))
+    row_lengths = np.bincount(y, minlength=int(y.max()) + 1).astype(np.uint32)
+    return {"row_lengths": row_lengths, "counts": result.counts[order].astype(np.uint32)}
+
+
+def columnar_arrays(result: SimulationResult, layout: str = "cells") -> Dict[str, np.ndarray]:
+    """
+    Типизированные колонки результата: int32 координаты и uint32 количества,
+    либо раскладка по строкам для layout="grid".
+    """
+    if layout == "grid":
+        return grid_layout(result)
+    arrays = {axis: np.ascontiguousarray(result.coords[:, i], dtype=np.int32)
+              for i, axis in enumerate(AXES[:result.dimension])}
+    arrays["count"] = result.counts.astype(np.uint32, copy=False)
+    return arrays
+
+
+def result_header(result: SimulationResult, layout: str, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Метаданные, сопровождающие колонки во всех форматах.
+    """
+    header = {
+        "dimension": result.dimension,
+        "layout": layout,
+        "n": result.size,
+        "max_count": result.max_count,
+        "runs_completed": result.runs_completed,
+        "truncated": result.truncated,
+        "stop_reason": result.stop_reason,
+        "params": result.params,
+    }
+    if extra:
+        header.update(extra)
+    return header
+
+
+def encode_columnar_json(result: SimulationResult, layout: str = "cells",
+                         extra: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Колоночный JSON: по одному массиву на ось и на количества.
+    """
+    payload = result_header(result, layout, extra)
+    payload.update({name: array.tolist() for name, array in columnar_arrays(result, layout).items()})
+    return json.dumps(payload, separators=(",", ":")).encode("utf-8")
+
+
+def encode_binary(result: SimulationResult, layout: str = "cells",
+                  extra: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Бинарный формат: magic, длина и JSON-заголовок, затем сырые little-endian массивы.
+
+    Заголовок перечисляет массивы в поле "arrays" (имя, dtype, длина) в порядке
+    их следования; каждый массив начинается с границы 4 байт.
+    """
+    return pack_binary(result_header(result, layout, extra), columnar_arrays(result, layout))
+
+
+def pack_binary(header: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> bytes:
+    """
+    Упаковка заголовка и произвольных массивов в бинарный формат encode_binary.
+
+    Многомерные массивы записываются в C-порядке; их форма указывается в поле "shape".
+    """
+    header = dict(header)
+    header["arrays"] = [{"name": name, "dtype": array.dtype.newbyteorder("<").str, "length": array.size,
+                         **({"shape": list(array.shape)} if array.ndim > 1 else {})}
+                        for name, array in arrays.items()]
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    header_bytes += b" " * (-(len(BINARY_MAGIC) + 4 + len(header_bytes)) % 4)
+
+    parts = [BINARY_MAGIC, struct.pack("<I", len(header_bytes)), header_bytes]
+    for array in arrays.values():
+        parts.append(np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<")).tobytes())
+        parts.append(b"\0" * (-len(parts[-1]) % 4))
+    return b"".join(parts)
+
+
+def decode_binary(data: bytes) -> Dict[str, Any]:
+    """
+    Разбор бинарного формата encode_binary (для клиентов на Python и проверок).
+    """
+    if data[:4] != BINARY_MAGIC:
+        raise ValueError("Неверная сигнатура бинарного формата")
+    (header_length,) = struct.unpack("<I", data[4:8])
+    header = json.loads(data[8:8 + header_length])
+    offset = 8 + header_length
+    for spec in header["arrays"]:
+        dtype = np.dtype(spec["dtype"])
+        array = np.frombuffer(data, dtype=dtype, count=spec["length"], offset=offset)
+        header[spec["name"]] = array.reshape(spec["shape"]) if "shape" in spec else array
+        offset += dtype.itemsize * spec["length"]
+        offset += -offset % 4
+    return header
+
+
+def encode_msgpack(result: SimulationResult, layout: str = "cells",
+                   extra: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Формат msgpack: заголовок и колонки как bin-значения с сырыми little-endian массивами.
+
+    Требует пакета msgpack.
+    """
+    try:
+        import msgpack
+    except ImportError:
+        raise RuntimeError("Для формата msgpack установите пакет msgpack: pip install msgpack")
+
+    payload = result_header(result, layout, extra)
+    arrays = columnar_arrays(result, layout)
+    payload["dtypes"] = {name: array.dtype.newbyteorder("<").str for name, array in arrays.items()}
+    payload.update({name: array.astype(array.dtype.newbyteorder("<"), copy=False).tobytes()
+                    for name, array in arrays.items()})
+    return msgpack.packb(payload, use_bin_type=True)
+
+
+def encode_result(result: SimulationResult, fmt: str, layout: str = "cells",
+                  extra: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Кодирование результата в один из колоночных форматов: columnar, binary, msgpack.
+    """
+    if fmt == "columnar":
+        return encode_columnar_json(result, layout, extra)
+    if fmt == "binary":
+        return encode_binary(result, layout, extra)
+    if fmt == "msgpack":
+        return encode_msgpack(result, layout, extra)
+    raise ValueError(f"Неизвестный формат: {fmt}")
@@ -0,0 +1,371 @@
+import heapq
+import importlib
+import random
+from collections import Counter
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+# Сэмплер: (n_steps, alpha, runs, seed) -> ячейки диаграммы каждого запуска
+Sampler = Callable[[int, float, int, int], Iterable[Set[Tuple[int, ...]]]]
+
+# Ожидаемое число наблюдений в ячейке критерия хи-квадрат, меньше которого ячейки объединяются
+MIN_EXPECTED = 5.0
+
+# Наблюдаемая с не большим числом значений сравнивается критерием хи-квадрат, а не Колмогорова-Смирнова
+DISCRETE_VALUES = 30
+
+# Доля уровня ложной тревоги на сводные проверки (диаграммы, наблюдаемые); остаток -- на проверки по ячейкам
+SUMMARY_SHARE = 0.8
+
+
+def diagram_sampler(diagram_class: Any) -> Sampler:
+    """
+    Сэмплер из класса диаграммы с интерфейсом Diagram2D/Diagram3D.
+
+    Запуск номер i растит новую диаграмму с генератором random.Random(seed + i),
+    поэтому запуски независимы и воспроизводимы.
+    """
+    def sample(n_steps: int, alpha: float, runs: int, seed: int) -> Iterable[Set[Tuple[int, ...]]]:
+        for run in range(runs):
+            diagram = diagram_class(rng=random.Random(seed + run))
+            diagram.simulate(n_steps=n_steps, alpha=alpha)
+            yield diagram.cells
+    return sample
+
+
+def reference_class(dimension: int) -> Any:
+    """
+    Эталонный движок: Diagram2D или Diagram3D.
+    """
+    if dimension == 2:
+        from diagrams2d.young_diagram import Diagram2D
+        return Diagram2D
+    if dimension == 3:
+        from diagrams3d.young_diagram import Diagram3D
+        return Diagram3D
+    raise ValueError(f"Неподдерживаемая размерность: {dimension}")
+
+
+def load_sampler(spec: str) -> Sampler:
+    """
+    Сэмплер по строке "модуль:имя".
+
+    Имя -- класс диаграммы (оборачивается diagram_sampler) или функция с
+    сигнатурой Sampler, например движок, растящий запуски пачкой.
+    """
+    module_name, _, attribute = spec.partition(":")
+    if not attribute:
+        raise ValueError(f"Ожидается модуль:имя, получено: {spec}")
+    target = getattr(importlib.import_module(module_name), attribute)
+    return diagram_sampler(target) if isinstance(target, type) else target
+
+
+def exact_distribution(diagram_class: Any, n_steps: int, alpha: float = 1.0,
+                       max_states: int = 200000) -> Dict[FrozenSet[Tuple[int, ...]], float]:
+    """
+    Точное распределение диаграмм после n_steps шагов эталонного процесса.
+
+    Распределение переносится по шагам: каждая диаграмма переходит в
+    диаграммы с одной добавленной ячейкой с вероятностями, пропорциональными
+    весам calculate_weight, а добавляемые ячейки дают get_addable_cells
+    самого класса. Число диаграмм растёт как число разбиений (плоских
+    разбиений в 3D), поэтому расчёт возможен только при малых n_steps.
+
+    Параметры:
+    -----------
+    diagram_class : type
+        Класс диаграммы, задающий правила роста и веса (обычно эталонный).
+    n_steps : int
+        Число шагов.
+    alpha : float, default=1.0
+        Параметр роста.
+    max_states : int, default=200000
+        Наибольшее число диаграмм на шаге.
+
+    Возвращает:
+    --------
+    Dict[FrozenSet[Tuple[int, ...]], float]
+        Вероятность каждой диаграммы (набора ячеек).
+
+    Raises:
+    -------
+    ValueError
+        Если число диаграмм превышает max_states.
+    """
+    start = diagram_class()
+    states = {frozenset(start.cells): 1.0}
+    for step in range(n_steps):
+        following: Dict[FrozenSet[Tuple[int, ...]], float] = {}
+        for cells, probability in states.items():
+            diagram = diagram_class(initial_cells=set(cells))
+            addable = sorted(diagram.get_addable_cells())
+            if not addable:
+                following[cells] = following.get(cells, 0.0) + probability
+                continue
+            weights = np.array([diagram.calculate_weight(cell, alpha) for cell in addable], dtype=np.float64)
+            for cell, share in zip(addable, weights / weights.sum()):
+                key = cells | {cell}
+                following[key] = following.get(key, 0.0) + probability * share
+        if len(following) > max_states:
+            raise ValueError(f"На шаге {step + 1} диаграмм больше {max_states}; уменьшите n_steps")
+        states = following
+    return states
+
+
+def observables(cells: Set[Tuple[int, ...]], dimension: int) -> Dict[str, float]:
+    """
+    Наблюдаемые одного запуска: протяжённость и первый момент по каждой оси,
+    сумма координат всех ячеек и размер диагонали.
+    """
+    coords = np.array(sorted(cells), dtype=np.int64).reshape(-1, dimension)
+    values = {}
+    for axis in range(dimension):
+        values[f"extent_{axis}"] = float(coords[:, axis].max() + 1)
+        values[f"moment_{axis}"] = float(coords[:, axis].sum())
+    values["moment_total"] = float(coords.sum())
+    diagonal = 0
+    while (diagonal,) * dimension in cells:
+        diagonal += 1
+    values["diagonal"] = float(diagonal)
+    return values
+
+
+def pooled_chisquare(observed: np.ndarray, expected: np.ndarray) -> Tuple[float, int]:
+    """
+    Критерий согласия хи-квадрат с объединением редких исходов.
+
+    Два исхода с наименьшими ожидаемыми числами объединяются, пока ожидаемое
+    число каждого исхода не станет не меньше MIN_EXPECTED, чтобы асимптотика
+    хи-квадрат оставалась верной.
+
+    Возвращает:
+    --------
+    Tuple[float, int]
+        p-значение и число степеней свободы.
+    """
+    from scipy import stats
+
+    bins = [(float(e), float(o)) for e, o in zip(expected, observed)]
+    heapq.heapify(bins)
+    while len(bins) > 1 and bins[0][0] < MIN_EXPECTED:
+        expected_a, observed_a = heapq.heappop(bins)
+        expected_b, observed_b = heapq.heappop(bins)
+        heapq.heappush(bins, (expected_a + expected_b, observed_a + observed_b))
+    if len(bins) < 2:
+        return 1.0, 0
+    expected, observed = np.array(bins).T
+    statistic = float(((observed - expected) ** 2 / expected).sum())
+    dof = len(expected) - 1
+    return float(stats.chi2.sf(statistic, dof)), dof
+
+
+def holm(p_values: List[float], level: float) -> List[bool]:
+    """
+    Поправка Холма: отклонение гипотез семейства при вероятности хотя бы одной ложной тревоги не больше level.
+    """
+    order = np.argsort(p_values)
+    rejected = [False] * len(p_values)
+    for rank, index in enumerate(order):
+        if p_values[index] > level / (len(p_values) - rank):
+            break
+        rejected[index] = True
+    return rejected
+
+
+def shape_test(samples: List[FrozenSet[Tuple[int, ...]]],
+               exact: Dict[FrozenSet[Tuple[int, ...]], float]) -> Dict[str, Any]:
+    """
+    Частоты диаграмм против точных вероятностей (критерий согласия хи-квадрат).
+
+    Диаграмма, невозможная в эталонном процессе, сразу даёт p = 0.
+    """
+    counts = Counter(samples)
+    impossible = sum(count for shape, count in counts.items() if shape not in exact)
+    shapes = list(exact)
+    observed = np.array([counts.get(shape, 0) for shape in shapes])
+    expected = np.array([exact[shape] for shape in shapes]) * len(samples)
+    p_value, dof = pooled_chisquare(observed, expected)
+    if impossible:
+        p_value = 0.0
+    return {"test": "chi-square", "p_value": p_value, "dof": dof, "shapes": len(shapes),
+            "impossible_runs": impossible}
+
+
+def occupancy_tests(reference: List[Set[Tuple[int, ...]]], candidate: List[Set[Tuple[int, ...]]],
+                    exact: Optional[Dict[FrozenSet[Tuple[int, ...]], float]] = None) -> Dict[Tuple[int, ...], Dict[str, Any]]:
+    """
+    Частота попадания каждой ячейки в диаграмму: по ячейке на проверку.
+
+    С точным распределением частота кандидата сравнивается с точной
+    вероятностью ячейки (точный биномиальный критерий), иначе -- с частотой
+    эталона (точный критерий Фишера для таблицы 2x2).
+    """
+    from scipy import stats
+
+    candidate_counts = Counter(cell for cells in candidate for cell in cells)
+    results = {}
+    if exact is not None:
+        marginal: Dict[Tuple[int, ...], float] = {}
+        for shape, probability in exact.items():
+            for cell in shape:
+                marginal[cell] = marginal.get(cell, 0.0) + probability
+        for cell in sorted(set(marginal) | set(candidate_counts)):
+            p = min(marginal.get(cell, 0.0), 1.0)
+            k = candidate_counts.get(cell, 0)
+            if p >= 1.0 - 1e-12 or p <= 1e-12:
+                # Ячейка есть всегда или никогда: любое отклонение невозможно в эталоне
+                p_value = 1.0 if k == (len(candidate) if p > 0.5 else 0) else 0.0
+            else:
+                p_value = stats.binomtest(k, len(candidate), p).pvalue
+            results[cell] = {"test": "binomial", "p_value": float(p_value), "expected": p,
+                             "candidate": k / len(candidate)}
+        return results
+    reference_counts = Counter(cell for cells in reference for cell in cells)
+    for cell in sorted(set(reference_counts) | set(candidate_counts)):
+        a, b = reference_counts.get(cell, 0), candidate_counts.get(cell, 0)
+        if a == len(reference) and b == len(candidate):
+            continue
+        table = [[a, len(reference) - a], [b, len(candidate) - b]]
+        results[cell] = {"test": "fisher", "p_value": float(stats.fisher_exact(table)[1]),
+                         "reference": a / len(reference), "candidate": b / len(candidate)}
+    return results
+
+
+def binned_homogeneity(a: np.ndarray, b: np.ndarray) -> Tuple[float, int]:
+    """
+    Критерий однородности хи-квадрат для двух выборок дискретной величины.
+
+    Соседние значения объединяются, пока в интервале не наберётся
+    2 * MIN_EXPECTED наблюдений обеих выборок.
+
+    Возвращает:
+    --------
+    Tuple[float, int]
+        p-значение и число степеней свободы.
+    """
+    from scipy import stats
+
+    values = np.unique(np.concatenate([a, b]))
+    counts = np.stack([np.searchsorted(np.sort(sample), values, side="right") for sample in (a, b)])
+    counts = np.diff(counts, prepend=0, axis=1)
+    bins, current = [], np.zeros(2)
+    for column in counts.T:
+        current = current + column
+        if current.sum() >= 2 * MIN_EXPECTED:
+            bins.append(current)
+            current = np.zeros(2)
+    if current.sum() and bins:
+        bins[-1] = bins[-1] + current
+    if len(bins) < 2:
+        return 1.0, 0
+    table = np.array(bins).T
+    _, p_value, dof, _ = stats.chi2_contingency(table, correction=False)
+    return float(p_value), int(dof)
+
+
+def observable_tests(reference: List[Set[Tuple[int, ...]]], candidate: List[Set[Tuple[int, ...]]],
+                     dimension: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Распределения наблюдаемых запусков: эталон против кандидата.
+
+    Величины с малым числом значений (протяжённости, диагональ) сравниваются
+    критерием однородности хи-квадрат (binned_homogeneity): критерий
+    Колмогорова-Смирнова на таких величинах слишком консервативен и теряет
+    мощность. Для остальных -- двухвыборочный критерий Колмогорова-Смирнова.
+    """
+    from scipy import stats
+
+    reference_values = [observables(cells, dimension) for cells in reference]
+    candidate_values = [observables(cells, dimension) for cells in candidate]
+    results = {}
+    for name in reference_values[0]:
+        a = np.array([values[name] for values in reference_values])
+        b = np.array([values[name] for values in candidate_values])
+        if len(np.unique(np.concatenate([a, b]))) <= DISCRETE_VALUES:
+            p_value, dof = binned_homogeneity(a, b)
+            result = {"test": "chi-square", "p_value": p_value, "dof": dof}
+        else:
+            result = {"test": "ks", "p_value": float(stats.ks_2samp(a, b).pvalue)}
+        result.update(reference_mean=float(a.mean()), candidate_mean=float(b.mean()))
+        results[name] = result
+    return results
+
+
+def check_equivalence(candidate: Sampler, dimension: int, n_steps: int = 20, runs: int = 2000,
+                      alpha: float = 1.0, level: float = 0.01, seed: int = 0,
+                      exact_steps: Optional[int] = None, reference: Optional[Sampler] = None) -> Dict[str, Any]:
+    """
+    Проверка, что кандидат сэмплирует тот же процесс роста, что и эталон.
+
+    Семейство проверок: частоты попадания ячеек и распределения наблюдаемых
+    после n_steps шагов (эталон против кандидата), а при exact_steps --
+    частоты диаграмм и ячеек после exact_steps шагов против точных
+    вероятностей. Сводные проверки (диаграммы, наблюдаемые) получают долю
+    SUMMARY_SHARE уровня, проверки по ячейкам -- остаток; внутри каждой группы
+    действует поправка Холма, поэтому вероятность хотя бы одной ложной
+    тревоги для правильного движка не больше level.
+
+    Параметры:
+    -----------
+    candidate : Sampler
+        Проверяемый движок (см. diagram_sampler, load_sampler).
+    dimension : int
+        Размерность (2 или 3).
+    n_steps : int, default=20
+        Число шагов запусков для сравнения с эталоном.
+    runs : int, default=2000
+        Число запусков каждого движка.
+    alpha : float, default=1.0
+        Параметр роста.
+    level : float, default=0.01
+        Допустимая вероятность ложной тревоги для всего семейства проверок.
+    seed : int, default=0
+        Зерно: эталон использует зёрна seed..seed+runs-1, кандидат -- следующие.
+    exact_steps : int, optional
+        Число шагов для сравнения с точными вероятностями; None -- без него.
+    reference : Sampler, optional
+        Эталон; по умолчанию Diagram2D или Diagram3D.
+
+    Возвращает:
+    --------
+    Dict[str, Any]
+        Условия, результаты всех проверок с p-значениями и отметкой
+        отклонения, число отклонённых и итог "equivalent".
+    """
+    diagram_class = reference_class(dimension)
+    reference = reference or diagram_sampler(diagram_class)
+    reference_runs = [set(cells) for cells in reference(n_steps, alpha, runs, seed)]
+    candidate_runs = [set(cells) for cells in candidate(n_steps, alpha, runs, seed + runs)]
+
+    # Сводные проверки мощнее и получают большую часть уровня; проверки по ячейкам показывают, где отклонение
+    summary: List[Tuple[str, Dict[str, Any]]] = []
+    per_cell: List[Tuple[str, Dict[str, Any]]] = []
+    for name, result in observable_tests(reference_runs, candidate_runs, dimension).items():
+        summary.append((f"observable:{name}", result))
+    for cell, result in occupancy_tests(reference_runs, candidate_runs).items():
+        per_cell.append((f"occupancy{cell}", result))
+
+    if exact_steps is not None:
+        exact = exact_distribution(diagram_class, exact_steps, alpha)
+        small_runs = [frozenset(cells) for cells in candidate(exact_steps, alpha, runs, seed + 2 * runs)]
+        summary.append(("exact:shapes", shape_test(small_runs, exact)))
+        for cell, result in occupancy_tests([], [set(cells) for cells in small_runs], exact).items():
+            per_cell.append((f"exact:occupancy{cell}", result))
+
+    rejected = 0
+    for family, share in ((summary, SUMMARY_SHARE), (per_cell, 1 - SUMMARY_SHARE)):
+        flags = holm([result["p_value"] for _, result in family], level * share)
+        for (_, result), flag in zip(family, flags):
+            result["rejected"] = flag
+        rejected += sum(flags)
+    tests = summary + per_cell
+    return {
+        "dimension": dimension,
+        "config": {"n_steps": n_steps, "runs": runs, "alpha": alpha, "level": level, "seed": seed,
+                   "exact_steps": exact_steps},
+        "tests": dict(tests),
+        "rejected": rejected,
+        "min_p_value": min(result["p_value"] for _, result in tests),
+        "equivalent": not rejected,
+    }
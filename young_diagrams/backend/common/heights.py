@@ -0,0 +1,188 @@
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+
+def diagram_heights(cells: Iterable[Tuple[int, ...]], dimension: int) -> np.ndarray:
+    """
+    Функция высоты диаграммы на решётке.
+
+    Для 2D -- высота столбца x (число ячеек с данным x), для 3D -- высота
+    столбца (x, y).
+
+    Параметры:
+    -----------
+    cells : Iterable[Tuple[int, ...]]
+        Ячейки диаграммы.
+    dimension : int
+        Размерность диаграммы (2 или 3).
+
+    Возвращает:
+    --------
+    np.ndarray
+        Массив высот формы (max_x + 1,) для 2D или (max_x + 1, max_y + 1) для 3D.
+    """
+    coords = np.array(list(cells), dtype=np.int64).reshape(-1, dimension)
+    if not len(coords):
+        return np.zeros((0,) * (dimension - 1), dtype=np.float64)
+    base = coords[:, :dimension - 1]
+    shape = tuple(int(v) + 1 for v in base.max(axis=0))
+    flat = np.ravel_multi_index(tuple(base.T), shape)
+    return np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape).astype(np.float64)
+
+
+def _pad_to(array: np.ndarray, shape: Tuple[int, ...]) -> np.ndarray:
+    """
+    Дополнение массива нулями до формы shape (высота вне диаграммы равна 0).
+    """
+    if array.shape == shape:
+        return array
+    return np.pad(array, [(0, target - size) for size, target in zip(array.shape, shape)])
+
+
+class HeightStatistics:
+    """
+    Потоковые среднее и дисперсия функции высоты по запускам.
+
+    Хранит число запусков, среднее и сумму квадратов отклонений (M2) в каждой
+    точке решётки, то есть O(размер сетки) памяти независимо от числа
+    запусков. Запуски добавляются по алгоритму Уэлфорда, а статистики,
+    посчитанные в разных процессах, объединяются по формуле Чана, поэтому
+    результат не зависит от того, как запуски разбиты между воркерами.
+    Сетка расширяется по мере роста диаграмм: вне диаграммы высота равна 0.
+    """
+    def __init__(self, dimension: int, runs: int = 0, mean: Optional[np.ndarray] = None,
+                 m2: Optional[np.ndarray] = None):
+        """
+        Параметры:
+        -----------
+        dimension : int
+            Размерность диаграммы (2 или 3); сетка имеет размерность dimension - 1.
+        runs : int, default=0
+            Число учтённых запусков.
+        mean, m2 : np.ndarray, optional
+            Среднее и сумма квадратов отклонений в точках сетки.
+        """
+        self.dimension = dimension
+        self.runs = runs
+        empty = np.zeros((0,) * (dimension - 1))
+        self.mean = np.asarray(mean, dtype=np.float64) if mean is not None else empty
+        self.m2 = np.asarray(m2, dtype=np.float64) if m2 is not None else empty.copy()
+
+    def _grow(self, shape: Tuple[int, ...]) -> Tuple[int, ...]:
+        shape = tuple(max(a, b) for a, b in zip(self.mean.shape, shape))
+        self.mean = _pad_to(self.mean, shape)
+        self.m2 = _pad_to(self.m2, shape)
+        return shape
+
+    def add(self, heights: np.ndarray) -> None:
+        """
+        Учёт функции высоты одного запуска (шаг Уэлфорда).
+        """
+        shape = self._grow(heights.shape)
+        heights = _pad_to(np.asarray(heights, dtype=np.float64), shape)
+        self.runs += 1
+        delta = heights - self.mean
+        self.mean += delta / self.runs
+        self.m2 += delta * (heights - self.mean)
+
+    def merge(self, other: "HeightStatistics") -> "HeightStatistics":
+        """
+        Объединение со статистикой других запусков; возвращает новую статистику.
+        """
+        if other.dimension != self.dimension:
+            raise ValueError("Нельзя объединить статистики разной размерности")
+        if not other.runs:
+            return HeightStatistics(self.dimension, self.runs, self.mean.copy(), self.m2.copy())
+        if not self.runs:
+            return HeightStatistics(other.dimension, other.runs, other.mean.copy(), other.m2.copy())
+        shape = tuple(max(a, b) for a, b in zip(self.mean.shape, other.mean.shape))
+        mean_a, m2_a = _pad_to(self.mean, shape), _pad_to(self.m2, shape)
+        mean_b, m2_b = _pad_to(other.mean, shape), _pad_to(other.m2, shape)
+        runs = self.runs + other.runs
+        delta = mean_b - mean_a
+        mean = mean_a + delta * (other.runs / runs)
+        m2 = m2_a + m2_b + delta ** 2 * (self.runs * other.runs / runs)
+        return HeightStatistics(self.dimension, runs, mean, m2)
+
+    @property
+    def variance(self) -> np.ndarray:
+        """
+        Выборочная дисперсия высоты в точках сетки (с поправкой Бесселя).
+        """
+        if self.runs < 2:
+            return np.full(self.mean.shape, np.nan)
+        return self.m2 / (self.runs - 1)
+
+    def scale(self, steps: int) -> float:
+        """
+        Масштаб осей и высоты: n^(1/2) для 2D и n^(1/3) для 3D, где n = steps + 1 -- число ячеек запуска.
+        """
+        return float((steps + 1) ** (1.0 / self.dimension))
+
+    def quantile(self, confidence: float) -> float:
+        """
+        Квантиль t-распределения Стьюдента с runs - 1 степенями свободы для двусторонней полосы.
+        """
+        from scipy.stats import t
+
+        return float(t.ppf(0.5 + confidence / 2, self.runs - 1)) if self.runs > 1 else float("nan")
+
+    def bands(self, steps: int, confidence: float = 0.95) -> Dict[str, Any]:
+        """
+        Масштабированная функция высоты с поточечными доверительными полосами.
+
+        Параметры:
+        -----------
+        steps : int
+            Число шагов запуска, задающее масштаб.
+        confidence : float, default=0.95
+            Уровень доверия полос для среднего.
+
+        Возвращает:
+        --------
+        Dict[str, Any]
+            Узлы сетки по осям (x[, y]), среднее, стандартное отклонение,
+            нижняя и верхняя граница полосы и наибольшая полуширина полосы;
+            всё в масштабированных единицах.
+        """
+        scale = self.scale(steps)
+        half_width = self.quantile(confidence) * np.sqrt(self.variance / max(self.runs, 1))
+        mean = self.mean / scale
+        half_width = half_width / scale
+        bands = {axis: np.arange(size) / scale for axis, size in zip(("x", "y"), self.mean.shape)}
+        bands.update(mean=mean, std=np.sqrt(self.variance) / scale,
+                     lower=mean - half_width, upper=mean + half_width)
+        return {
+            "arrays": bands,
+            "runs": self.runs,
+            "confidence": confidence,
+            "scale": scale,
+            "max_half_width": float(np.nanmax(half_width)) if self.runs > 1 and half_width.size else None,
+        }
+
+    def runs_needed(self, target_half_width: float, steps: int, confidence: float = 0.95) -> Optional[int]:
+        """
+        Оценка числа запусков, при котором наибольшая полуширина полосы станет не больше target_half_width.
+
+        Используется нормальное приближение с текущей оценкой дисперсии: n = (z * sigma / target)^2.
+        """
+        if self.runs < 2 or not self.mean.size:
+            return None
+        from scipy.stats import norm
+
+        sigma = float(np.sqrt(self.variance.max())) / self.scale(steps)
+        z = float(norm.ppf(0.5 + confidence / 2))
+        return max(self.runs, int(np.ceil((z * sigma / target_half_width) ** 2)))
+
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Массивы для сохранения: mean и m2.
+        """
+        return {"mean": self.mean, "m2": self.m2}
+
+    def info(self) -> Dict[str, Any]:
+        """
+        Число запусков и форма сетки.
+        """
+        return {"runs": self.runs, "shape": list(self.mean.shape)}
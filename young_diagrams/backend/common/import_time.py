@@ -0,0 +1,67 @@
+"""
+Время импорта модулей по `python -X importtime` (для check_import_time.py и tests/test_import_time.py).
+"""
+import subprocess
+import sys
+from typing import List, Tuple
+
+# Бюджеты времени импорта в миллисекундах
+DEFAULT_BUDGETS = {
+    "api": 1500,
+    "run_simulation_2d": 500,
+    "run_simulation_3d": 500,
+}
+
+# Модули, которые должны импортироваться только при первой визуализации
+LAZY_MODULES = ("matplotlib", "mpl_toolkits", "scipy", "PIL", "skimage")
+
+
+def measure_import(module: str, cwd: str) -> Tuple[float, List[str]]:
+    """
+    Время импорта модуля в новом интерпретаторе.
+
+    Параметры:
+    -----------
+    module : str
+        Имя импортируемого модуля.
+    cwd : str
+        Рабочая директория интерпретатора.
+
+    Возвращает:
+    --------
+    Tuple[float, List[str]]
+        Суммарное время импорта в миллисекундах и имена всех загруженных модулей.
+    """
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=cwd, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Не удалось импортировать {module}:\n{completed.stderr}")
+
+    total_us = 0
+    loaded = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = (field.strip() for field in line[len("import time:"):].split("|"))
+        if not cumulative.isdigit():
+            continue
+        loaded.append(name)
+        # Модули верхнего уровня записаны без отступа; их суммы не пересекаются
+        if not line.split("|")[2].startswith("  "):
+            total_us += int(cumulative)
+    return total_us / 1000, loaded
+
+
+def eager_modules(loaded: List[str]) -> List[str]:
+    """
+    Загруженные при импорте пакеты из LAZY_MODULES (только имена верхнего уровня).
+    """
+    return sorted({name for name in loaded if name.split(".")[0] in LAZY_MODULES and "." not in name})
+
+
+def check_import(module: str, cwd: str, repeat: int = 3) -> Tuple[float, List[str]]:
+    """
+    Наименьшее из repeat времён импорта модуля и пакеты, загруженные раньше времени.
+    """
+    measurements = [measure_import(module, cwd) for _ in range(repeat)]
+    return min(elapsed for elapsed, _ in measurements), eager_modules(measurements[0][1])
@@ -0,0 +1,429 @@
+import asyncio
+import contextlib
+import multiprocessing
+import os
+import threading
+import time
+import tracemalloc
+import traceback
+import uuid
+from collections import OrderedDict, deque
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from typing import Any, Deque, Dict, List, Optional
+
+from common.cancellation import CancellationToken, SimulationBudget
+from common.metrics import PhaseTimer, max_rss_bytes
+from common.profiling import JobProfiler
+from common.result import SimulationResult
+from common.streaming import STREAM_END, produce_chunks
+
+# Статусы задач
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+
+FINISHED_STATUSES = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+# Число функций в сводке профиля задачи (полная сводка -- в файле профиля)
+PROFILE_SUMMARY_TOP = 10
+
+
+class JobQueueFull(Exception):
+    """
+    Очередь задач переполнена.
+    """
+
+
+def run_simulation_job(dimension: int, params: Dict[str, Any],
+                       cancel_event: Any, started_event: Any, instrument: bool = False,
+                       progress: Any = None) -> SimulationResult:
+    """
+    Выполнение симуляции в процессе пула.
+
+    Параметры:
+    -----------
+    dimension : int
+        Размерность диаграммы (2 или 3).
+    params : Dict[str, Any]
+        Параметры симуляции: steps, alpha, runs, seed и необязательные time_limit
+        и profile -- профилировщик из common.profiling.PROFILERS. С profile
+        симуляция выполняется под профилировщиком, сводка попадает в
+        stats["profile"], а файлы профиля -- в artifacts результата.
+    cancel_event : Any
+        Событие отмены, общее с родительским процессом.
+    started_event : Any
+        Событие, которое выставляется при начале выполнения.
+    instrument : bool, default=False
+        Замерять время фаз симуляции и пиковую память Python (tracemalloc).
+        Замеры заметно замедляют симуляцию, поэтому включаются явно.
+    progress : Any, optional
+        Очередь прогресса потоковой задачи: новые ячейки передаются в неё после
+        каждой порции шагов (см. common.streaming.produce_chunks), в конце --
+        STREAM_END.
+
+    Возвращает:
+    --------
+    SimulationResult
+        Накопленный результат симуляции; в stats -- статистика вычисления.
+    """
+    started_event.set()
+
+    if dimension == 2:
+        from diagrams2d import DiagramSimulator2D
+        simulator = DiagramSimulator2D()
+    else:
+        from diagrams3d import DiagramSimulator3D
+        simulator = DiagramSimulator3D()
+
+    budget = SimulationBudget(time_limit=params.get("time_limit"),
+                              token=CancellationToken(cancel_event))
+    timer = PhaseTimer() if instrument else None
+    if instrument:
+        tracemalloc.start()
+    profiler = JobProfiler(params["profile"]) if params.get("profile") else contextlib.nullcontext()
+    started = time.perf_counter()
+    try:
+        with profiler:
+            if progress is not None:
+                produce_chunks(simulator, params, budget, progress, timer=timer)
+            else:
+                simulator.simulate(n_steps=params["steps"], alpha=params["alpha"],
+                                   runs=params["runs"], budget=budget, seed=params.get("seed"), timer=timer)
+            result = simulator.get_result()
+        peak_memory = tracemalloc.get_traced_memory()[1] if instrument else None
+    finally:
+        if instrument:
+            tracemalloc.stop()
+        if progress is not None:
+            progress.put(STREAM_END)
+    result.elapsed = time.perf_counter() - started
+    result.stats = {"max_rss_bytes": max_rss_bytes()}
+    if instrument:
+        result.stats.update(phases=timer.to_dict(), peak_memory_bytes=peak_memory)
+    if isinstance(profiler, JobProfiler):
+        result.stats["profile"] = profiler.summary(PROFILE_SUMMARY_TOP)
+        result.artifacts = profiler.artifacts()
+    return result
+
+
+def _copy_future_state(source: Future, target: Future) -> None:
+    """
+    Перенос результата или исключения завершённого future в другой future.
+    """
+    if source.cancelled():
+        target.set_exception(CancelledError())
+        return
+    exception = source.exception()
+    if exception is not None:
+        target.set_exception(exception)
+    else:
+        target.set_result(source.result())
+
+
+class Job:
+    """
+    Задача симуляции, выполняемая в пуле процессов.
+    """
+    def __init__(self, job_id: str, dimension: int, params: Dict[str, Any]):
+        self.id = job_id
+        self.dimension = dimension
+        self.params = params
+        self.status = JOB_QUEUED
+        self.result: Optional[SimulationResult] = None
+        self.cached = False
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.cancel_requested = False
+        self.future = None
+        self.cancel_event = None
+        self.started_event = None
+        # Полоса пула и оценка стоимости (см. JobManager.set_lane_limit)
+        self.lane: Optional[str] = None
+        self.cost = 0.0
+        self.dispatched = False
+        self.admission: Optional[Dict[str, Any]] = None
+        # Статистика вычисления из процесса пула (SimulationResult.stats)
+        self.stats: Optional[Dict[str, Any]] = None
+        # Очередь прогресса потоковой задачи (см. JobManager.submit)
+        self.progress = None
+        # Статус меняют и поток цикла событий (refresh), и поток завершения задачи (_on_done)
+        self.lock = threading.Lock()
+
+    def refresh(self) -> None:
+        """
+        Обновляет статус ожидающей задачи, если процесс пула уже взял её в работу.
+        """
+        if self.status == JOB_QUEUED and self.started_event is not None and self.started_event.is_set():
+            with self.lock:
+                if self.status == JOB_QUEUED:
+                    self.status = JOB_RUNNING
+
+    def to_dict(self, include_result: bool = False) -> Dict[str, Any]:
+        """
+        Описание задачи для ответа API.
+        """
+        self.refresh()
+        data = {
+            "job_id": self.id,
+            "dimension": self.dimension,
+            "status": self.status,
+            "params": self.params,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+            "cached": self.cached,
+            "result_id": self.result.result_id if self.result is not None else None,
+            "compute_seconds": self.result.elapsed if self.result is not None else None,
+        }
+        if self.admission is not None:
+            data["admission"] = self.admission
+        if self.stats is not None:
+            data["stats"] = self.stats
+        if include_result and self.result is not None:
+            data["result"] = self.result.to_json_data()
+        return data
+
+
+class JobManager:
+    """
+    Очередь задач симуляции поверх ограниченного пула процессов.
+
+    submit() сразу возвращает задачу, а выполнение идёт в ProcessPoolExecutor.
+    Завершённые задачи хранятся в памяти, самые старые удаляются при превышении
+    max_finished.
+
+    Задача может относиться к полосе с ограниченным числом одновременно
+    выполняющихся задач: сверх лимита она ждёт в очереди полосы и не попадает
+    в очередь пула, поэтому не задерживает задачи других полос.
+    """
+    def __init__(self, max_workers: Optional[int] = None, max_pending: int = 64,
+                 max_finished: int = 256, instrument: bool = False):
+        """
+        Параметры:
+        -----------
+        max_workers : int, optional
+            Количество процессов в пуле. По умолчанию os.cpu_count().
+        max_pending : int, default=64
+            Максимальное число незавершённых задач.
+        max_finished : int, default=256
+            Сколько завершённых задач хранить для опроса клиентами.
+        instrument : bool, default=False
+            Замерять время фаз и пиковую память задач (см. run_simulation_job).
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self.instrument = instrument
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        # Повторно входимая: завершение задачи может вызвать _on_done в том же потоке
+        self._lock = threading.RLock()
+        self.lane_limits: Dict[str, int] = {}
+        self._held: Dict[str, Deque[Job]] = {}
+
+    def _ensure_started(self) -> None:
+        # Пул и менеджер событий создаются при первой задаче, чтобы не замедлять импорт
+        if self._executor is None:
+            self._manager = multiprocessing.Manager()
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+
+    def pending_count(self) -> int:
+        """
+        Количество незавершённых задач.
+        """
+        return sum(1 for job in self.jobs.values() if job.status not in FINISHED_STATUSES)
+
+    def set_lane_limit(self, lane: str, limit: int) -> None:
+        """
+        Ограничение числа одновременно выполняющихся задач полосы.
+        """
+        with self._lock:
+            self.lane_limits[lane] = max(1, limit)
+            self._dispatch_held(lane)
+
+    def lane_load(self, lane: str) -> Dict[str, float]:
+        """
+        Загрузка полосы: число и суммарная оценка стоимости выполняющихся и ожидающих задач.
+        """
+        with self._lock:
+            running = [job for job in self.jobs.values()
+                       if job.lane == lane and job.dispatched and job.status not in FINISHED_STATUSES]
+            held = self._held.get(lane, ())
+            return {
+                "limit": self.lane_limits.get(lane, self.max_workers),
+                "in_flight": len(running),
+                "held": len(held),
+                "running_cost": sum(job.cost for job in running),
+                "held_cost": sum(job.cost for job in held),
+            }
+
+    def submit(self, dimension: int, params: Dict[str, Any], lane: Optional[str] = None,
+               cost: float = 0.0, stream: bool = False) -> Job:
+        """
+        Ставит симуляцию в очередь.
+
+        Параметры:
+        -----------
+        dimension : int
+            Размерность диаграммы (2 или 3).
+        params : Dict[str, Any]
+            Параметры для run_simulation_job.
+        lane : str, optional
+            Полоса задачи; для полос из lane_limits число выполняющихся задач ограничено.
+        cost : float, default=0.0
+            Оценка стоимости задачи в секундах.
+        stream : bool, default=False
+            Передавать новые ячейки через очередь прогресса job.progress
+            (см. common.streaming.stream_simulation).
+
+        Возвращает:
+        --------
+        Job
+            Созданная задача.
+        """
+        with self._lock:
+            if self.pending_count() >= self.max_pending:
+                raise JobQueueFull("Слишком много задач в очереди")
+            self._ensure_started()
+
+            job = Job(uuid.uuid4().hex, dimension, params)
+            job.cancel_event = self._manager.Event()
+            job.started_event = self._manager.Event()
+            job.lane = lane
+            job.cost = cost
+            if stream:
+                job.progress = self._manager.Queue()
+            if lane in self.lane_limits and (self._lane_in_flight(lane) >= self.lane_limits[lane]
+                                             or self._held.get(lane)):
+                # Полоса занята: задача ждёт своей очереди вне пула
+                job.future = Future()
+                self._held.setdefault(lane, deque()).append(job)
+            else:
+                self._dispatch(job)
+            self.jobs[job.id] = job
+            self._evict_finished()
+
+        job.future.add_done_callback(lambda future: self._on_done(job, future))
+        return job
+
+    def _lane_in_flight(self, lane: str) -> int:
+        return sum(1 for job in self.jobs.values()
+                   if job.lane == lane and job.dispatched and job.status not in FINISHED_STATUSES)
+
+    def _dispatch(self, job: Job) -> None:
+        future = self._executor.submit(run_simulation_job, job.dimension, job.params,
+                                       job.cancel_event, job.started_event, self.instrument, job.progress)
+        job.dispatched = True
+        if job.future is None:
+            job.future = future
+            return
+        # Задача ждала в очереди полосы: результат future пула переносится в future задачи,
+        # которая с этого момента считается выполняющейся и отменяется через cancel_event
+        job.future.set_running_or_notify_cancel()
+        future.add_done_callback(lambda done: _copy_future_state(done, job.future))
+
+    def _dispatch_held(self, lane: str) -> None:
+        held = self._held.get(lane)
+        while held and self._lane_in_flight(lane) < self.lane_limits.get(lane, self.max_workers):
+            job = held.popleft()
+            if not job.future.cancelled():
+                self._dispatch(job)
+
+    def add_finished(self, dimension: int, params: Dict[str, Any],
+                     result: SimulationResult) -> Job:
+        """
+        Регистрирует уже готовый результат (например, из кэша) как завершённую задачу.
+        """
+        job = Job(uuid.uuid4().hex, dimension, params)
+        job.future = Future()
+        job.future.set_result(result)
+        job.result = result
+        job.cached = True
+        job.status = JOB_DONE
+        job.finished_at = job.created_at
+        with self._lock:
+            self.jobs[job.id] = job
+            self._evict_finished()
+        return job
+
+    def _on_done(self, job: Job, future) -> None:
+        try:
+            result = future.result()
+            status = JOB_CANCELLED if job.cancel_requested else JOB_DONE
+        except CancelledError:
+            result, status = None, JOB_CANCELLED
+        except Exception as e:
+            job.error = f"{e}\n{traceback.format_exc()}"
+            result, status = None, JOB_FAILED
+        with job.lock:
+            job.finished_at = time.time()
+            job.result = result
+            job.stats = result.stats if result is not None else None
+            job.status = status
+        if job.lane in self.lane_limits:
+            with self._lock:
+                self._dispatch_held(job.lane)
+
+    def _evict_finished(self) -> None:
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED_STATUSES]
+        for job_id in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """
+        Возвращает задачу по идентификатору или None.
+        """
+        return self.jobs.get(job_id)
+
+    def active_ids(self) -> List[str]:
+        """
+        Идентификаторы незавершённых задач.
+        """
+        return [job.id for job in list(self.jobs.values()) if job.status not in FINISHED_STATUSES]
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """
+        Отменяет задачу. Ожидающая задача снимается с очереди, выполняющаяся
+        останавливается после текущей порции шагов и сохраняет частичный результат.
+        """
+        job = self.jobs.get(job_id)
+        if job is None or job.status in FINISHED_STATUSES:
+            return job
+        job.cancel_requested = True
+        with self._lock:
+            held = self._held.get(job.lane)
+            if held is not None and job in held:
+                held.remove(job)
+        if not job.future.cancel():
+            job.cancel_event.set()
+        return job
+
+    async def wait(self, job: Job, timeout: Optional[float] = None) -> Job:
+        """
+        Ожидает завершения задачи не дольше timeout секунд, не блокируя цикл событий.
+        """
+        # asyncio.wait не выбрасывает исключений задачи (в том числе asyncio.CancelledError
+        # отменённой задачи) и не отменяет её по таймауту
+        waiter = asyncio.wrap_future(job.future)
+        await asyncio.wait({waiter}, timeout=timeout)
+        if waiter.done() and not waiter.cancelled():
+            # Ошибка задачи хранится в job.error; без обращения asyncio предупреждает о ней в журнале
+            waiter.exception()
+        return job
+
+    def shutdown(self) -> None:
+        """
+        Останавливает пул процессов, отменяя ожидающие задачи.
+        """
+        if self._executor is not None:
+            for job in self.jobs.values():
+                if job.status not in FINISHED_STATUSES:
+                    self.cancel(job.id)
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._manager.shutdown()
+            self._executor = None
+            self._manager = None
@@ -0,0 +1,242 @@
+import base64
+import io
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+import numpy as np
+
+from common.result import SimulationResult
+from common.utils import lattice_limit_shape, lattice_limit_shape_points
+
+AXES = ("x", "y", "z")
+
+# Максимальное число точек сетки предельной формы (см. lattice_limit_shape_points)
+MAX_LIMIT_SHAPE_POINTS = 1 << 22
+
+
+def limit_shape_points(result: SimulationResult, resolution: Optional[int] = None) -> int:
+    """
+    Оценка сверху числа точек, которые займёт вычисление сетки предельной формы результата.
+    """
+    return lattice_limit_shape_points(result.coords, result.dimension, resolution)
+
+
+def limit_shape_grid(result: SimulationResult, resolution: Optional[int] = None,
+                     confidence: float = 0.95) -> Dict[str, np.ndarray]:
+    """
+    Предельная форма результата на регулярной сетке.
+
+    Вычисляется прямо по массивам результата (см. lattice_limit_shape); сетка
+    регулярна, поэтому вместо полных массивов mgrid хранятся только
+    координаты узлов по каждой оси.
+
+    Параметры:
+    -----------
+    result : SimulationResult
+        Результат симуляции.
+    resolution : int, optional
+        Число узлов по каждой оси. По умолчанию 100 для 2D и 50 для 3D.
+    confidence : float, default=0.95
+        Уровень доверия полос функции высоты.
+
+    Возвращает:
+    --------
+    Dict[str, np.ndarray]
+        Координаты узлов по осям (x, y[, z]) и значения "values" (float32; 0 там, где ячеек не было).
+        Если у результата есть статистика высот, добавляются масштабированная
+        функция высоты и полосы: height_x[, height_y], height_mean, height_std,
+        height_lower, height_upper (см. HeightStatistics.bands).
+    """
+    axes, values = lattice_limit_shape(result.coords, result.counts, result.dimension, resolution=resolution)
+
+    arrays = {AXES[i]: np.asarray(nodes, dtype=np.float32) for i, nodes in enumerate(axes)}
+    arrays["values"] = np.asarray(values, dtype=np.float32)
+    bands = height_bands(result, confidence)
+    if bands is not None:
+        arrays.update({f"height_{name}": np.asarray(array, dtype=np.float32)
+                       for name, array in bands["arrays"].items()})
+    return arrays
+
+
+def height_bands(result: SimulationResult, confidence: float = 0.95) -> Optional[Dict[str, Any]]:
+    """
+    Функция высоты результата с доверительными полосами или None, если статистики высот нет.
+    """
+    if result.heights is None or not result.heights.runs:
+        return None
+    return result.heights.bands(result.params["steps"], confidence)
+
+
+def height_summary(result: SimulationResult, confidence: float = 0.95,
+                   target_half_width: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    Сводка полос функции высоты без массивов: число запусков, уровень доверия,
+    масштаб, наибольшая полуширина полосы и, если задана целевая полуширина,
+    оценка нужного числа запусков.
+    """
+    bands = height_bands(result, confidence)
+    if bands is None:
+        return None
+    summary = {name: value for name, value in bands.items() if name != "arrays"}
+    if target_half_width is not None:
+        summary["target_half_width"] = target_half_width
+        summary["runs_needed"] = result.heights.runs_needed(target_half_width, result.params["steps"], confidence)
+    return summary
+
+
+def encode_grid_json(arrays: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """
+    JSON-представление сетки: массивы float32 (little-endian, C-порядок) в base64.
+
+    shape -- форма values, shapes -- формы всех массивов (полосы функции высоты
+    имеют свою сетку).
+    """
+    return {
+        "dtype": "<f4",
+        "shape": list(arrays["values"].shape),
+        "shapes": {name: list(np.shape(array)) for name, array in arrays.items()},
+        "arrays": {name: base64.b64encode(np.ascontiguousarray(array, dtype="<f4").tobytes()).decode("ascii")
+                   for name, array in arrays.items()}
+    }
+
+
+def render_limit_shape(arrays: Dict[str, np.ndarray], levels: int = 10, level: float = 0.5,
+                       dpi: int = 100) -> bytes:
+    """
+    PNG с изображением предельной формы.
+
+    Для 2D -- линии уровня поверх тепловой карты, как в limit_shape_visualize.
+    Для 3D -- карта высот поверхности уровня level: для каждой точки (x, y)
+    наибольшее z, в котором значение не меньше level.
+
+    Рисование идёт через Figure и холст Agg без pyplot, поэтому безопасно
+    выполняется вне главного потока.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    values = np.nan_to_num(arrays["values"], nan=0.0)
+    fig = Figure(figsize=(6, 6), dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    x, y = arrays["x"], arrays["y"]
+    extent = [0, float(x.max()), 0, float(y.max())]
+
+    if "z" in arrays:
+        z = arrays["z"]
+        inside = values >= level
+        top = np.where(inside, np.arange(len(z))[None, None, :], -1).max(axis=2)
+        heights = np.where(top >= 0, z[np.clip(top, 0, None)], np.nan)
+        image = ax.imshow(heights.T, extent=extent, origin="lower", cmap="viridis")
+        fig.colorbar(image, ax=ax, label="z/n^(1/3)")
+        ax.set_xlabel("x/n^(1/3)")
+        ax.set_ylabel("y/n^(1/3)")
+        ax.set_title(f"3D Young Diagram Limit Shape (level {level})")
+    else:
+        contour = ax.contour(x, y, values.T, levels=levels)
+        ax.clabel(contour, inline=True, fontsize=8)
+        image = ax.imshow(values.T, extent=extent, origin="lower", cmap="viridis", alpha=0.5)
+        fig.colorbar(image, ax=ax, label="Normalized frequency")
+        ax.set_xlabel("x/√n")
+        ax.set_ylabel("y/√n")
+        ax.set_title("2D Young Diagram Limit Shape")
+    ax.set_aspect("equal")
+    ax.grid(True)
+
+    buf = io.BytesIO()
+    canvas.print_png(buf)
+    return buf.getvalue()
+
+
+class ComputeCache:
+    """
+    LRU-кэш результатов дорогих вычислений по ключу.
+
+    Одновременные запросы одного ключа ждут единственного вычисления, а не
+    повторяют его. Размер ограничен числом записей и, если задан max_bytes,
+    суммарным объёмом значений (атрибут nbytes, у значений без него -- 0).
+    """
+    def __init__(self, max_entries: int = 64, max_bytes: Optional[int] = None):
+        """
+        Параметры:
+        -----------
+        max_entries : int, default=64
+            Максимальное число записей.
+        max_bytes : int, optional
+            Предельный суммарный объём значений в байтах.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._bytes = 0
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._pending: Dict[Hashable, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """
+        Значение из кэша или результат compute(), сохранённый под ключом.
+        """
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return self._entries[key]
+                event = self._pending.get(key)
+                if event is None:
+                    event = self._pending[key] = threading.Event()
+                    self.stats["misses"] += 1
+                    break
+            event.wait()
+
+        try:
+            value = compute()
+            with self._lock:
+                self._entries[key] = value
+                self._bytes += getattr(value, "nbytes", 0)
+                # Последняя запись остаётся даже сверх max_bytes: её только что запросили
+                while len(self._entries) > self.max_entries or (
+                        self.max_bytes is not None and self._bytes > self.max_bytes and len(self._entries) > 1):
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= getattr(evicted, "nbytes", 0)
+            return value
+        finally:
+            with self._lock:
+                self._pending.pop(key).set()
+
+    def info(self) -> Dict[str, Any]:
+        """
+        Счётчики попаданий и промахов, число записей и их объём.
+        """
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), max_entries=self.max_entries,
+                        bytes=self._bytes, max_bytes=self.max_bytes)
+
+
+# Сетки и изображения предельных форм; результаты неизменяемы, поэтому ключ --
+# идентификатор результата и параметры рисования
+limit_shape_cache = ComputeCache(max_entries=64)
+
+
+def get_limit_shape(result: SimulationResult, resolution: Optional[int] = None,
+                    confidence: float = 0.95) -> Dict[str, np.ndarray]:
+    """
+    Сетка предельной формы результата (вычисляется один раз на result_id, разрешение и уровень доверия).
+    """
+    return limit_shape_cache.get_or_compute(("grid", result.result_id, resolution, confidence),
+                                            lambda: limit_shape_grid(result, resolution, confidence))
+
+
+def get_limit_shape_image(result: SimulationResult, levels: int = 10, level: float = 0.5,
+                          dpi: int = 100, resolution: Optional[int] = None) -> bytes:
+    """
+    PNG предельной формы результата с данными параметрами рисования.
+    """
+    if result.dimension == 2:
+        key = ("png", result.result_id, levels, dpi, resolution)
+    else:
+        key = ("png", result.result_id, level, dpi, resolution)
+    return limit_shape_cache.get_or_compute(
+        key, lambda: render_limit_shape(get_limit_shape(result, resolution), levels=levels, level=level, dpi=dpi))
@@ -0,0 +1,294 @@
+import datetime
+import os
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from common.heights import HeightStatistics
+from common.result_file import (RESULT_FILE_MAGIC, infer_text_params, open_result_file, write_result_file,
+                                write_result_stream)
+from common.utils import iter_cells_from_file
+
+# Параметры, которые должны совпадать у всех объединяемых частей
+COMPATIBILITY_KEYS = ("steps", "alpha", "beta", "gamma", "engine")
+
+# Бит на координату в ключе сортировки: 3 * 21 = 63 бита помещаются в int64
+KEY_BITS = 21
+
+
+class ResultShard:
+    """
+    Одна часть ансамбля: бинарный файл результата или текстовый файл ячеек.
+
+    Ячейки читаются порциями в лексикографическом порядке (iter_chunks), так
+    что в памяти одновременно находится не больше одной порции части.
+    Параметры бинарного файла берутся из заголовка; для текстового файла
+    они восстанавливаются проходом по файлу (см. infer_text_params).
+    """
+    def __init__(self, path: str):
+        """
+        Параметры:
+        -----------
+        path : str
+            Путь к файлу .ydr или *_cells.txt.
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            self.format = "binary" if f.read(len(RESULT_FILE_MAGIC)) == RESULT_FILE_MAGIC else "cells-text"
+        self.heights: Optional[HeightStatistics] = None
+        if self.format == "binary":
+            self._file = open_result_file(path)
+            header = self._file.header
+            self.dimension: int = header["dimension"]
+            self.params: Dict[str, Any] = dict(header["params"])
+            self.runs_completed: int = header["runs_completed"]
+            self.truncated: bool = header["truncated"]
+            self.stop_reason: Optional[str] = header["stop_reason"]
+            self.result_id: Optional[str] = header.get("result_id")
+            self.cells: int = header["cells"]
+            self.heights = self._file.heights
+        else:
+            self._scan_text()
+
+    def _scan_text(self, chunk_cells: int = 1 << 20) -> None:
+        dimension, cells, max_count, total = None, 0, 0, 0
+        for coords, counts in iter_cells_from_file(self.path, chunk_cells):
+            dimension = coords.shape[1]
+            cells += len(counts)
+            max_count = max(max_count, int(counts.max()))
+            total += int(counts.sum(dtype=np.int64))
+        if dimension is None:
+            raise ValueError(f"{self.path}: файл пуст")
+        self.dimension = dimension
+        self.params = infer_text_params(self.path, max_count, total)
+        self.runs_completed = self.params["runs"]
+        self.truncated = self.params["steps"] is None
+        self.stop_reason = "unknown" if self.truncated else None
+        self.result_id = None
+        self.cells = cells
+
+    def iter_chunks(self, chunk_cells: int = 1 << 20) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Порции (координаты, количества) в лексикографическом порядке.
+        """
+        if self.format == "binary":
+            yield from self._file.iter_chunks(chunk_cells)
+            return
+        # save_cells_to_file пишет ячейки отсортированными; порядок всё равно проверяется
+        last = None
+        for coords, counts in iter_cells_from_file(self.path, chunk_cells):
+            keys = cell_keys(coords)
+            if np.any(np.diff(keys) <= 0) or (last is not None and keys[0] <= last):
+                raise ValueError(f"{self.path}: ячейки не отсортированы")
+            last = keys[-1]
+            yield coords, counts
+
+    def provenance(self) -> Dict[str, Any]:
+        """
+        Описание части для метаданных объединённого результата.
+        """
+        return {
+            "path": os.path.abspath(self.path),
+            "format": self.format,
+            "bytes": os.path.getsize(self.path),
+            "result_id": self.result_id,
+            "seed": self.params.get("seed"),
+            "runs_completed": self.runs_completed,
+            "truncated": self.truncated,
+            "cells": self.cells,
+        }
+
+
+def cell_keys(coords: np.ndarray) -> np.ndarray:
+    """
+    Ключи int64, упорядоченные как координаты лексикографически (по KEY_BITS бит на ось).
+    """
+    coords = np.asarray(coords, dtype=np.int64)
+    if len(coords) and (coords.min() < 0 or coords.max() >= 1 << KEY_BITS):
+        raise ValueError(f"Координаты ячеек должны лежать в [0, 2^{KEY_BITS})")
+    keys = np.zeros(len(coords), dtype=np.int64)
+    for axis in range(coords.shape[1]):
+        keys = (keys << KEY_BITS) | coords[:, axis]
+    return keys
+
+
+def keys_to_coords(keys: np.ndarray, dimension: int) -> np.ndarray:
+    """
+    Координаты int32 по ключам cell_keys.
+    """
+    mask = (1 << KEY_BITS) - 1
+    axes = [(keys >> (KEY_BITS * (dimension - 1 - axis))) & mask for axis in range(dimension)]
+    return np.stack(axes, axis=1).astype(np.int32).reshape(-1, dimension)
+
+
+def merge_sorted_chunks(streams: List[Iterable[Tuple[np.ndarray, np.ndarray]]],
+                        dimension: int) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    k-путевое слияние отсортированных потоков ячеек с суммированием количеств.
+
+    От каждого потока в памяти держится одна порция. На каждом шаге граница --
+    наименьший из последних ключей текущих порций: все ячейки с ключом не
+    больше границы уже прочитаны из всех потоков, поэтому их можно слить
+    (векторно: сортировка и сложение одинаковых ключей) и отдать. Поток, на
+    котором достигнута граница, исчерпывает порцию и читает следующую.
+
+    Параметры:
+    -----------
+    streams : List[Iterable[Tuple[np.ndarray, np.ndarray]]]
+        Потоки порций (координаты, количества) в лексикографическом порядке без повторов.
+    dimension : int
+        Размерность диаграммы.
+
+    Yields:
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        Порции объединённых координат int32 и количеств uint32 в лексикографическом порядке.
+    """
+    iterators = [iter(stream) for stream in streams]
+    buffers: List[Optional[Tuple[np.ndarray, np.ndarray]]] = [None] * len(iterators)
+
+    def refill(index: int) -> None:
+        for coords, counts in iterators[index]:
+            if len(counts):
+                buffers[index] = (cell_keys(coords), np.asarray(counts, dtype=np.uint64))
+                return
+        buffers[index] = None
+
+    for index in range(len(iterators)):
+        refill(index)
+
+    while True:
+        active = [index for index, buffer in enumerate(buffers) if buffer is not None]
+        if not active:
+            return
+        bound = min(buffers[index][0][-1] for index in active)
+        keys, counts = [], []
+        for index in active:
+            buffer_keys, buffer_counts = buffers[index]
+            split = int(np.searchsorted(buffer_keys, bound, side="right"))
+            keys.append(buffer_keys[:split])
+            counts.append(buffer_counts[:split])
+            if split == len(buffer_keys):
+                refill(index)
+            else:
+                buffers[index] = (buffer_keys[split:], buffer_counts[split:])
+
+        keys, counts = np.concatenate(keys), np.concatenate(counts)
+        order = np.argsort(keys, kind="stable")
+        keys, counts = keys[order], counts[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        merged = np.add.reduceat(counts, starts)
+        if merged.max() > np.iinfo(np.uint32).max:
+            raise OverflowError("Количество ячейки превышает uint32")
+        yield keys_to_coords(keys[starts], dimension), merged.astype(np.uint32)
+
+
+def check_compatible(shards: List[ResultShard], allow_duplicate_seeds: bool = False) -> None:
+    """
+    Проверка, что части принадлежат одному ансамблю.
+
+    Размерность и параметры COMPATIBILITY_KEYS должны совпадать (неизвестное
+    значение текстовой части совпадает с любым), а зёрна -- различаться: части
+    с одним зерном содержат одни и те же запуски.
+
+    Raises:
+    -------
+    ValueError
+        Со списком всех несовпадений.
+    """
+    problems = []
+    reference = shards[0]
+    for shard in shards[1:]:
+        if shard.dimension != reference.dimension:
+            problems.append(f"{shard.path}: размерность {shard.dimension}, а у {reference.path} -- "
+                            f"{reference.dimension}")
+        for key in COMPATIBILITY_KEYS:
+            ours, theirs = reference.params.get(key), shard.params.get(key)
+            if ours is not None and theirs is not None and ours != theirs:
+                problems.append(f"{shard.path}: {key}={theirs!r}, а у {reference.path} -- {ours!r}")
+    seeds: Dict[Any, str] = {}
+    for shard in shards:
+        seed = shard.params.get("seed")
+        if seed is None:
+            continue
+        if seed in seeds and not allow_duplicate_seeds:
+            problems.append(f"{shard.path}: зерно {seed} уже есть у {seeds[seed]}")
+        seeds.setdefault(seed, shard.path)
+    if problems:
+        raise ValueError("Части несовместимы:\n" + "\n".join(problems))
+
+
+def merged_metadata(shards: List[ResultShard]) -> Dict[str, Any]:
+    """
+    Метаданные объединённого результата: общие параметры, суммы запусков, признаки досрочной остановки.
+    """
+    params = {key: next((shard.params.get(key) for shard in shards if shard.params.get(key) is not None), None)
+              for key in shards[0].params}
+    params["runs"] = sum(shard.params.get("runs") or 0 for shard in shards)
+    params["seed"] = None
+    reasons = sorted({shard.stop_reason for shard in shards if shard.stop_reason})
+    return {
+        "result_id": None,
+        "dimension": shards[0].dimension,
+        "params": params,
+        "runs_completed": sum(shard.runs_completed or 0 for shard in shards),
+        "truncated": any(shard.truncated for shard in shards),
+        "stop_reason": "; ".join(reasons) or None,
+        "elapsed": None,
+    }
+
+
+def merge_shards(paths: List[str], output: str, chunk_cells: int = 1 << 20, layout: str = "sparse",
+                 allow_duplicate_seeds: bool = False) -> Dict[str, Any]:
+    """
+    Объединение частей ансамбля в один файл результата.
+
+    Количества ячеек и числа запусков складываются, статистики функции высоты
+    объединяются (если они есть у всех частей). Слияние потоковое: память
+    ограничена порцией на часть. Раскладка, отличная от sparse, требует
+    перезаписи объединённого результата целиком в памяти.
+
+    Параметры:
+    -----------
+    paths : List[str]
+        Пути к частям (.ydr или *_cells.txt).
+    output : str
+        Путь к объединённому файлу .ydr.
+    chunk_cells : int, default=1 << 20
+        Размер порции чтения каждой части в ячейках.
+    layout : str, default="sparse"
+        Раскладка результата (см. write_result_file).
+    allow_duplicate_seeds : bool, default=False
+        Разрешить части с одинаковым зерном.
+
+    Возвращает:
+    --------
+    Dict[str, Any]
+        Заголовок записанного файла.
+    """
+    if not paths:
+        raise ValueError("Нет частей для объединения")
+    shards = [ResultShard(path) for path in paths]
+    check_compatible(shards, allow_duplicate_seeds)
+
+    heights = None
+    if all(shard.heights is not None for shard in shards):
+        heights = HeightStatistics(shards[0].dimension)
+        for shard in shards:
+            heights = heights.merge(shard.heights)
+
+    provenance = {
+        "tool": "merge_results",
+        "merged_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "chunk_cells": chunk_cells,
+        "heights": "merged" if heights is not None else "missing in some shards",
+        "shards": [shard.provenance() for shard in shards],
+    }
+    metadata = merged_metadata(shards)
+    chunks = merge_sorted_chunks([shard.iter_chunks(chunk_cells) for shard in shards], metadata["dimension"])
+    header = write_result_stream(output, metadata["dimension"], chunks, metadata, heights,
+                                 {"provenance": provenance})
+    if layout != "sparse":
+        result = open_result_file(output).to_result()
+        header = write_result_file(result, output, layout, {"provenance": provenance})
+    return header
@@ -0,0 +1,225 @@
+import base64
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+from common.limit_shape import ComputeCache
+from common.result import SimulationResult
+
+# Оси плоскости грани для каждой оси нормали, в циклическом порядке:
+# векторное произведение осей плоскости направлено вдоль нормали
+PLANE_AXES = {0: (1, 2), 1: (2, 0), 2: (0, 1)}
+
+
+def height_map(result: SimulationResult, threshold: float = 0.5) -> np.ndarray:
+    """
+    Карта высот ячеек, частота которых не меньше threshold.
+
+    Каждый запуск -- диаграмма (нижнее множество), поэтому частоты не
+    возрастают вдоль осей и ячейки выше порога тоже образуют диаграмму:
+    столбец (x, y) занят от z = 0 до высоты h(x, y). Поэтому поверхность
+    описывается двумерной картой высот, а не трёхмерным полем занятости,
+    размер которого растёт с объёмом ограничивающего параллелепипеда.
+
+    Параметры:
+    -----------
+    result : SimulationResult
+        3D результат симуляции.
+    threshold : float, default=0.5
+        Порог частоты (количество, делённое на максимальное количество).
+
+    Возвращает:
+    --------
+    np.ndarray
+        Массив int64 высот формы (max_x + 1, max_y + 1) по выбранным ячейкам.
+    """
+    if result.dimension != 3:
+        raise ValueError("Поверхность строится только для 3D результатов")
+    coords = np.asarray(result.coords)
+    if not len(coords):
+        return np.zeros((0, 0), dtype=np.int64)
+    selected = coords[np.asarray(result.counts) / result.max_count >= threshold].astype(np.int64)
+    if not len(selected):
+        return np.zeros((0, 0), dtype=np.int64)
+    heights = np.zeros(tuple(int(v) + 1 for v in selected[:, :2].max(axis=0)), dtype=np.int64)
+    np.maximum.at(heights, (selected[:, 0], selected[:, 1]), selected[:, 2] + 1)
+    return heights
+
+
+def merge_segments(layer: np.ndarray, a: np.ndarray, b0: np.ndarray,
+                   b1: np.ndarray) -> Tuple[np.ndarray, ...]:
+    """
+    Объединение отрезков граней в прямоугольники.
+
+    Параметры:
+    -----------
+    layer, a, b0, b1 : np.ndarray
+        Слой, положение по оси объединения и отрезок [b0, b1) по второй оси плоскости.
+
+    Возвращает:
+    --------
+    Tuple[np.ndarray, ...]
+        Слой, a0, a1, b0, b1 каждого прямоугольника (концы не включаются):
+        одинаковые отрезки соседних положений a объединяются.
+    """
+    if not len(layer):
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, empty, empty, empty
+    order = np.lexsort((a, b1, b0, layer))
+    layer, a, b0, b1 = layer[order], a[order], b0[order], b1[order]
+    new = np.ones(len(a), dtype=bool)
+    new[1:] = ((layer[1:] != layer[:-1]) | (b0[1:] != b0[:-1]) | (b1[1:] != b1[:-1])
+               | (a[1:] != a[:-1] + 1))
+    first = np.flatnonzero(new)
+    last = np.r_[first[1:], len(a)] - 1
+    return layer[first], a[first], a[last] + 1, b0[first], b1[first]
+
+
+def _row_runs(values: np.ndarray) -> Tuple[np.ndarray, ...]:
+    # Отрезки равных ненулевых значений вдоль второй оси: строка, начало, конец, значение
+    padded = np.pad(values, [(0, 0), (1, 1)], constant_values=-1)
+    change = padded[:, 1:] != padded[:, :-1]
+    row, start = np.nonzero(change[:, :-1])
+    stop = np.nonzero(change[:, 1:])[1] + 1
+    value = values[row, start]
+    keep = value > 0
+    return row[keep], start[keep], stop[keep], value[keep]
+
+
+def _side_segments(heights: np.ndarray, axis: int, sign: int) -> Tuple[np.ndarray, ...]:
+    # Боковые грани по оси axis (0 -- x, 1 -- y): у столбца открыты ячейки от высоты соседа до своей
+    shifted = np.zeros_like(heights)
+    source = [slice(None)] * 2
+    target = [slice(None)] * 2
+    if sign > 0:
+        source[axis], target[axis] = slice(1, None), slice(None, -1)
+    else:
+        source[axis], target[axis] = slice(None, -1), slice(1, None)
+    shifted[tuple(target)] = heights[tuple(source)]
+    x, y = np.nonzero(heights > shifted)
+    layer, other = (x, y) if axis == 0 else (y, x)
+    return layer, other, shifted[x, y], heights[x, y]
+
+
+def extract_surface(heights: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Поверхность диаграммы с картой высот heights из объединённых прямоугольных граней.
+
+    Грани строятся по двумерной карте: боковые грани столбца -- один отрезок
+    по z от высоты соседнего столбца до своей, верхние и нижние -- отрезки
+    строк с одинаковой высотой; затем одинаковые отрезки соседних строк или
+    столбцов объединяются в прямоугольники. Память -- O(размер карты + граней).
+
+    Параметры:
+    -----------
+    heights : np.ndarray
+        Карта высот (x, y), см. height_map.
+
+    Возвращает:
+    --------
+    Dict[str, np.ndarray]
+        quads -- углы прямоугольников (q, 4, 3) против часовой стрелки при
+        взгляде снаружи; normals -- нормали (q, 3); faces -- число единичных
+        открытых граней до объединения (массив из одного элемента).
+    """
+    heights = np.asarray(heights, dtype=np.int64)
+    quads, normals = [], []
+    faces = 0
+    for axis in range(3):
+        u_axis, v_axis = PLANE_AXES[axis]
+        for sign in (-1, 1):
+            if axis < 2:
+                # Отрезок идёт по z; объединяются соседние столбцы по второй горизонтальной оси
+                layer, a, b0, b1 = _side_segments(heights, axis, sign)
+                faces += int((b1 - b0).sum())
+            else:
+                # Верх (слой h - 1) и низ (слой 0): отрезки строк x с одинаковой высотой по y
+                row, start, stop, value = _row_runs(heights if sign > 0 else (heights > 0).astype(np.int64))
+                layer, a, b0, b1 = (value - 1 if sign > 0 else np.zeros_like(value)), row, start, stop
+                faces += int((stop - start).sum())
+            layer, a0, a1, b0, b1 = merge_segments(layer, a, b0, b1)
+            if not len(layer):
+                continue
+            # Ось объединения a: y для граней по x, x для граней по y и z
+            if u_axis == (1 if axis == 0 else 0):
+                u0, u1, v0, v1 = a0, a1, b0, b1
+            else:
+                u0, u1, v0, v1 = b0, b1, a0, a1
+            plane = layer + (1 if sign > 0 else 0)
+            corners = np.zeros((len(layer), 4, 3), dtype=np.int64)
+            corners[:, :, axis] = plane[:, None]
+            corners[:, :, u_axis] = np.stack([u0, u1, u1, u0], axis=1)
+            corners[:, :, v_axis] = np.stack([v0, v0, v1, v1], axis=1)
+            if sign < 0:
+                corners = corners[:, ::-1]
+            normal = np.zeros(3, dtype=np.int8)
+            normal[axis] = sign
+            quads.append(corners)
+            normals.append(np.tile(normal, (len(layer), 1)))
+
+    if not quads:
+        return {"quads": np.zeros((0, 4, 3), dtype=np.int64), "normals": np.zeros((0, 3), dtype=np.int8),
+                "faces": np.array([0])}
+    return {"quads": np.concatenate(quads), "normals": np.concatenate(normals), "faces": np.array([faces])}
+
+
+def mesh_buffers(surface: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Буферы вершин и индексов треугольников для WebGL.
+
+    Каждый прямоугольник даёт 4 вершины со своей нормалью и 2 треугольника.
+    Координаты вершин -- uint16, если помещаются, иначе uint32; индексы --
+    uint16 при числе вершин до 65536, иначе uint32.
+    """
+    quads = surface["quads"]
+    vertices = quads.reshape(-1, 3)
+    vertex_dtype = np.uint16 if not vertices.size or vertices.max() < 2 ** 16 else np.uint32
+    index_dtype = np.uint16 if len(vertices) <= 2 ** 16 else np.uint32
+    base = np.arange(len(quads), dtype=np.int64)[:, None] * 4
+    indices = (base + np.array([0, 1, 2, 0, 2, 3])).reshape(-1, 3)
+    return {
+        "vertices": vertices.astype(vertex_dtype),
+        "normals": np.repeat(surface["normals"], 4, axis=0),
+        "indices": indices.astype(index_dtype),
+    }
+
+
+def mesh_info(result: SimulationResult, threshold: float, surface: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """
+    Размеры поверхности: ячейки, единичные грани, прямоугольники и треугольники.
+    """
+    return {
+        "result_id": result.result_id,
+        "threshold": threshold,
+        "cells": int(np.count_nonzero(np.asarray(result.counts) / max(result.max_count, 1) >= threshold)),
+        "faces": int(surface["faces"][0]),
+        "quads": len(surface["quads"]),
+        "triangles": 2 * len(surface["quads"]),
+    }
+
+
+def encode_mesh_json(buffers: Dict[str, np.ndarray]) -> Dict[str, Any]:
+    """
+    JSON-представление буферов: массивы little-endian в base64 с типом и формой.
+    """
+    return {
+        name: {
+            "dtype": array.dtype.newbyteorder("<").str,
+            "shape": list(array.shape),
+            "data": base64.b64encode(np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<"))
+                                     .tobytes()).decode("ascii"),
+        }
+        for name, array in buffers.items()
+    }
+
+
+# Поверхности по идентификатору результата и порогу
+mesh_cache = ComputeCache(max_entries=32)
+
+
+def get_surface(result: SimulationResult, threshold: float = 0.5) -> Dict[str, np.ndarray]:
+    """
+    Поверхность результата для порога threshold (вычисляется один раз на пару).
+    """
+    return mesh_cache.get_or_compute(("surface", result.result_id, threshold),
+                                     lambda: extract_surface(height_map(result, threshold)))
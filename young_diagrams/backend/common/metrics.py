@@ -0,0 +1,238 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Границы корзин гистограмм времени, в секундах
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class PhaseTimer:
+    """
+    Накопитель времени и числа вызовов по фазам.
+
+    Замеры делаются через lap() по меткам perf_counter, без менеджеров
+    контекста, чтобы в горячих циклах стоить один вызов функции. Код, который
+    таймер не получил (timer=None), ничего не замеряет.
+    """
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+
+    @staticmethod
+    def now() -> float:
+        """
+        Текущая метка времени.
+        """
+        return time.perf_counter()
+
+    def lap(self, phase: str, started: float) -> float:
+        """
+        Добавляет к фазе время с метки started и возвращает новую метку.
+        """
+        now = time.perf_counter()
+        self.seconds[phase] = self.seconds.get(phase, 0.0) + (now - started)
+        self.calls[phase] = self.calls.get(phase, 0) + 1
+        return now
+
+    def to_dict(self) -> Dict[str, Dict[str, float]]:
+        """
+        Время и число вызовов по фазам.
+        """
+        return {phase: {"seconds": self.seconds[phase], "calls": self.calls[phase]} for phase in self.seconds}
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Sequence[Tuple[str, str]] = ()) -> str:
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in items) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class MetricsRegistry:
+    """
+    Счётчики, показатели и гистограммы в текстовом формате Prometheus.
+
+    Счётчики задач собираются всегда; таймеры фаз (в процессах пула и при
+    кодировании и рисовании ответов) -- только если enabled, поскольку замеры
+    в цикле роста диаграммы заметно его замедляют.
+    """
+    def __init__(self, enabled: bool = False, prefix: str = "young"):
+        """
+        Параметры:
+        -----------
+        enabled : bool, default=False
+            Включены ли таймеры фаз и замер пиковой памяти задач.
+        prefix : str, default="young"
+            Префикс имён метрик.
+        """
+        self.enabled = enabled
+        self.prefix = prefix
+        self._families: Dict[str, Tuple[str, str]] = {}
+        self._values: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {}
+        self._histograms: Dict[str, Dict[Tuple[Tuple[str, str], ...], List[float]]] = {}
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self._lock = threading.Lock()
+
+    def _family(self, name: str, kind: str, help: str) -> str:
+        full = f"{self.prefix}_{name}"
+        if full not in self._families:
+            self._families[full] = (kind, help)
+        return full
+
+    def inc(self, name: str, value: float = 1.0, help: str = "", **labels: Any) -> None:
+        """
+        Увеличивает счётчик.
+        """
+        key = tuple(sorted((label, str(v)) for label, v in labels.items()))
+        with self._lock:
+            values = self._values.setdefault(self._family(name, "counter", help), {})
+            values[key] = values.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, help: str = "", **labels: Any) -> None:
+        """
+        Устанавливает значение показателя.
+        """
+        key = tuple(sorted((label, str(v)) for label, v in labels.items()))
+        with self._lock:
+            self._values.setdefault(self._family(name, "gauge", help), {})[key] = value
+
+    def set_max(self, name: str, value: float, help: str = "", **labels: Any) -> None:
+        """
+        Показатель, хранящий наибольшее из переданных значений.
+        """
+        key = tuple(sorted((label, str(v)) for label, v in labels.items()))
+        with self._lock:
+            values = self._values.setdefault(self._family(name, "gauge", help), {})
+            values[key] = max(values.get(key, value), value)
+
+    def observe(self, name: str, value: float, help: str = "",
+                buckets: Sequence[float] = DEFAULT_BUCKETS, **labels: Any) -> None:
+        """
+        Добавляет наблюдение в гистограмму.
+        """
+        key = tuple(sorted((label, str(v)) for label, v in labels.items()))
+        with self._lock:
+            full = self._family(name, "histogram", help)
+            bounds = self._buckets.setdefault(full, tuple(buckets) + (float("inf"),))
+            # Счётчики по корзинам, затем сумма и число наблюдений
+            state = self._histograms.setdefault(full, {}).setdefault(key, [0.0] * (len(bounds) + 2))
+            for index, bound in enumerate(bounds):
+                if value <= bound:
+                    state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def phase(self, phase: str, **labels: Any) -> Iterator[None]:
+        """
+        Замер времени блока как фазы phase; без enabled ничего не делает.
+        """
+        if not self.enabled:
+            yield
+            return
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_phase(phase, time.perf_counter() - started, **labels)
+
+    def add_phase(self, phase: str, seconds: float, calls: int = 1, **labels: Any) -> None:
+        """
+        Учёт времени фазы, замеренного в другом месте (например, в процессе пула).
+        """
+        self.inc("phase_seconds_total", seconds, "Время, проведённое в фазе", phase=phase, **labels)
+        self.inc("phase_calls_total", calls, "Число замеров фазы", phase=phase, **labels)
+
+    def observe_job(self, dimension: int, status: str, cached: bool, compute_seconds: Optional[float],
+                    latency_seconds: Optional[float], stats: Optional[Dict[str, Any]]) -> None:
+        """
+        Учёт завершённой задачи симуляции.
+
+        Параметры:
+        -----------
+        dimension : int
+            Размерность диаграммы.
+        status : str
+            Итоговый статус задачи.
+        cached : bool
+            Получен ли результат из кэша.
+        compute_seconds, latency_seconds : float, optional
+            Время вычисления и время от постановки в очередь до завершения.
+        stats : Dict[str, Any], optional
+            Блок stats задачи (см. run_simulation_job).
+        """
+        self.inc("jobs_total", help="Завершённые задачи симуляции", dimension=dimension, status=status,
+                 cached=str(cached).lower())
+        if cached:
+            return
+        if compute_seconds is not None:
+            self.observe("job_compute_seconds", compute_seconds, "Время вычисления симуляции",
+                         dimension=dimension)
+        if latency_seconds is not None:
+            self.observe("job_latency_seconds", latency_seconds, "Время от постановки задачи до её завершения",
+                         dimension=dimension)
+        if not stats:
+            return
+        for phase, values in stats.get("phases", {}).items():
+            self.add_phase(phase, values["seconds"], int(values["calls"]), dimension=dimension)
+        if stats.get("peak_memory_bytes") is not None:
+            self.set("job_peak_memory_bytes", stats["peak_memory_bytes"],
+                     "Пиковая память Python последней задачи", dimension=dimension)
+            self.set_max("job_peak_memory_bytes_max", stats["peak_memory_bytes"],
+                         "Наибольшая пиковая память Python задачи", dimension=dimension)
+        if stats.get("max_rss_bytes") is not None:
+            self.set_max("worker_max_rss_bytes", stats["max_rss_bytes"],
+                         "Наибольший резидентный размер процесса пула")
+
+    def render(self, snapshot: Optional[Dict[str, Tuple[str, float, str]]] = None) -> str:
+        """
+        Метрики в текстовом формате Prometheus.
+
+        Параметры:
+        -----------
+        snapshot : Dict[str, Tuple[str, float, str]], optional
+            Метрики, снимаемые в момент запроса с других объектов:
+            имя -> (тип counter или gauge, значение, описание).
+        """
+        lines = []
+        with self._lock:
+            for name, (kind, value, help) in (snapshot or {}).items():
+                full = f"{self.prefix}_{name}"
+                lines += [f"# HELP {full} {help}", f"# TYPE {full} {kind}", f"{full} {_format_value(value)}"]
+            for full, (kind, help) in sorted(self._families.items()):
+                lines += [f"# HELP {full} {help}", f"# TYPE {full} {kind}"]
+                if kind != "histogram":
+                    for labels, value in sorted(self._values[full].items()):
+                        lines.append(f"{full}{_format_labels(labels)} {_format_value(value)}")
+                    continue
+                bounds = self._buckets[full]
+                for labels, state in sorted(self._histograms[full].items()):
+                    for bound, count in zip(bounds, state):
+                        lines.append(f"{full}_bucket{_format_labels(labels, [('le', _format_value(bound))])} "
+                                     f"{_format_value(count)}")
+                    lines.append(f"{full}_sum{_format_labels(labels)} {_format_value(state[-2])}")
+                    lines.append(f"{full}_count{_format_labels(labels)} {_format_value(state[-1])}")
+        return "\n".join(lines) + "\n"
+
+
+def max_rss_bytes() -> Optional[int]:
+    """
+    Наибольший резидентный размер текущего процесса или None, если он недоступен.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss -- в килобайтах в Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
@@ -0,0 +1,278 @@
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+# Профилировщики: cprofile -- детерминированный (каждый вызов, заметно замедляет
+# код на Python), sampling -- выборка стека потока с заданным интервалом
+PROFILERS = ("cprofile", "sampling")
+
+# Файлы профиля: имя -> тип содержимого
+PROFILE_ARTIFACTS = {
+    "profile.pstats": "application/octet-stream",
+    "profile.collapsed": "text/plain; charset=utf-8",
+    "profile_top.txt": "text/plain; charset=utf-8",
+}
+
+# Число функций в сводке по умолчанию
+PROFILE_TOP = 30
+
+# Интервал выборки стека по умолчанию, с
+SAMPLING_INTERVAL = 0.005
+
+# Ветви дерева вызовов с долей времени меньше этой не разворачиваются в свёрнутые стеки cProfile
+COLLAPSE_MIN_SHARE = 1e-4
+
+# Функция в формате pstats: (файл, строка определения, имя)
+Function = Tuple[str, int, str]
+
+
+def function_label(function: Function) -> str:
+    """
+    Подпись функции в свёрнутых стеках и сводке: имя (файл:строка).
+    """
+    filename, line, name = function
+    if filename == "~":
+        # Встроенные функции pstats записывает как ("~", 0, "<built-in method ...>")
+        return name.replace(";", ",")
+    return f"{name} ({os.path.basename(filename)}:{line})".replace(";", ",")
+
+
+class _StatsHolder:
+    """
+    Объект с create_stats() и stats, который принимает pstats.Stats.
+    """
+    def __init__(self, stats: Dict[Function, Tuple]):
+        self.stats = stats
+
+    def create_stats(self) -> None:
+        pass
+
+
+class SamplingProfiler:
+    """
+    Выборочный профилировщик: отдельный поток раз в interval секунд снимает стек профилируемого потока.
+
+    Накладные расходы не зависят от числа вызовов, поэтому профиль быстрых
+    внутренних функций не искажается, но времена -- оценки по числу выборок.
+    """
+    def __init__(self, interval: float = SAMPLING_INTERVAL):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self.elapsed = 0.0
+        self._thread_id: Optional[int] = None
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._started = 0.0
+
+    def start(self) -> None:
+        self._thread_id = threading.get_ident()
+        self._stop.clear()
+        self._started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._sampler.join()
+        self.elapsed = time.perf_counter() - self._started
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                frame = frame.f_back
+            if stack:
+                self.samples[tuple(reversed(stack))] += 1
+
+    def stats(self) -> Dict[Function, Tuple]:
+        """
+        Выборки в формате pstats: число выборок вместо числа вызовов, времена -- доли измеренного времени.
+        """
+        total = sum(self.samples.values())
+        seconds = self.elapsed / total if total else 0.0
+        own: Counter = Counter()
+        inclusive: Counter = Counter()
+        edges: Dict[Function, Counter] = defaultdict(Counter)
+        for stack, count in self.samples.items():
+            own[stack[-1]] += count
+            # Рекурсивная функция считается в стеке один раз
+            for function in set(stack):
+                inclusive[function] += count
+            for caller, callee in set(zip(stack, stack[1:])):
+                edges[callee][caller] += count
+        return {
+            function: (count, count, own[function] * seconds, count * seconds,
+                       {caller: (n, n, 0.0, n * seconds) for caller, n in edges[function].items()})
+            for function, count in inclusive.items()
+        }
+
+    def collapsed(self) -> Dict[str, float]:
+        """
+        Свёрнутые стеки: точное число выборок каждого стека.
+        """
+        return {";".join(function_label(function) for function in stack): float(count)
+                for stack, count in self.samples.items()}
+
+
+def collapse_stats(stats: Dict[Function, Tuple]) -> Dict[str, float]:
+    """
+    Свёрнутые стеки из статистики cProfile (в микросекундах).
+
+    cProfile хранит только пары вызывающий -> вызываемый, поэтому полные
+    стеки восстанавливаются приближённо: время вызываемой функции делится
+    между путями пропорционально времени, проведённому в ней при вызове из
+    каждого вызывающего. Циклы рекурсии обрываются, ветви с долей времени
+    меньше COLLAPSE_MIN_SHARE не разворачиваются.
+    """
+    callees: Dict[Function, List[Function]] = defaultdict(list)
+    for function, (_, _, _, _, callers) in stats.items():
+        for caller in callers:
+            callees[caller].append(function)
+    roots = [function for function, entry in stats.items() if not entry[4]]
+    total = sum(stats[root][3] for root in roots) or 1.0
+    lines: Dict[str, float] = defaultdict(float)
+
+    def visit(function: Function, path: Tuple[str, ...], on_path: frozenset, share: float) -> None:
+        own = stats[function][2]
+        path = path + (function_label(function),)
+        if own * share > 0:
+            lines[";".join(path)] += own * share * 1e6
+        for callee in callees[function]:
+            callee_total = stats[callee][3]
+            edge = stats[callee][4][function][3]
+            if callee in on_path or callee_total <= 0 or edge * share < COLLAPSE_MIN_SHARE * total:
+                continue
+            visit(callee, path, on_path | {callee}, share * edge / callee_total)
+
+    for root in roots:
+        visit(root, (), frozenset([root]), 1.0)
+    return dict(lines)
+
+
+def top_functions(stats: Dict[Function, Tuple], top: int = PROFILE_TOP) -> List[Dict[str, Any]]:
+    """
+    Функции с наибольшим собственным временем.
+    """
+    ranked = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+    return [{"function": function_label(function), "calls": entry[1], "self_seconds": round(entry[2], 6),
+             "cumulative_seconds": round(entry[3], 6)} for function, entry in ranked]
+
+
+class JobProfiler:
+    """
+    Профиль одной задачи: with JobProfiler(...): задача; затем save() или artifacts().
+
+    Файлы профиля (PROFILE_ARTIFACTS):
+    - profile.pstats -- статистика в формате pstats (python -m pstats, snakeviz);
+    - profile.collapsed -- свёрнутые стеки "f1;f2;f3 вес" для flamegraph.pl,
+      speedscope или inferno;
+    - profile_top.txt -- функции с наибольшим собственным и полным временем.
+    """
+    def __init__(self, profiler: str = "cprofile", interval: float = SAMPLING_INTERVAL):
+        """
+        Параметры:
+        -----------
+        profiler : str, default="cprofile"
+            Профилировщик из PROFILERS.
+        interval : float, default=SAMPLING_INTERVAL
+            Интервал выборки стека в секундах (только sampling).
+        """
+        if profiler not in PROFILERS:
+            raise ValueError(f"Неизвестный профилировщик: {profiler} (доступны: {', '.join(PROFILERS)})")
+        self.profiler = profiler
+        self._profile = cProfile.Profile() if profiler == "cprofile" else SamplingProfiler(interval)
+        self.elapsed = 0.0
+        self._started = 0.0
+
+    def __enter__(self) -> "JobProfiler":
+        self._started = time.perf_counter()
+        if self.profiler == "cprofile":
+            self._profile.enable()
+        else:
+            self._profile.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.profiler == "cprofile":
+            self._profile.disable()
+        else:
+            self._profile.stop()
+        self.elapsed = time.perf_counter() - self._started
+
+    def stats(self) -> Dict[Function, Tuple]:
+        """
+        Статистика в формате pstats.
+        """
+        if self.profiler == "cprofile":
+            self._profile.create_stats()
+            return self._profile.stats
+        return self._profile.stats()
+
+    def collapsed(self) -> str:
+        """
+        Свёрнутые стеки: строка "f1;f2;f3 вес" на стек, вес -- выборки или микросекунды.
+        """
+        stacks = collapse_stats(self.stats()) if self.profiler == "cprofile" else self._profile.collapsed()
+        return "".join(f"{stack} {int(round(weight))}\n" for stack, weight in sorted(stacks.items())
+                       if round(weight) > 0)
+
+    def top(self, top: int = PROFILE_TOP) -> str:
+        """
+        Текстовая сводка pstats: top функций по собственному и по полному времени.
+        """
+        stream = io.StringIO()
+        stream.write(f"Профилировщик: {self.profiler}, время: {self.elapsed:.3f} с\n")
+        if self.profiler == "sampling":
+            stream.write(f"Выборок: {sum(self._profile.samples.values())} с интервалом "
+                         f"{self._profile.interval * 1000:g} мс; ncalls -- число выборок\n")
+        stats = pstats.Stats(_StatsHolder(self.stats()), stream=stream)
+        for key, title in (("tottime", "собственному"), ("cumulative", "полному")):
+            stream.write(f"\n=== {top} функций по {title} времени ===\n")
+            stats.sort_stats(key).print_stats(top)
+        return stream.getvalue()
+
+    def summary(self, top: int = PROFILE_TOP) -> Dict[str, Any]:
+        """
+        Сводка для ответа API и отчётов: профилировщик, время и функции с наибольшим собственным временем.
+        """
+        summary = {"profiler": self.profiler, "seconds": self.elapsed, "top": top_functions(self.stats(), top)}
+        if self.profiler == "sampling":
+            summary.update(samples=sum(self._profile.samples.values()), interval=self._profile.interval)
+        return summary
+
+    def artifacts(self, top: int = PROFILE_TOP) -> Dict[str, bytes]:
+        """
+        Содержимое файлов профиля по именам из PROFILE_ARTIFACTS.
+        """
+        return {
+            "profile.pstats": marshal.dumps(self.stats()),
+            "profile.collapsed": self.collapsed().encode("utf-8"),
+            "profile_top.txt": self.top(top).encode("utf-8"),
+        }
+
+    def save(self, prefix: str, top: int = PROFILE_TOP) -> List[str]:
+        """
+        Запись файлов профиля рядом с результатами: prefix + "_" + имя файла.
+
+        Возвращает:
+        --------
+        List[str]
+            Пути записанных файлов.
+        """
+        paths = []
+        for name, data in self.artifacts(top).items():
+            path = f"{prefix}_{name}"
+            with open(path, "wb") as f:
+                f.write(data)
+            paths.append(path)
+        return paths
@@ -0,0 +1,200 @@
+from typing import Dict, Optional
+
+import numpy as np
+
+from common.result import SimulationResult
+from common.voxel_index import get_index
+
+# Яркость граней по оси нормали (x, y, z), как у поверхности из common.mesh
+FACE_SHADE = np.array([0.8, 0.65, 1.0])
+
+
+def count_grid(result: SimulationResult) -> np.ndarray:
+    """
+    Плотная сетка нормированных частот 2D результата.
+
+    Параметры:
+    -----------
+    result : SimulationResult
+        2D результат симуляции.
+
+    Возвращает:
+    --------
+    np.ndarray
+        Массив float формы (max_x + 1, max_y + 1): частота ячейки, делённая на
+        наибольшую, и NaN там, где ячеек не было.
+    """
+    if result.dimension != 2:
+        raise ValueError("Сетка частот строится для 2D результатов")
+    coords = np.asarray(result.coords)
+    if not len(coords):
+        return np.zeros((0, 0))
+    grid = np.full(tuple(int(v) + 1 for v in coords.max(axis=0)), np.nan)
+    grid[tuple(coords.T)] = np.asarray(result.counts) / result.max_count
+    return grid
+
+
+def column_heights(result: SimulationResult, threshold: Optional[float] = None) -> np.ndarray:
+    """
+    Высоты столбцов (x, y) 3D результата.
+
+    Частота ячейки не возрастает вдоль столбца (каждая диаграмма содержит
+    ячейки столбца с нуля), поэтому ячейки с частотой не меньше threshold
+    образуют в каждом столбце отрезок от нуля.
+
+    Параметры:
+    -----------
+    result : SimulationResult
+        3D результат симуляции.
+    threshold : float, optional
+        Порог нормированной частоты; по умолчанию учитываются все ячейки.
+    """
+    index = get_index(result)
+    if threshold is None:
+        return index.heights.astype(np.int64)
+    coords = np.asarray(result.coords)
+    selected = coords[np.asarray(result.counts) / max(result.max_count, 1) >= threshold]
+    heights = np.zeros(index.shape[:2], dtype=np.int64)
+    np.add.at(heights, (selected[:, 0], selected[:, 1]), 1)
+    return heights
+
+
+def project_heightfield(heights: np.ndarray, elev: float = 20.0, azim: float = -30.0,
+                        width: int = 800) -> Dict[str, np.ndarray]:
+    """
+    Ортографическая проекция поля высот с определением видимости по пикселям.
+
+    Углы задаются как у mplot3d: камера над плоскостью на высоте elev градусов
+    и по азимуту azim. Для каждого столбца изображения луч идёт по земле от
+    камеры вглубь с шагом в пиксель; высота, видимая в строке, -- первая
+    точка луча, чья проекция (накопленный максимум) достаёт до строки, как в
+    рендеринге рельефа. Число точек пропорционально размеру изображения, а не
+    числу ячеек.
+
+    Параметры:
+    -----------
+    heights : np.ndarray
+        Высоты столбцов формы (X, Y); столбец (x, y) занимает [x, x+1] x [y, y+1] x [0, h].
+    elev : float, default=20.0
+        Угол возвышения камеры в градусах, (0, 90].
+    azim : float, default=-30.0
+        Азимут камеры в градусах.
+    width : int, default=800
+        Ширина изображения в пикселях; высота следует из геометрии.
+
+    Возвращает:
+    --------
+    Dict[str, np.ndarray]
+        Массивы формы (высота изображения, width), строка 0 сверху: hit --
+        попал ли пиксель в столбец, x, y, z -- видимая ячейка, axis -- ось
+        нормали видимой грани (0, 1 или 2 для верхней).
+    """
+    if not 0 < elev <= 90:
+        raise ValueError("Угол возвышения должен лежать в (0, 90]")
+    heights = np.asarray(heights, dtype=np.int64)
+    size_x, size_y = heights.shape
+    e, a = np.radians(elev), np.radians(azim)
+    sin_e, cos_e = np.sin(e), np.cos(e) if elev < 90 else 0.0
+    # Направление взгляда по земле и горизонталь экрана
+    view = np.array([-np.cos(a), -np.sin(a)])
+    right = np.array([-np.sin(a), np.cos(a)])
+
+    corners = np.array([[0, 0], [size_x, 0], [0, size_y], [size_x, size_y]], dtype=float)
+    s_range = corners @ right
+    d_range = corners @ view
+    s0, s1 = s_range.min(), s_range.max()
+    d0, d1 = d_range.min(), d_range.max()
+    top = int(heights.max()) if heights.size else 0
+    y0, y1 = d0 * sin_e, top * cos_e + d1 * sin_e
+    scale = width / max(s1 - s0, 1e-9)
+    rows = max(1, int(np.ceil((y1 - y0) * scale)))
+
+    # Точки лучей: столбец изображения x шаг вглубь (шаг -- пиксель на земле)
+    s = s0 + (np.arange(width) + 0.5) / scale
+    step = 1.0 / scale
+    d = d0 + (np.arange(max(1, int(np.ceil((d1 - d0) / step)))) + 0.5) * step
+    px = s[:, None] * right[0] + d[None, :] * view[0]
+    py = s[:, None] * right[1] + d[None, :] * view[1]
+    ix, iy = np.floor(px).astype(np.int64), np.floor(py).astype(np.int64)
+    inside = (ix >= 0) & (ix < size_x) & (iy >= 0) & (iy < size_y)
+    h = np.zeros(ix.shape, dtype=np.int64)
+    h[inside] = heights[ix[inside], iy[inside]]
+
+    # Проекция верха точки и накопленный максимум от камеры вглубь
+    y = h * cos_e + d[None, :] * sin_e
+    reach = np.maximum.accumulate(y, axis=1)
+
+    # Первая точка, достающая до каждой строки: один searchsorted по всем столбцам со сдвигом
+    depth = reach.shape[1]
+    offset = (y1 - y0) + 2.0 + np.abs(y0)
+    shifts = np.arange(width)[:, None] * offset
+    row_y = y0 + (np.arange(rows) + 0.5) / scale
+    position = np.searchsorted((reach + shifts).ravel(), (row_y[None, :] + shifts).ravel())
+    k = position.reshape(width, rows) - np.arange(width)[:, None] * depth
+    found = k < depth
+    k = np.minimum(k, depth - 1)
+    column = np.arange(width)[:, None]
+
+    hit_h = h[column, k]
+    hit = found & (hit_h > 0)
+    hit_x, hit_y = ix[column, k], iy[column, k]
+    # Верхняя грань -- строки в пределах шага луча от верха точки, остальное -- боковая
+    is_top = row_y[None, :] > y[column, k] - step * sin_e - 1e-9
+    z = np.where(is_top, hit_h - 1,
+                 np.floor((row_y[None, :] - d[k] * sin_e) / max(cos_e, 1e-9)).astype(np.int64))
+    z = np.clip(z, 0, np.maximum(hit_h - 1, 0))
+    # Боковая грань: ось, по которой луч перешёл в этот столбец
+    previous = np.maximum(k - 1, 0)
+    crossed_x = ix[column, previous] != hit_x
+    axis = np.where(is_top, 2, np.where(crossed_x, 0, 1))
+
+    flip = (slice(None, None, -1), slice(None))
+    return {name: array.T[flip] for name, array in
+            (("hit", hit), ("x", hit_x), ("y", hit_y), ("z", z), ("axis", axis))}
+
+
+def render_voxels(result: SimulationResult, elev: float = 20.0, azim: float = -30.0, width: int = 800,
+                  threshold: Optional[float] = None, cmap: str = "plasma",
+                  alpha: float = 1.0) -> np.ndarray:
+    """
+    Растровое изображение 3D результата: ортографический вид с затенением граней.
+
+    Цвет пикселя -- цвет видимой ячейки по её нормированной частоте (как в
+    воксельной визуализации), умноженный на яркость грани FACE_SHADE.
+
+    Параметры:
+    -----------
+    result : SimulationResult
+        3D результат симуляции.
+    elev, azim : float
+        Углы камеры в градусах (см. project_heightfield).
+    width : int, default=800
+        Ширина изображения в пикселях.
+    threshold : float, optional
+        Рисовать только ячейки с нормированной частотой не меньше threshold.
+    cmap : str, default="plasma"
+        Цветовая карта частот.
+    alpha : float, default=1.0
+        Непрозрачность ячеек.
+
+    Возвращает:
+    --------
+    np.ndarray
+        RGBA-изображение float формы (высота, width, 4); фон прозрачный.
+    """
+    from matplotlib import colormaps
+
+    index = get_index(result)
+    projection = project_heightfield(column_heights(result, threshold), elev, azim, width)
+    hit = projection["hit"]
+    image = np.zeros(hit.shape + (4,))
+    if not hit.any():
+        return image
+    x, y, z = projection["x"][hit], projection["y"][hit], projection["z"][hit]
+    # Ячейки столбца (x, y) идут в результате подряд с z = 0
+    counts = index.counts[index.column_start[x, y] + z]
+    colors = colormaps[cmap](counts / max(result.max_count, 1))
+    colors[:, :3] *= FACE_SHADE[projection["axis"][hit]][:, None]
+    colors[:, 3] = alpha
+    image[hit] = colors
+    return image
@@ -0,0 +1,164 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from common.metrics import max_rss_bytes
+
+# Визуализации по размерности: имя -> (метод симулятора, суффикс файла)
+VISUALIZATIONS = {
+    2: {
+        "heatmap": ("visualize", "_heatmap.png"),
+        "limit_shape": ("limit_shape_visualize", "_limit_shape.png"),
+    },
+    3: {
+        "voxel": ("visualize", "_voxel.png"),
+        "point": ("visualize_point_cloud", "_point_cloud.png"),
+        "slice": ("visualize_slices", "_slices.png"),
+        "limit_shape": ("visualize_limit_shape", "_limit_shape.png"),
+    },
+}
+
+# Симулятор с загруженным результатом в процессе пула: (путь, время изменения) -> симулятор
+_simulators: Dict[Tuple[str, float], Any] = {}
+
+
+def use_headless_backend() -> None:
+    """
+    Переключение matplotlib на Agg: рисование без дисплея и без блокирующего plt.show().
+    """
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+def _simulator(result_path: str, dimension: int) -> Any:
+    """
+    Симулятор с результатом из файла; в процессе пула создаётся один раз на файл.
+
+    Файл открывается через memory-map, и симулятор рисует прямо по массивам
+    результата (load_result не строит словарь количеств), поэтому процессы пула
+    читают одни и те же страницы кэша ОС, а не копии результата. Словарь
+    строится только для прежних режимов scatter (2D) и voxels (3D).
+    """
+    from common.result_file import open_result_file
+
+    key = (os.path.abspath(result_path), os.path.getmtime(result_path))
+    if key not in _simulators:
+        if dimension == 2:
+            from diagrams2d import DiagramSimulator2D as simulator_class
+        else:
+            from diagrams3d import DiagramSimulator3D as simulator_class
+        simulator = simulator_class()
+        simulator.load_result(open_result_file(result_path).to_result())
+        _simulators.clear()
+        _simulators[key] = simulator
+    return _simulators[key]
+
+
+def render_task(result_path: str, dimension: int, name: str, filename: str,
+                options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Одна визуализация результата из файла в PNG без показа на экране.
+
+    Параметры:
+    -----------
+    result_path : str
+        Путь к файлу результата (.ydr).
+    dimension : int
+        Размерность результата.
+    name : str
+        Имя визуализации из VISUALIZATIONS.
+    filename : str
+        Путь к изображению.
+    options : Dict[str, Any], optional
+        Дополнительные аргументы метода визуализации.
+
+    Возвращает:
+    --------
+    Dict[str, Any]
+        Имя, файл, статус (done, skipped -- метод не создал файл, failed),
+        время в секундах, ошибка и наибольший RSS процесса.
+    """
+    use_headless_backend()
+    import matplotlib.pyplot as plt
+
+    started = time.perf_counter()
+    record = {"name": name, "filename": filename, "status": "done", "error": None, "pid": os.getpid()}
+    try:
+        method = VISUALIZATIONS[dimension][name][0]
+        simulator = _simulator(result_path, dimension)
+        if os.path.exists(filename):
+            os.remove(filename)
+        fig = getattr(simulator, method)(filename=filename, show=False, **(options or {}))
+        if fig is not None:
+            plt.close(fig)
+        if not os.path.exists(filename):
+            record["status"] = "skipped"
+    except Exception as e:
+        record.update(status="failed", error=f"{type(e).__name__}: {e}")
+    finally:
+        # Фигуры, созданные методом помимо возвращённой, тоже освобождаются
+        plt.close("all")
+    record["seconds"] = time.perf_counter() - started
+    record["max_rss_bytes"] = max_rss_bytes()
+    return record
+
+
+def render_batch(result_path: str, dimension: int, tasks: List[Tuple[str, str, Dict[str, Any]]],
+                 workers: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Параллельное рисование нескольких визуализаций одного результата.
+
+    Каждая визуализация -- отдельная задача пула процессов; процессы читают
+    результат из одного файла через memory-map. При одном процессе или одной
+    задаче всё рисуется в текущем процессе.
+
+    Параметры:
+    -----------
+    result_path : str
+        Путь к файлу результата (.ydr).
+    dimension : int
+        Размерность результата.
+    tasks : List[Tuple[str, str, Dict[str, Any]]]
+        Имя визуализации, путь к изображению и аргументы метода.
+    workers : int, optional
+        Число процессов; по умолчанию -- число ядер.
+
+    Возвращает:
+    --------
+    List[Dict[str, Any]]
+        Записи render_task в порядке tasks.
+    """
+    workers = min(workers or os.cpu_count() or 1, len(tasks))
+    if workers <= 1:
+        return [render_task(result_path, dimension, name, filename, options) for name, filename, options in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(render_task, result_path, dimension, name, filename, options)
+                   for name, filename, options in tasks]
+        return [future.result() for future in futures]
+
+
+def visualization_tasks(dimension: int, base_filename: str, names: List[str],
+                        options: Optional[Dict[str, Dict[str, Any]]] = None) -> List[Tuple[str, str, Dict[str, Any]]]:
+    """
+    Задачи render_batch для визуализаций names с именами файлов base_filename + суффикс.
+    """
+    options = options or {}
+    return [(name, base_filename + VISUALIZATIONS[dimension][name][1], options.get(name, {})) for name in names]
+
+
+def report(records: List[Dict[str, Any]], elapsed: float) -> None:
+    """
+    Вывод итогов рисования: по строке на визуализацию и общее время.
+    """
+    for record in records:
+        line = f"  {record['name']}: {record['status']}, {record['seconds']:.2f} с"
+        if record["status"] == "done":
+            line += f" -> {record['filename']}"
+        elif record["error"]:
+            line += f" ({record['error']})"
+        print(line)
+    busy = sum(record["seconds"] for record in records)
+    processes = len({record["pid"] for record in records})
+    print(f"  Визуализации: {elapsed:.2f} с (сумма по задачам {busy:.2f} с, процессов: {processes})")
@@ -0,0 +1,156 @@
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from common.heights import HeightStatistics
+
+# Версия движка симуляции; входит в ключи кэша и метаданные сохранённых результатов
+ENGINE_VERSION = "reference-1"
+
+
+class SimulationResult:
+    """
+    Компактное представление накопленного результата симуляции.
+
+    Координаты ячеек хранятся в массиве int32 формы (N, dimension), отсортированном
+    лексикографически, а количества появлений -- в массиве uint32 длины N.
+    """
+    def __init__(self, dimension: int, coords: np.ndarray, counts: np.ndarray,
+                 params: Dict[str, Any], runs_completed: Optional[int] = None,
+                 truncated: bool = False, stop_reason: Optional[str] = None,
+                 result_id: Optional[str] = None, elapsed: Optional[float] = None,
+                 stats: Optional[Dict[str, Any]] = None, heights: Optional[HeightStatistics] = None,
+                 artifacts: Optional[Dict[str, bytes]] = None):
+        """
+        Параметры:
+        -----------
+        dimension : int
+            Размерность диаграммы (2 или 3).
+        coords : np.ndarray
+            Координаты ячеек формы (N, dimension).
+        counts : np.ndarray
+            Количество появлений каждой ячейки.
+        params : Dict[str, Any]
+            Параметры симуляции: steps, alpha, runs, seed, engine.
+        runs_completed : int, optional
+            Количество завершённых запусков. По умолчанию params["runs"].
+        truncated : bool, default=False
+            Была ли симуляция остановлена досрочно.
+        stop_reason : str, optional
+            Причина досрочной остановки.
+        result_id : str, optional
+            Идентификатор результата в хранилище.
+        elapsed : float, optional
+            Время вычисления в секундах.
+        stats : Dict[str, Any], optional
+            Статистика вычисления: время по фазам и пиковая память (см. run_simulation_job).
+            В метаданные не входит.
+        heights : HeightStatistics, optional
+            Среднее и дисперсия функции высоты по завершённым запускам.
+        artifacts : Dict[str, bytes], optional
+            Файлы, полученные при вычислении (профиль задачи, см. run_simulation_job).
+            Хранилище сохраняет их отдельно от результата.
+        """
+        self.dimension = dimension
+        self.coords = np.asarray(coords, dtype=np.int32).reshape(-1, dimension)
+        self.counts = np.asarray(counts, dtype=np.uint32)
+        self.params = dict(params)
+        self.runs_completed = runs_completed if runs_completed is not None else params.get("runs")
+        self.truncated = truncated
+        self.stop_reason = stop_reason
+        self.result_id = result_id
+        self.elapsed = elapsed
+        self.stats = stats
+        self.heights = heights
+        self.artifacts = artifacts or {}
+
+    @classmethod
+    def from_counts(cls, cell_counts: Dict[Tuple, int], dimension: int,
+                    params: Dict[str, Any], **kwargs) -> "SimulationResult":
+        """
+        Создание результата из словаря количества ячеек.
+
+        Параметры:
+        -----------
+        cell_counts : Dict[Tuple, int]
+            Словарь с координатами ячеек в качестве ключей и количеством в качестве значений.
+        dimension : int
+            Размерность диаграммы (2 или 3).
+        params : Dict[str, Any]
+            Параметры симуляции.
+        """
+        items = sorted(cell_counts.items())
+        coords = np.array([coords for coords, _ in items], dtype=np.int32).reshape(-1, dimension)
+        counts = np.array([count for _, count in items], dtype=np.uint32)
+        return cls(dimension, coords, counts, params, **kwargs)
+
+    def to_counts(self) -> Dict[Tuple, int]:
+        """
+        Преобразование обратно в словарь количества ячеек.
+        """
+        return {tuple(cell): int(count) for cell, count in zip(self.coords.tolist(), self.counts.tolist())}
+
+    @property
+    def size(self) -> int:
+        """
+        Количество различных ячеек.
+        """
+        return len(self.counts)
+
+    @property
+    def max_count(self) -> int:
+        """
+        Максимальное количество появлений ячейки.
+        """
+        return int(self.counts.max()) if self.size else 0
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Объём памяти, занимаемый массивами результата.
+        """
+        nbytes = self.coords.nbytes + self.counts.nbytes
+        if self.heights is not None:
+            nbytes += self.heights.mean.nbytes + self.heights.m2.nbytes
+        return nbytes
+
+    def metadata(self) -> Dict[str, Any]:
+        """
+        Метаданные результата без массивов ячеек.
+        """
+        return {
+            "result_id": self.result_id,
+            "dimension": self.dimension,
+            "params": self.params,
+            "runs_completed": self.runs_completed,
+            "truncated": self.truncated,
+            "stop_reason": self.stop_reason,
+            "elapsed": self.elapsed,
+        }
+
+    def to_json_data(self) -> Dict[str, Any]:
+        """
+        Данные в формате get_json_data() симуляторов.
+        """
+        if not self.size:
+            return {"error": "No data available. Run simulations first."}
+
+        axes = ("x", "y", "z")[:self.dimension]
+        max_count = self.max_count
+        cells_data = []
+        for cell, count in zip(self.coords.tolist(), self.counts.tolist()):
+            item = dict(zip(axes, cell))
+            item["count"] = count
+            item["normalized_count"] = count / max_count
+            cells_data.append(item)
+
+        maxima = self.coords.max(axis=0) + 1
+        return {
+            "result_id": self.result_id,
+            "cells": cells_data,
+            "max_count": max_count,
+            "runs_completed": self.runs_completed,
+            "truncated": self.truncated,
+            "stop_reason": self.stop_reason,
+            "dimensions": {f"max_{axis}": int(value) for axis, value in zip(axes, maxima)}
+        }
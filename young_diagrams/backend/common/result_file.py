@@ -0,0 +1,511 @@
+import json
+import os
+import re
+import shutil
+import struct
+import uuid
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from common.heights import HeightStatistics
+from common.result import ENGINE_VERSION, SimulationResult
+
+# Сигнатура и версия формата файла результата
+RESULT_FILE_MAGIC = b"YDRF"
+RESULT_FILE_VERSION = 1
+# Выравнивание начала каждого массива в файле (в байтах)
+RESULT_FILE_ALIGNMENT = 64
+# Расширение файлов результата
+RESULT_FILE_SUFFIX = ".ydr"
+
+LAYOUTS = ("sparse", "columns", "dense")
+
+
+def _align(offset: int) -> int:
+    return offset + (-offset % RESULT_FILE_ALIGNMENT)
+
+
+def smallest_uint(max_value: int) -> np.dtype:
+    """
+    Наименьший беззнаковый целый тип, вмещающий max_value.
+    """
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_value <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+
+def column_heights(coords: np.ndarray, dimension: int) -> Optional[np.ndarray]:
+    """
+    Высоты столбцов, если ячейки каждого столбца идут подряд от нуля.
+
+    Столбец -- ячейки с общими первыми dimension - 1 координатами. Объединение
+    диаграмм Юнга -- снова диаграмма Юнга, поэтому для результатов симуляции
+    ячейки определяются одними высотами столбцов.
+
+    Параметры:
+    -----------
+    coords : np.ndarray
+        Лексикографически отсортированные координаты ячеек (N, dimension).
+    dimension : int
+        Размерность диаграммы.
+
+    Возвращает:
+    --------
+    np.ndarray or None
+        Высоты столбцов формы (max_x + 1[, max_y + 1]) или None, если в каком-то
+        столбце есть пропуск.
+    """
+    coords = np.asarray(coords)
+    if not len(coords):
+        return np.zeros((0,) * (dimension - 1), dtype=np.uint8)
+    base = coords[:, :-1].astype(np.int64)
+    shape = tuple(int(v) + 1 for v in base.max(axis=0))
+    column = np.ravel_multi_index(tuple(base.T), shape)
+    starts = np.flatnonzero(np.r_[True, column[1:] != column[:-1]])
+    lengths = np.diff(np.r_[starts, len(column)])
+    if np.any(coords[:, -1] != np.arange(len(column)) - np.repeat(starts, lengths)):
+        return None
+    heights = np.zeros(shape, dtype=smallest_uint(int(lengths.max())))
+    heights.flat[column[starts]] = lengths
+    return heights
+
+
+def coords_from_heights(heights: np.ndarray, first: int = 0, stop: Optional[int] = None) -> np.ndarray:
+    """
+    Координаты ячеек (int32, в лексикографическом порядке) по высотам столбцов.
+
+    first и stop ограничивают диапазон столбцов (в порядке C); по умолчанию -- все столбцы.
+    """
+    lengths = np.asarray(heights).ravel()[first:stop].astype(np.int64)
+    total = int(lengths.sum())
+    column = np.repeat(np.arange(first, first + len(lengths)), lengths)
+    starts = np.cumsum(lengths) - lengths
+    last = np.arange(total) - np.repeat(starts, lengths)
+    base = np.unravel_index(column, np.shape(heights))
+    return np.stack(list(base) + [last], axis=1).astype(np.int32).reshape(-1, np.ndim(heights) + 1)
+
+
+def result_arrays(result: SimulationResult, layout: str) -> Dict[str, np.ndarray]:
+    """
+    Массивы файла результата для раскладки layout.
+
+    sparse -- coords (int32, (N, dimension)) и counts (uint32): их можно
+    отобразить в память и передать в SimulationResult без копирования.
+    columns -- высоты столбцов (см. column_heights) и counts в порядке ячеек,
+    оба с наименьшим беззнаковым типом; годится, только если у столбцов нет пропусков.
+    dense -- grid формы (max_x + 1, ...) с наименьшим беззнаковым типом,
+    вмещающим наибольшее количество.
+    К ним добавляются height_mean и height_m2, если у результата есть статистика высот.
+    """
+    coords = np.asarray(result.coords)
+    counts = np.asarray(result.counts)
+    if layout == "sparse":
+        arrays = {"coords": coords.astype(np.int32, copy=False), "counts": counts.astype(np.uint32, copy=False)}
+    elif layout == "columns":
+        heights = column_heights(coords, result.dimension)
+        if heights is None:
+            raise ValueError("Раскладка columns требует столбцов без пропусков")
+        arrays = {"column_heights": heights, "counts": counts.astype(smallest_uint(result.max_count))}
+    elif layout == "dense":
+        shape = tuple(int(v) + 1 for v in coords.max(axis=0)) if len(coords) else (0,) * result.dimension
+        grid = np.zeros(shape, dtype=smallest_uint(result.max_count))
+        grid[tuple(coords.T)] = counts
+        arrays = {"grid": grid}
+    else:
+        raise ValueError(f"Неизвестная раскладка: {layout}")
+    if result.heights is not None:
+        arrays["height_mean"] = result.heights.mean
+        arrays["height_m2"] = result.heights.m2
+    return arrays
+
+
+def layout_nbytes(result: SimulationResult, layout: str) -> int:
+    """
+    Объём массивов раскладки layout по форме и типу, без их построения.
+
+    Для columns оценка точна, если у столбцов нет пропусков (иначе раскладка
+    всё равно недоступна); массивы статистики высот одинаковы во всех раскладках
+    и не учитываются.
+    """
+    coords = np.asarray(result.coords)
+    count_size = smallest_uint(result.max_count).itemsize
+    if layout == "sparse":
+        return result.size * (result.dimension + 1) * 4
+    if not len(coords):
+        return 0
+    top = coords.max(axis=0).astype(np.int64) + 1
+    if layout == "columns":
+        return int(np.prod(top[:-1])) * smallest_uint(int(top[-1])).itemsize + result.size * count_size
+    return int(np.prod(top)) * count_size
+
+
+def choose_arrays(result: SimulationResult) -> Tuple[str, Dict[str, np.ndarray]]:
+    """
+    Раскладка, дающая наименьший файл, и её массивы.
+
+    Раскладки сравниваются по оценке объёма (layout_nbytes), и строится только
+    выбранная: плотная сетка вытянутой 3D диаграммы может быть в тысячи раз
+    больше её ячеек.
+    """
+    for layout in sorted(LAYOUTS, key=lambda layout: (layout_nbytes(result, layout), LAYOUTS.index(layout))):
+        try:
+            return layout, result_arrays(result, layout)
+        except ValueError:
+            continue
+    raise ValueError("Нет подходящей раскладки")
+
+def write_result_file(result: SimulationResult, path: str, layout: str = "auto",
+                      extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Запись результата в бинарный файл.
+
+    Файл: сигнатура YDRF, версия формата и длина заголовка (uint32 little-endian),
+    JSON-заголовок с метаданными результата, версией движка, раскладкой и
+    положением массивов, затем сами массивы в C-порядке little-endian, каждый с
+    границы 64 байт. Запись атомарна: файл пишется рядом и переименовывается.
+
+    Параметры:
+    -----------
+    result : SimulationResult
+        Результат симуляции.
+    path : str
+        Путь к файлу.
+    layout : str, default="auto"
+        "sparse", "columns", "dense" или "auto" (наименьший файл, см. choose_arrays).
+    extra : Dict[str, Any], optional
+        Дополнительные поля заголовка (например, происхождение данных).
+
+    Возвращает:
+    --------
+    Dict[str, Any]
+        Записанный заголовок.
+    """
+    if layout == "auto":
+        layout, arrays = choose_arrays(result)
+    else:
+        arrays = result_arrays(result, layout)
+
+    header = result_header(result, layout, extra)
+    parts = [(name, array.dtype, array.shape, lambda f, array=array: f.write(_little_endian(array).tobytes()))
+             for name, array in arrays.items()]
+    return _write_parts(path, header, parts)
+
+
+def result_header(result: SimulationResult, layout: str, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Заголовок файла результата без описания массивов.
+    """
+    header = dict(result.metadata(), format_version=RESULT_FILE_VERSION, layout=layout,
+                  engine=result.params.get("engine", ENGINE_VERSION), cells=result.size,
+                  max_count=result.max_count, **(extra or {}))
+    if result.heights is not None:
+        header["height_runs"] = result.heights.runs
+    return header
+
+
+def _little_endian(array: np.ndarray) -> np.ndarray:
+    return np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<"))
+
+
+def _write_parts(path: str, header: Dict[str, Any],
+                 parts: List[Tuple[str, np.dtype, Tuple[int, ...], Callable[[BinaryIO], Any]]]) -> Dict[str, Any]:
+    """
+    Атомарная запись файла: заголовок и массивы, каждый из которых пишет своя функция.
+
+    Параметры:
+    -----------
+    path : str
+        Путь к файлу.
+    header : Dict[str, Any]
+        Заголовок; поле "arrays" заполняется здесь.
+    parts : List[Tuple[str, np.dtype, Tuple[int, ...], Callable]]
+        Имя, тип, форма массива и функция, записывающая его байты в открытый файл.
+    """
+    # Смещения массивов зависят от длины заголовка, а она -- от смещений;
+    # заголовок дополняется пробелами до границы выравнивания, поэтому
+    # размещение устанавливается за несколько проходов
+    specs = [{"name": name, "dtype": np.dtype(dtype).newbyteorder("<").str, "shape": [int(v) for v in shape]}
+             for name, dtype, shape, _ in parts]
+    header = dict(header)
+    data_start, header_bytes = 0, b""
+    while data_start != len(RESULT_FILE_MAGIC) + 8 + len(header_bytes):
+        data_start = len(RESULT_FILE_MAGIC) + 8 + len(header_bytes)
+        offset = data_start
+        for spec, (_, dtype, shape, _) in zip(specs, parts):
+            spec["offset"] = offset
+            offset = _align(offset + int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        header["arrays"] = specs
+        header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+        header_bytes += b" " * (-(len(RESULT_FILE_MAGIC) + 8 + len(header_bytes)) % RESULT_FILE_ALIGNMENT)
+
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(RESULT_FILE_MAGIC)
+            f.write(struct.pack("<II", RESULT_FILE_VERSION, len(header_bytes)))
+            f.write(header_bytes)
+            for spec, (_, _, _, write) in zip(specs, parts):
+                f.write(b"\0" * (spec["offset"] - f.tell()))
+                write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return header
+
+
+def write_result_stream(path: str, dimension: int, chunks: Iterable[Tuple[np.ndarray, np.ndarray]],
+                        metadata: Dict[str, Any], heights: Optional[HeightStatistics] = None,
+                        extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Запись результата, ячейки которого приходят порциями, в раскладке sparse.
+
+    Порции (координаты, количества) должны идти в лексикографическом порядке
+    без повторов. Они сразу пишутся во временные файлы рядом с path, и в
+    памяти никогда не бывает больше одной порции; число ячеек становится
+    известно в конце, после чего файл собирается копированием.
+
+    Параметры:
+    -----------
+    path : str
+        Путь к файлу.
+    dimension : int
+        Размерность диаграммы.
+    chunks : Iterable[Tuple[np.ndarray, np.ndarray]]
+        Порции координат (k, dimension) и количеств (k,).
+    metadata : Dict[str, Any]
+        Метаданные результата (как SimulationResult.metadata()).
+    heights : HeightStatistics, optional
+        Статистика функции высоты.
+    extra : Dict[str, Any], optional
+        Дополнительные поля заголовка.
+    """
+    stem = f"{path}.{uuid.uuid4().hex}"
+    coords_path, counts_path = f"{stem}.coords.tmp", f"{stem}.counts.tmp"
+    cells, max_count = 0, 0
+    try:
+        with open(coords_path, "wb") as coords_file, open(counts_path, "wb") as counts_file:
+            for coords, counts in chunks:
+                coords_file.write(_little_endian(np.asarray(coords, dtype=np.int32).reshape(-1, dimension)).tobytes())
+                counts_file.write(_little_endian(np.asarray(counts, dtype=np.uint32)).tobytes())
+                cells += len(counts)
+                max_count = max(max_count, int(np.max(counts)) if len(counts) else 0)
+
+        def copy(source: str) -> Callable[[BinaryIO], Any]:
+            def write(f: BinaryIO) -> None:
+                with open(source, "rb") as data:
+                    shutil.copyfileobj(data, f, 1 << 20)
+            return write
+
+        header = dict(metadata, dimension=dimension, format_version=RESULT_FILE_VERSION, layout="sparse",
+                      engine=metadata.get("params", {}).get("engine", ENGINE_VERSION), cells=cells,
+                      max_count=max_count, **(extra or {}))
+        parts = [("coords", np.dtype(np.int32), (cells, dimension), copy(coords_path)),
+                 ("counts", np.dtype(np.uint32), (cells,), copy(counts_path))]
+        if heights is not None:
+            header["height_runs"] = heights.runs
+            parts += [(name, array.dtype, array.shape, lambda f, array=array: f.write(_little_endian(array).tobytes()))
+                      for name, array in (("height_mean", heights.mean), ("height_m2", heights.m2))]
+        return _write_parts(path, header, parts)
+    finally:
+        for tmp in (coords_path, counts_path):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+
+def read_result_header(path: str) -> Dict[str, Any]:
+    """
+    Заголовок файла результата (массивы не читаются).
+    """
+    with open(path, "rb") as f:
+        prefix = f.read(len(RESULT_FILE_MAGIC) + 8)
+        if prefix[:len(RESULT_FILE_MAGIC)] != RESULT_FILE_MAGIC:
+            raise ValueError(f"{path}: неверная сигнатура файла результата")
+        version, header_length = struct.unpack("<II", prefix[len(RESULT_FILE_MAGIC):])
+        if version > RESULT_FILE_VERSION:
+            raise ValueError(f"{path}: неподдерживаемая версия формата {version}")
+        return json.loads(f.read(header_length))
+
+
+def infer_text_params(path: str, max_count: int, total: int) -> Dict[str, Any]:
+    """
+    Параметры симуляции для текстового файла ячеек, в котором их нет.
+
+    Число запусков -- наибольшее количество (угловая ячейка есть в каждом
+    запуске), число шагов -- по сумме количеств (каждый запуск даёт steps + 1
+    ячеек; если сумма не делится на число запусков, шаги неизвестны), alpha --
+    по имени файла вида young_diagram_2d_alpha_1.0_cells.txt. Зерно и версия
+    движка неизвестны.
+
+    Параметры:
+    -----------
+    path : str
+        Путь к текстовому файлу.
+    max_count : int
+        Наибольшее количество ячейки.
+    total : int
+        Сумма количеств всех ячеек.
+    """
+    match = re.search(r"alpha_([0-9.]+?)(?:_cells)?\.txt$", os.path.basename(path))
+    return {
+        "steps": total // max_count - 1 if max_count and total % max_count == 0 else None,
+        "alpha": float(match.group(1)) if match else None,
+        "runs": max_count,
+        "seed": None,
+        "engine": None,
+    }
+
+
+class ResultFile:
+    """
+    Файл результата, открытый для ленивого чтения.
+
+    При открытии читается только заголовок; массивы отображаются в память
+    (np.memmap) при первом обращении, поэтому открытие не зависит от размера
+    файла, а прочитаны будут только нужные страницы.
+    """
+    def __init__(self, path: str):
+        """
+        Параметры:
+        -----------
+        path : str
+            Путь к файлу результата.
+        """
+        self.path = path
+        self.header = read_result_header(path)
+        self.dimension: int = self.header["dimension"]
+        self.params: Dict[str, Any] = self.header["params"]
+        self.layout: str = self.header["layout"]
+        self._specs = {spec["name"]: spec for spec in self.header["arrays"]}
+        self._arrays: Dict[str, np.ndarray] = {}
+
+    def array(self, name: str) -> np.ndarray:
+        """
+        Массив файла, отображённый в память (только для чтения).
+        """
+        if name not in self._arrays:
+            spec = self._specs[name]
+            shape = tuple(spec["shape"])
+            if not int(np.prod(shape)):
+                # Пустой массив отобразить в память нельзя
+                self._arrays[name] = np.zeros(shape, dtype=spec["dtype"])
+            else:
+                self._arrays[name] = np.memmap(self.path, dtype=spec["dtype"], mode="r",
+                                               offset=spec["offset"], shape=shape)
+        return self._arrays[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._specs
+
+    @property
+    def coords(self) -> np.ndarray:
+        """
+        Координаты ячеек (N, dimension), отсортированные лексикографически.
+        """
+        if self.layout == "sparse":
+            return self.array("coords")
+        if self.layout == "columns":
+            return coords_from_heights(self.array("column_heights"))
+        return np.argwhere(self.array("grid")).astype(np.int32)
+
+    @property
+    def counts(self) -> np.ndarray:
+        """
+        Количества ячеек в порядке coords.
+        """
+        if self.layout == "sparse":
+            return self.array("counts")
+        if self.layout == "columns":
+            return self.array("counts").astype(np.uint32)
+        grid = self.array("grid")
+        return grid[grid != 0].astype(np.uint32)
+
+    @property
+    def grid(self) -> np.ndarray:
+        """
+        Плотная сетка количеств формы (max_x + 1, ...).
+        """
+        if self.layout == "dense":
+            return self.array("grid")
+        coords, counts = self.coords, self.counts
+        shape = tuple(int(v) + 1 for v in coords.max(axis=0)) if len(coords) else (0,) * self.dimension
+        grid = np.zeros(shape, dtype=np.uint32)
+        grid[tuple(np.asarray(coords).T)] = counts
+        return grid
+
+    def iter_chunks(self, chunk_cells: int = 1 << 20) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """
+        Ячейки файла порциями примерно по chunk_cells в лексикографическом порядке.
+
+        Читаются только страницы очередной порции, поэтому память не зависит от размера файла.
+
+        Параметры:
+        -----------
+        chunk_cells : int, default=1 << 20
+            Примерный размер порции в ячейках.
+
+        Yields:
+        -------
+        Tuple[np.ndarray, np.ndarray]
+            Координаты int32 формы (k, dimension) и количества uint32.
+        """
+        if self.layout == "sparse":
+            coords, counts = self.array("coords"), self.array("counts")
+            for start in range(0, len(counts), chunk_cells):
+                yield np.array(coords[start:start + chunk_cells]), np.array(counts[start:start + chunk_cells])
+        elif self.layout == "columns":
+            heights = self.array("column_heights")
+            counts = self.array("counts")
+            # Границы порций -- по столбцам: столбец целиком попадает в одну порцию
+            ends = np.cumsum(np.asarray(heights, dtype=np.int64).ravel())
+            first, cell = 0, 0
+            while first < len(ends):
+                stop = max(int(np.searchsorted(ends, cell + chunk_cells, side="right")), first + 1)
+                end = int(ends[stop - 1])
+                if end > cell:
+                    yield coords_from_heights(heights, first, stop), np.array(counts[cell:end], dtype=np.uint32)
+                first, cell = stop, end
+        else:
+            grid = self.array("grid")
+            if not grid.size:
+                return
+            rows = max(1, chunk_cells // max(int(np.prod(grid.shape[1:])), 1))
+            for x in range(0, grid.shape[0], rows):
+                slab = np.asarray(grid[x:x + rows])
+                present = slab != 0
+                coords = np.argwhere(present).astype(np.int32)
+                if not len(coords):
+                    continue
+                coords[:, 0] += x
+                yield coords, slab[present].astype(np.uint32)
+
+    @property
+    def heights(self) -> Optional[HeightStatistics]:
+        """
+        Статистика функции высоты или None, если её нет в файле.
+        """
+        if "height_mean" not in self:
+            return None
+        return HeightStatistics(self.dimension, self.header["height_runs"],
+                                np.array(self.array("height_mean")), np.array(self.array("height_m2")))
+
+    def to_result(self) -> SimulationResult:
+        """
+        SimulationResult с массивами файла (для раскладки sparse -- без копирования,
+        для остальных координаты и количества восстанавливаются в памяти).
+        """
+        header = self.header
+        return SimulationResult(self.dimension, self.coords, self.counts, self.params,
+                                runs_completed=header["runs_completed"], truncated=header["truncated"],
+                                stop_reason=header["stop_reason"], result_id=header.get("result_id"),
+                                elapsed=header.get("elapsed"), heights=self.heights)
+
+
+def open_result_file(path: str) -> ResultFile:
+    """
+    Открытие файла результата для ленивого чтения.
+    """
+    return ResultFile(path)
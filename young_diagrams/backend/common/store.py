@@ -0,0 +1,375 @@
+import glob
+import json
+import os
+import shutil
+import threading
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Set
+
+import numpy as np
+
+from common.heights import HeightStatistics
+from common.result import SimulationResult
+
+
+class ResultStore(ABC):
+    """
+    Хранилище результатов по идентификаторам, общее для всех процессов API.
+
+    Кроме самих результатов хранит указатель на последний результат каждой
+    размерности, записи задач и пакетов и файлы задач, чтобы любой процесс мог
+    ответить на их опрос, а также запросы отмены: задачу выполняет процесс,
+    который её поставил, поэтому отмена через другой процесс записывается сюда
+    и выполняется владельцем при проверке.
+    """
+    @abstractmethod
+    def put(self, result_id: str, result: SimulationResult) -> None:
+        """
+        Сохранение результата под идентификатором.
+        """
+
+    @abstractmethod
+    def get(self, result_id: str) -> Optional[SimulationResult]:
+        """
+        Результат по идентификатору или None.
+        """
+
+    @abstractmethod
+    def find(self, prefix: str) -> List[str]:
+        """
+        Идентификаторы результатов с данным префиксом, от новых к старым.
+        """
+
+    @abstractmethod
+    def set_latest(self, dimension: int, result_id: str) -> None:
+        """
+        Запоминание последнего результата размерности.
+        """
+
+    @abstractmethod
+    def latest(self, dimension: int) -> Optional[str]:
+        """
+        Идентификатор последнего результата размерности или None.
+        """
+
+    @abstractmethod
+    def put_artifact(self, job_id: str, name: str, data: bytes) -> None:
+        """
+        Файл, относящийся к задаче (например, её профиль).
+        """
+
+    @abstractmethod
+    def get_artifact(self, job_id: str, name: str) -> Optional[bytes]:
+        """
+        Содержимое файла задачи или None.
+        """
+
+    @abstractmethod
+    def list_artifacts(self, job_id: str) -> List[str]:
+        """
+        Имена файлов задачи.
+        """
+
+    @abstractmethod
+    def put_job(self, job: Dict[str, Any]) -> None:
+        """
+        Сохранение записи задачи (Job.to_dict) под её job_id.
+        """
+
+    @abstractmethod
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Запись задачи или None; запись может быть общей с хранилищем, её нельзя изменять.
+        """
+
+    @abstractmethod
+    def put_batch(self, batch: Dict[str, Any]) -> None:
+        """
+        Сохранение записи пакета под его batch_id.
+        """
+
+    @abstractmethod
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Запись пакета или None.
+        """
+
+    @abstractmethod
+    def put_request(self, request_id: str, job_id: str) -> None:
+        """
+        Задача синхронного запроса с данным request_id (для отмены через любой воркер).
+        """
+
+    @abstractmethod
+    def get_request(self, request_id: str) -> Optional[str]:
+        """
+        Идентификатор задачи запроса или None.
+        """
+
+    @abstractmethod
+    def request_cancel(self, job_id: str) -> None:
+        """
+        Запрос отмены задачи другого воркера; воркер-владелец проверяет его через cancel_requested.
+        """
+
+    @abstractmethod
+    def cancel_requested(self, job_id: str) -> bool:
+        """
+        Запрошена ли отмена задачи через request_cancel.
+        """
+
+
+class MemoryResultStore(ResultStore):
+    """
+    Хранилище в памяти одного процесса; подходит для одного воркера и для проверок.
+    """
+    def __init__(self):
+        self._results: Dict[str, SimulationResult] = {}
+        self._latest: Dict[int, str] = {}
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._batches: Dict[str, Dict[str, Any]] = {}
+        self._artifacts: Dict[str, Dict[str, bytes]] = {}
+        self._requests: Dict[str, str] = {}
+        self._cancelled: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def put(self, result_id: str, result: SimulationResult) -> None:
+        with self._lock:
+            self._results[result_id] = result
+
+    def get(self, result_id: str) -> Optional[SimulationResult]:
+        return self._results.get(result_id)
+
+    def find(self, prefix: str) -> List[str]:
+        with self._lock:
+            return [key for key in reversed(list(self._results)) if key.startswith(prefix)]
+
+    def set_latest(self, dimension: int, result_id: str) -> None:
+        self._latest[dimension] = result_id
+
+    def latest(self, dimension: int) -> Optional[str]:
+        return self._latest.get(dimension)
+
+    def put_artifact(self, job_id: str, name: str, data: bytes) -> None:
+        with self._lock:
+            self._artifacts.setdefault(job_id, {})[name] = data
+
+    def get_artifact(self, job_id: str, name: str) -> Optional[bytes]:
+        return self._artifacts.get(job_id, {}).get(name)
+
+    def list_artifacts(self, job_id: str) -> List[str]:
+        return sorted(self._artifacts.get(job_id, {}))
+
+    def put_job(self, job: Dict[str, Any]) -> None:
+        self._jobs[job["job_id"]] = job
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._jobs.get(job_id)
+
+    def put_batch(self, batch: Dict[str, Any]) -> None:
+        self._batches[batch["batch_id"]] = batch
+
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        return self._batches.get(batch_id)
+
+    def put_request(self, request_id: str, job_id: str) -> None:
+        self._requests[request_id] = job_id
+
+    def get_request(self, request_id: str) -> Optional[str]:
+        return self._requests.get(request_id)
+
+    def request_cancel(self, job_id: str) -> None:
+        with self._lock:
+            self._cancelled.add(job_id)
+
+    def cancel_requested(self, job_id: str) -> bool:
+        return job_id in self._cancelled
+
+
+class FileSystemResultStore(ResultStore):
+    """
+    Хранилище в каталоге на диске.
+
+    Каждый результат -- подкаталог с файлами coords.npy, counts.npy и meta.json
+    (и height_mean.npy, height_m2.npy со статистикой функции высоты, если она есть);
+    записи задач -- jobs/<id>.json, а файлы задачи (профиль) -- в jobs/<id>/artifacts;
+    запрос отмены -- пустой файл jobs/<id>.cancel, задача синхронного запроса -- requests/<request_id>.json.
+    Массивы открываются через memory-map, поэтому чтение не копирует данные в
+    память процесса, а страницы файлов разделяются всеми воркерами через кэш ОС.
+    Записи атомарны: результат пишется во временный каталог и переименовывается.
+    """
+    def __init__(self, root: str):
+        """
+        Параметры:
+        -----------
+        root : str
+            Корневой каталог хранилища.
+        """
+        self.root = root
+        os.makedirs(os.path.join(root, "results"), exist_ok=True)
+        os.makedirs(os.path.join(root, "jobs"), exist_ok=True)
+        os.makedirs(os.path.join(root, "batches"), exist_ok=True)
+        os.makedirs(os.path.join(root, "requests"), exist_ok=True)
+
+    def _result_dir(self, result_id: str) -> str:
+        if not result_id or "/" in result_id or result_id.startswith("."):
+            raise ValueError(f"Недопустимый идентификатор результата: {result_id}")
+        return os.path.join(self.root, "results", result_id)
+
+    def _write_atomic(self, path: str, data: bytes) -> None:
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def put(self, result_id: str, result: SimulationResult) -> None:
+        target = self._result_dir(result_id)
+        if os.path.isdir(target):
+            return
+
+        tmp_dir = f"{target}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(tmp_dir)
+        np.save(os.path.join(tmp_dir, "coords.npy"), result.coords)
+        np.save(os.path.join(tmp_dir, "counts.npy"), result.counts)
+        meta = result.metadata()
+        if result.heights is not None:
+            np.save(os.path.join(tmp_dir, "height_mean.npy"), result.heights.mean)
+            np.save(os.path.join(tmp_dir, "height_m2.npy"), result.heights.m2)
+            meta["height_runs"] = result.heights.runs
+        with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+            json.dump(meta, f)
+        try:
+            os.rename(tmp_dir, target)
+        except OSError:
+            # Тот же результат уже записан другим процессом
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    def get(self, result_id: str) -> Optional[SimulationResult]:
+        directory = self._result_dir(result_id)
+        try:
+            with open(os.path.join(directory, "meta.json")) as f:
+                meta = json.load(f)
+            coords = np.load(os.path.join(directory, "coords.npy"), mmap_mode="r")
+            counts = np.load(os.path.join(directory, "counts.npy"), mmap_mode="r")
+            heights = None
+            if "height_runs" in meta:
+                heights = HeightStatistics(meta["dimension"], meta["height_runs"],
+                                           np.load(os.path.join(directory, "height_mean.npy")),
+                                           np.load(os.path.join(directory, "height_m2.npy")))
+        except (OSError, ValueError):
+            return None
+        return SimulationResult(meta["dimension"], coords, counts, meta["params"],
+                                runs_completed=meta["runs_completed"], truncated=meta["truncated"],
+                                stop_reason=meta["stop_reason"], result_id=result_id,
+                                elapsed=meta.get("elapsed"), heights=heights)
+
+    def find(self, prefix: str) -> List[str]:
+        paths = glob.glob(os.path.join(self.root, "results", glob.escape(prefix) + "*"))
+        paths = [path for path in paths if not path.endswith(".tmp")]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        return [os.path.basename(path) for path in paths]
+
+    def set_latest(self, dimension: int, result_id: str) -> None:
+        self._write_atomic(os.path.join(self.root, f"latest_{dimension}d"), result_id.encode("utf-8"))
+
+    def latest(self, dimension: int) -> Optional[str]:
+        try:
+            with open(os.path.join(self.root, f"latest_{dimension}d")) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _artifact_dir(self, job_id: str) -> str:
+        if not job_id or "/" in job_id or job_id.startswith("."):
+            raise ValueError(f"Недопустимый идентификатор задачи: {job_id}")
+        return os.path.join(self.root, "jobs", job_id, "artifacts")
+
+    def _artifact_path(self, job_id: str, name: str) -> str:
+        if not name or "/" in name or name.startswith("."):
+            raise ValueError(f"Недопустимое имя файла: {name}")
+        return os.path.join(self._artifact_dir(job_id), name)
+
+    def put_artifact(self, job_id: str, name: str, data: bytes) -> None:
+        path = self._artifact_path(job_id, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._write_atomic(path, data)
+
+    def get_artifact(self, job_id: str, name: str) -> Optional[bytes]:
+        try:
+            with open(self._artifact_path(job_id, name), "rb") as f:
+                return f.read()
+        except (OSError, ValueError):
+            return None
+
+    def list_artifacts(self, job_id: str) -> List[str]:
+        try:
+            names = os.listdir(self._artifact_dir(job_id))
+        except (OSError, ValueError):
+            return []
+        return sorted(name for name in names if not name.endswith(".tmp"))
+
+    def put_job(self, job: Dict[str, Any]) -> None:
+        self._write_atomic(os.path.join(self.root, "jobs", f"{job['job_id']}.json"),
+                           json.dumps(job).encode("utf-8"))
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self._read_record("jobs", job_id)
+
+    def put_batch(self, batch: Dict[str, Any]) -> None:
+        self._write_atomic(os.path.join(self.root, "batches", f"{batch['batch_id']}.json"),
+                           json.dumps(batch).encode("utf-8"))
+
+    def get_batch(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        return self._read_record("batches", batch_id)
+
+    def put_request(self, request_id: str, job_id: str) -> None:
+        path = self._record_path("requests", request_id, ".json")
+        if path is not None:
+            # Недопустимый request_id остаётся известен только воркеру-владельцу
+            self._write_atomic(path, json.dumps({"request_id": request_id, "job_id": job_id}).encode("utf-8"))
+
+    def get_request(self, request_id: str) -> Optional[str]:
+        record = self._read_record("requests", request_id)
+        return record["job_id"] if record is not None else None
+
+    def request_cancel(self, job_id: str) -> None:
+        path = self._record_path("jobs", job_id, ".cancel")
+        if path is not None:
+            self._write_atomic(path, b"")
+
+    def cancel_requested(self, job_id: str) -> bool:
+        path = self._record_path("jobs", job_id, ".cancel")
+        return path is not None and os.path.exists(path)
+
+    def _record_path(self, kind: str, record_id: str, suffix: str) -> Optional[str]:
+        if not record_id or "/" in record_id or record_id.startswith("."):
+            return None
+        return os.path.join(self.root, kind, f"{record_id}{suffix}")
+
+    def _read_record(self, kind: str, record_id: str) -> Optional[Dict[str, Any]]:
+        path = self._record_path(kind, record_id, ".json")
+        if path is None:
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+
+def create_store(url: Optional[str]) -> ResultStore:
+    """
+    Создание хранилища по адресу.
+
+    Параметры:
+    -----------
+    url : str, optional
+        "memory://" -- хранилище в памяти процесса; "file:///path" или просто путь --
+        хранилище в каталоге. Пустое значение означает хранилище в памяти.
+    """
+    if not url or url == "memory://":
+        return MemoryResultStore()
+    if url.startswith("file://"):
+        url = url[len("file://"):]
+    return FileSystemResultStore(url)
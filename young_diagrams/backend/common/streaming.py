@@ -0,0 +1,198 @@
+import asyncio
+import base64
+import json
+import queue
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from common.cancellation import SimulationBudget
+
+# Признак конца порций в очереди прогресса
+STREAM_END = None
+
+# Наибольшее время одного ожидания очереди прогресса в потоке пула, с: поток
+# освобождается, даже если задача ещё ждёт процесса пула
+PROGRESS_POLL = 0.25
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """
+    Форматирование события Server-Sent Events.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+def encode_cells(cells: List[Tuple[int, ...]], dimension: int, encoding: str = "json") -> Dict[str, Any]:
+    """
+    Компактное кодирование списка ячеек массивами координат.
+
+    Параметры:
+    -----------
+    cells : List[Tuple[int, ...]]
+        Список координат ячеек.
+    dimension : int
+        Размерность диаграммы (2 или 3).
+    encoding : str, default="json"
+        "json" -- отдельные списки координат по осям,
+        "base64" -- массив int32 (little-endian) формы (N, dimension) в base64.
+
+    Возвращает:
+    --------
+    Dict[str, Any]
+        Закодированные координаты.
+    """
+    coords = np.asarray(cells, dtype="<i4").reshape(-1, dimension)
+    if encoding == "base64":
+        return {"n": len(coords), "coords": base64.b64encode(coords.tobytes()).decode("ascii")}
+    return {axis: coords[:, i].tolist() for i, axis in enumerate(("x", "y", "z")[:dimension])}
+
+
+def produce_chunks(simulator: Any, params: Dict[str, Any], budget: SimulationBudget, progress: Any,
+                   chunk_size: int = 20, timer: Optional[Any] = None) -> None:
+    """
+    Симуляция с передачей прогресса: выполняется в процессе пула вместо simulator.simulate.
+
+    После каждой порции шагов в очередь progress кладётся кортеж (запуск,
+    новые ячейки, агрегаты или None); агрегаты считаются после завершения
+    каждого запуска. Конец порций (STREAM_END) кладёт вызывающий.
+
+    Параметры:
+    -----------
+    simulator : Any
+        DiagramSimulator2D или DiagramSimulator3D.
+    params : Dict[str, Any]
+        Параметры симуляции: steps, alpha, runs, seed.
+    budget : SimulationBudget
+        Бюджет симуляции с токеном отмены.
+    progress : Any
+        Очередь прогресса (multiprocessing.Manager().Queue()).
+    chunk_size : int, default=20
+        Количество шагов между передачами ячеек.
+    timer : PhaseTimer, optional
+        Таймер фаз симуляции.
+    """
+    budget.start()
+    chunks = simulator.iter_simulate(n_steps=params["steps"], alpha=params["alpha"],
+                                     runs=params["runs"], chunk_size=chunk_size,
+                                     seed=params.get("seed"), timer=timer)
+    runs_completed = 0
+    for run, diagram, added in chunks:
+        aggregate = None
+        if simulator.runs_completed != runs_completed:
+            runs_completed = simulator.runs_completed
+            counts = simulator.total_cell_counts
+            aggregate = {
+                "runs_completed": runs_completed,
+                "distinct_cells": len(counts),
+                "max_count": max(counts.values())
+            }
+        progress.put((run, added, aggregate))
+        budget.consume(len(added))
+        if budget.exhausted():
+            chunks.close()
+            simulator.stop_early(budget.reason, params["runs"])
+            break
+
+
+_EMPTY = object()
+
+
+def _next_item(progress: Any, timeout: float) -> Any:
+    # Блокирующее чтение очереди менеджера; выполняется в пуле потоков
+    try:
+        return progress.get(timeout=timeout)
+    except queue.Empty:
+        return _EMPTY
+
+
+async def stream_simulation(job_manager: Any, job: Any, dimension: int, fps: float = 10.0,
+                            encoding: str = "json") -> AsyncIterator[str]:
+    """
+    Потоковая симуляция в виде событий Server-Sent Events.
+
+    Симуляция -- обычная задача пула процессов (JobManager.submit с
+    stream=True), поэтому на неё действуют очередь, лимит задач и контроль
+    допуска. Процесс пула передаёт новые ячейки через очередь прогресса задачи
+    (см. produce_chunks); они накапливаются и отправляются не чаще fps раз в
+    секунду одним событием "cells". В начале каждого запуска отправляется
+    событие "run", после завершения запуска -- событие "aggregate" с текущими
+    агрегатами, в конце -- "done". Если клиент отключился, задача отменяется.
+
+    Параметры:
+    -----------
+    job_manager : JobManager
+        Очередь задач, в которой выполняется симуляция.
+    job : Job
+        Задача симуляции с очередью прогресса (job.progress).
+    dimension : int
+        Размерность диаграммы.
+    fps : float, default=10.0
+        Целевая частота отправки событий.
+    encoding : str, default="json"
+        Кодирование координат, см. encode_cells.
+    """
+    loop = asyncio.get_running_loop()
+    params = job.params
+    interval = 1.0 / fps
+    pending: List[Tuple[int, ...]] = []
+    current_run = 0
+    last_sent = 0.0
+    started = time.monotonic()
+
+    def flush() -> str:
+        data = {"run": current_run, "count": len(pending)}
+        data.update(encode_cells(pending, dimension, encoding))
+        pending.clear()
+        return format_sse("cells", data)
+
+    try:
+        while True:
+            timeout = max(0.0, interval - (time.monotonic() - last_sent)) if pending else PROGRESS_POLL
+            item = await loop.run_in_executor(None, _next_item, job.progress, min(timeout, PROGRESS_POLL))
+            if item is STREAM_END or (item is _EMPTY and job.future.done() and job.progress.empty()):
+                # Конец порций; задача, отменённая до запуска, порций не присылает
+                break
+
+            if item is not _EMPTY:
+                run, added, aggregate = item
+                if run != current_run:
+                    if pending:
+                        yield flush()
+                    current_run = run
+                    # Каждый запуск начинается с ячейки в начале координат
+                    yield format_sse("run", {"run": run, "runs": params["runs"],
+                                             "initial": encode_cells([(0,) * dimension], dimension, encoding)})
+                pending.extend(added)
+
+                if aggregate is not None:
+                    yield flush()
+                    last_sent = time.monotonic()
+                    yield format_sse("aggregate", aggregate)
+                    continue
+
+            if pending and time.monotonic() - last_sent >= interval:
+                yield flush()
+                last_sent = time.monotonic()
+
+        if pending:
+            yield flush()
+        await job_manager.wait(job)
+        result = job.result
+        if result is None:
+            detail = job.error.splitlines()[0] if job.error else "Симуляция была отменена до начала выполнения"
+            yield format_sse("error", {"detail": detail})
+            return
+        yield format_sse("done", {
+            "job_id": job.id,
+            "result_id": result.result_id,
+            "runs_completed": result.runs_completed,
+            "truncated": result.truncated,
+            "stop_reason": result.stop_reason,
+            "seed": params.get("seed"),
+            "elapsed": time.monotonic() - started
+        })
+    finally:
+        # Клиент отключился: останавливаем задачу (завершённую отмена не затрагивает)
+        job_manager.cancel(job.id)
@@ -0,0 +1,171 @@
+import base64
+import math
+import os
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from common.limit_shape import ComputeCache
+from common.result import SimulationResult
+
+
+class PyramidLevel:
+    """
+    Уровень пирамиды в разреженном виде: непустые ячейки, сгруппированные по плиткам.
+
+    Ячейки отсортированы по номеру плитки (C-порядок индексов плиток), внутри
+    плитки -- по номеру ячейки; starts -- границы плиток в массивах ячеек.
+    """
+    def __init__(self, shape: Tuple[int, ...], cells: np.ndarray, counts: np.ndarray, tile_size: int):
+        self.shape = shape
+        tile_shape = tuple(-(-size // tile_size) for size in shape)
+        tile_key = np.ravel_multi_index(tuple((cells // tile_size).T), tile_shape)
+        cell_key = np.ravel_multi_index(tuple(cells.T), shape)
+        order = np.lexsort((cell_key, tile_key))
+        self.cells = cells[order]
+        self.counts = counts[order]
+        keys, starts = np.unique(tile_key[order], return_index=True)
+        self.tile_index = np.stack(np.unravel_index(keys, tile_shape), axis=1).reshape(-1, len(shape))
+        self.starts = np.r_[starts, len(self.cells)].astype(np.int64)
+
+    @property
+    def nbytes(self) -> int:
+        return self.cells.nbytes + self.counts.nbytes + self.tile_index.nbytes + self.starts.nbytes
+
+
+def coarsen(shape: Tuple[int, ...], cells: np.ndarray,
+            counts: np.ndarray) -> Tuple[Tuple[int, ...], np.ndarray, np.ndarray]:
+    """
+    Суммирование блоков 2 x 2 (x 2) -- следующий уровень пирамиды, по непустым ячейкам.
+    """
+    shape = tuple(-(-size // 2) for size in shape)
+    keys = np.ravel_multi_index(tuple((cells >> 1).T), shape)
+    keys, inverse = np.unique(keys, return_inverse=True)
+    summed = np.bincount(inverse.ravel(), weights=counts, minlength=len(keys))
+    cells = np.stack(np.unravel_index(keys, shape), axis=1).reshape(-1, len(shape))
+    return shape, cells, summed.astype(np.uint32)
+
+
+class CountPyramid:
+    """
+    Многоуровневая пирамида количеств для 2D и 3D результатов.
+
+    Уровень 0 -- количества ячеек результата, уровень k получается суммированием
+    блоков 2^k по каждой оси. Каждый уровень нарезан на плитки tile_size^2 (2D)
+    или кубические блоки tile_size^3 (3D, аналог узлов октодерева), поэтому ответ
+    на запрос области просмотра ограничен разрешением экрана, а не размером диаграммы.
+
+    Уровни хранятся разреженно (только непустые ячейки, см. PyramidLevel), и
+    плотный массив создаётся только для запрошенной плитки: память -- O(N) на
+    уровень, а не объём ограничивающего параллелепипеда, который у вытянутых
+    3D диаграмм в тысячи раз больше числа ячеек.
+    """
+    def __init__(self, result: SimulationResult, tile_size: Optional[int] = None):
+        """
+        Параметры:
+        -----------
+        result : SimulationResult
+            Результат симуляции.
+        tile_size : int, optional
+            Сторона плитки в ячейках уровня. По умолчанию 256 для 2D и 32 для 3D.
+        """
+        self.dimension = result.dimension
+        self.tile_size = tile_size or (256 if result.dimension == 2 else 32)
+        cells = np.asarray(result.coords, dtype=np.int64).reshape(-1, self.dimension)
+        counts = np.asarray(result.counts, dtype=np.uint32)
+        shape = tuple(int(v) + 1 for v in cells.max(axis=0)) if len(cells) else (1,) * self.dimension
+        self.levels: List[PyramidLevel] = [PyramidLevel(shape, cells, counts, self.tile_size)]
+        # Уровни строятся до одной ячейки: их число -- логарифм наибольшего размера
+        while max(shape) > 1:
+            shape, cells, counts = coarsen(shape, cells, counts)
+            self.levels.append(PyramidLevel(shape, cells, counts, self.tile_size))
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Объём памяти, занимаемый уровнями.
+        """
+        return sum(level.nbytes for level in self.levels)
+
+    def choose_level(self, lo: Sequence[int], hi: Sequence[int], resolution: int) -> int:
+        """
+        Самый детальный уровень, на котором область [lo, hi) укладывается в resolution ячеек по каждой оси.
+        """
+        extent = max(max(h - l, 1) for l, h in zip(lo, hi))
+        level = max(0, math.ceil(math.log2(extent / resolution))) if extent > resolution else 0
+        return min(level, len(self.levels) - 1)
+
+    def tiles(self, level: int, lo: Sequence[int], hi: Sequence[int]) -> List[Tuple[Tuple[int, ...], np.ndarray]]:
+        """
+        Непустые плитки уровня, пересекающие область [lo, hi) в координатах уровня 0.
+
+        Плотный массив строится только для каждой возвращаемой плитки.
+
+        Возвращает:
+        --------
+        List[Tuple[Tuple[int, ...], np.ndarray]]
+            Индексы плитки по осям и её содержимое (плитки на краю могут быть меньше tile_size).
+        """
+        grid = self.levels[level]
+        scale = 2 ** level
+        selected = np.ones(len(grid.tile_index), dtype=bool)
+        for axis in range(self.dimension):
+            first = max(0, lo[axis] // scale) // self.tile_size
+            last = min(grid.shape[axis], -(-hi[axis] // scale))
+            last = -(-last // self.tile_size)
+            selected &= (grid.tile_index[:, axis] >= first) & (grid.tile_index[:, axis] < last)
+
+        tiles = []
+        for number in np.flatnonzero(selected):
+            index = tuple(int(i) for i in grid.tile_index[number])
+            origin = np.array(index, dtype=np.int64) * self.tile_size
+            tile = np.zeros(tuple(min(self.tile_size, size - o) for size, o in zip(grid.shape, origin)),
+                            dtype=np.uint32)
+            start, stop = grid.starts[number], grid.starts[number + 1]
+            tile[tuple((grid.cells[start:stop] - origin).T)] = grid.counts[start:stop]
+            tiles.append((index, tile))
+        return tiles
+
+    def info(self) -> Dict[str, Any]:
+        """
+        Описание уровней пирамиды.
+        """
+        return {
+            "dimension": self.dimension,
+            "tile_size": self.tile_size,
+            "levels": [{"level": level, "scale": 2 ** level, "shape": list(grid.shape)}
+                       for level, grid in enumerate(self.levels)]
+        }
+
+
+def encode_tiles(pyramid: CountPyramid, level: int,
+                 tiles: List[Tuple[Tuple[int, ...], np.ndarray]]) -> Dict[str, Any]:
+    """
+    JSON-представление плиток: содержимое -- массив uint32 (little-endian, C-порядок) в base64.
+    """
+    axes = ("x", "y", "z")[:pyramid.dimension]
+    return {
+        "level": level,
+        "scale": 2 ** level,
+        "tile_size": pyramid.tile_size,
+        "tiles": [
+            dict(zip(("t" + axis for axis in axes), index),
+                 shape=list(tile.shape),
+                 max=int(tile.max()),
+                 counts=base64.b64encode(np.ascontiguousarray(tile, dtype="<u4").tobytes()).decode("ascii"))
+            for index, tile in tiles
+        ]
+    }
+
+
+# Пирамиды по идентификатору результата: размер ограничен суммарным объёмом уровней,
+# одновременные запросы одного результата ждут единственного построения
+pyramid_cache = ComputeCache(
+    max_entries=64, max_bytes=int(os.environ.get("YOUNG_PYRAMID_CACHE_BYTES", str(128 * 1024 * 1024))))
+
+
+def get_pyramid(result: SimulationResult) -> CountPyramid:
+    """
+    Пирамида для результата; строится один раз на result_id вне общих блокировок.
+    """
+    return pyramid_cache.get_or_compute(("pyramid", result.result_id), lambda: CountPyramid(result))
@@ -1,7 +1,6 @@
-import matplotlib.pyplot as plt
+import itertools
 import numpy as np
-from scipy.interpolate import griddata
-from typing import Dict, Tuple, List, Any, Set, Union, Optional
+from typing import Dict, Iterator, Tuple, List, Any, Set, Union, Optional
 
 
 def save_cells_to_file(cell_counts: Dict[Tuple, int], filename: str) -> None:
@@ -26,27 +25,269 @@ def save_cells_to_file(cell_counts: Dict[Tuple, int], filename: str) -> None:
                 f.write(f'{x},{y},{z},{count}\n')
 
 
-def compute_limit_shape(cell_counts: Dict[Tuple, int], 
+def load_cells_from_file(filename: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Чтение файла, записанного save_cells_to_file, в массивы.
+
+    Параметры:
+    -----------
+    filename : str
+        Имя файла со строками "x,y,count" или "x,y,z,count".
+
+    Возвращает:
+    --------
+    Tuple[np.ndarray, np.ndarray]
+        Координаты ячеек int32 формы (N, dimension) и количества uint32.
+    """
+    data = np.loadtxt(filename, delimiter=",", dtype=np.int64, ndmin=2)
+    return data[:, :-1].astype(np.int32), data[:, -1].astype(np.uint32)
+
+
+def iter_cells_from_file(filename: str, chunk_size: int = 1 << 20) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Чтение файла, записанного save_cells_to_file, порциями по chunk_size строк.
+
+    Параметры:
+    -----------
+    filename : str
+        Имя файла со строками "x,y,count" или "x,y,z,count".
+    chunk_size : int, default=1 << 20
+        Число строк в порции.
+
+    Yields:
+    -------
+    Tuple[np.ndarray, np.ndarray]
+        Координаты ячеек int32 формы (k, dimension) и количества uint32 в порядке строк файла.
+    """
+    with open(filename) as f:
+        while True:
+            lines = list(itertools.islice(f, chunk_size))
+            if not lines:
+                return
+            data = np.loadtxt(lines, delimiter=",", dtype=np.int64, ndmin=2)
+            yield data[:, :-1].astype(np.int32), data[:, -1].astype(np.uint32)
+
+
+# Число узлов сетки предельной формы по каждой оси по умолчанию
+DEFAULT_LIMIT_SHAPE_RESOLUTION = {2: 100, 3: 50}
+
+
+def _linear_axis(extent: int, resolution: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Узлы сетки вдоль оси решётки длины extent для интерполяции.
+
+    Возвращает координаты узлов в единицах решётки, индексы соседних ячеек i0, i1 и вес ячейки i1.
+    """
+    nodes = np.linspace(0, extent - 1, resolution)
+    lower = np.minimum(np.floor(nodes).astype(np.int64), extent - 1)
+    upper = np.minimum(lower + 1, extent - 1)
+    return nodes, lower, upper, nodes - lower
+
+
+def _block_axis(extent: int, resolution: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Разбиение оси решётки длины extent на resolution блоков почти равного размера.
+
+    Возвращает центры блоков в единицах решётки, начала и концы блоков. Если
+    extent < resolution, соседние блоки состоят из одной и той же ячейки.
+    """
+    edges = np.linspace(0, extent, resolution + 1)
+    starts = np.minimum(np.floor(edges[:-1]).astype(np.int64), extent - 1)
+    stops = np.maximum(np.ceil(edges[1:]).astype(np.int64), starts + 1)
+    return (starts + stops - 1) / 2, starts, stops
+
+
+def _axis_weights(extent: int, resolution: int,
+                  method: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Веса ячеек оси решётки длины extent в узлах сетки.
+
+    Возвращает координаты узлов, номера узлов и веса, упорядоченные по ячейке,
+    и указатели: веса ячейки c занимают позиции pointer[c]:pointer[c + 1].
+    """
+    if method == "linear":
+        # (1 - w) * v[i0] + w * v[i1] вдоль оси
+        nodes, lower, upper, weight = _linear_axis(extent, resolution)
+        index = np.arange(resolution)
+        rows, cells, weights = np.r_[index, index], np.r_[lower, upper], np.r_[1 - weight, weight]
+    else:
+        # Среднее по блоку ячеек starts..stops - 1
+        nodes, starts, stops = _block_axis(extent, resolution)
+        lengths = stops - starts
+        rows = np.repeat(np.arange(resolution), lengths)
+        cells = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        weights = np.repeat(1 / lengths, lengths)
+    keep = weights != 0
+    order = np.argsort(cells[keep], kind="stable")
+    pointer = np.r_[0, np.cumsum(np.bincount(cells[keep], minlength=extent))]
+    return nodes, rows[keep][order], pointer, weights[keep][order]
+
+
+def lattice_limit_shape(coords: np.ndarray, counts: np.ndarray, dimensions: int,
+                        scaling_factor: Optional[float] = None, resolution: Optional[int] = None,
+                        method: str = "auto") -> Tuple[List[np.ndarray], np.ndarray]:
+    """
+    Предельная форма по ячейкам решётки без интерполяции рассеянных данных.
+
+    Частоты ячеек (количество, делённое на максимальное) рассматриваются как
+    значения на решётке, отсутствующие ячейки имеют частоту 0. Значения в
+    узлах регулярной сетки получаются полилинейной интерполяцией по решётке
+    (method="linear") или усреднением по блокам ячеек (method="block").
+    Вычисление идёт по переданным ячейкам, память -- O(N + resolution^dimensions),
+    а не объём ограничивающего параллелепипеда.
+    Оси масштабируются аналитически делением на scaling_factor.
+
+    Параметры:
+    -----------
+    coords : np.ndarray
+        Целочисленные координаты ячеек формы (N, dimensions).
+    counts : np.ndarray
+        Количество появлений каждой ячейки.
+    dimensions : int
+        Количество измерений (2 или 3).
+    scaling_factor : float, optional
+        Коэффициент масштабирования. Если None, используется sqrt(n) для 2D или cbrt(n) для 3D,
+        где n -- наибольшая сумма координат ячейки.
+    resolution : int, optional
+        Число узлов сетки по каждой оси. По умолчанию 100 для 2D и 50 для 3D.
+    method : str, default="auto"
+        "linear", "block" или "auto" -- усреднение по блокам, если решётка
+        по какой-либо оси длиннее сетки (интерполяция при прореживании
+        теряла бы ячейки между узлами), иначе интерполяция.
+
+    Возвращает:
+    --------
+    Tuple[List[np.ndarray], np.ndarray]
+        Координаты узлов по каждой оси (в масштабированных единицах) и значения
+        формы (resolution,) * dimensions.
+    """
+    coords = np.asarray(coords).reshape(-1, dimensions)
+    counts = np.asarray(counts)
+    if not len(counts):
+        raise ValueError("Нет данных для вычисления предельной формы")
+    resolution = resolution or DEFAULT_LIMIT_SHAPE_RESOLUTION[dimensions]
+    if scaling_factor is None:
+        n = max(int(coords.sum(axis=1).max()), 1)
+        scaling_factor = np.sqrt(n) if dimensions == 2 else np.cbrt(n)
+
+    shape = tuple(int(v) + 1 for v in coords.max(axis=0))
+    if method == "auto":
+        method = "block" if max(shape) > resolution else "linear"
+    if method not in ("linear", "block"):
+        raise ValueError(f"Неизвестный метод: {method}")
+
+    # Обе операции -- линейные и разделимые: значение узла есть взвешенная сумма
+    # ячеек, поэтому оси обрабатываются по очереди прямо над разреженными ячейками.
+    # После каждой оси совпадающие точки суммируются, так что промежуточных точек
+    # не больше, чем ячеек, умноженных на число узлов, в которые попадает ячейка,
+    # и плотный массив решётки (объём ограничивающего параллелепипеда) не строится.
+    points = coords.astype(np.int64)
+    values = counts / counts.max()
+    grid_shape = list(shape)
+    axes = []
+    for axis, extent in enumerate(shape):
+        nodes, rows, pointer, weights = _axis_weights(extent, resolution, method)
+        cell = points[:, axis]
+        repeats = pointer[cell + 1] - pointer[cell]
+        # Позиции весов каждой ячейки в массивах rows/weights
+        position = np.repeat(pointer[cell] - np.cumsum(repeats) + repeats, repeats) + np.arange(repeats.sum())
+        points = np.repeat(points, repeats, axis=0)
+        points[:, axis] = rows[position]
+        values = np.repeat(values, repeats) * weights[position]
+        grid_shape[axis] = resolution
+        keys, inverse = np.unique(np.ravel_multi_index(tuple(points.T), grid_shape), return_inverse=True)
+        values = np.bincount(inverse.ravel(), weights=values, minlength=len(keys))
+        points = np.stack(np.unravel_index(keys, grid_shape), axis=1).reshape(-1, dimensions)
+        axes.append(nodes / scaling_factor)
+
+    grid = np.zeros((resolution,) * dimensions, dtype=np.float64)
+    grid[tuple(points.T)] = values
+    return axes, grid
+
+
+def lattice_limit_shape_points(coords: np.ndarray, dimensions: int, resolution: Optional[int] = None,
+                               method: str = "auto") -> int:
+    """
+    Оценка сверху числа точек, одновременно хранимых lattice_limit_shape.
+
+    После обработки оси k точек не больше, чем ячеек, умноженных на наибольшее
+    число узлов, в которые попадает одна ячейка по осям 0..k, и не больше
+    resolution^(k + 1), умноженного на размеры остальных осей; результат --
+    resolution^dimensions узлов. Позволяет отказать в запросе до вычисления.
+    """
+    coords = np.asarray(coords).reshape(-1, dimensions)
+    if not len(coords):
+        return 0
+    resolution = resolution or DEFAULT_LIMIT_SHAPE_RESOLUTION[dimensions]
+    shape = [int(v) + 1 for v in coords.max(axis=0)]
+    if method == "auto":
+        method = "block" if max(shape) > resolution else "linear"
+    points = len(coords)
+    peak = max(points, resolution ** dimensions)
+    for axis, extent in enumerate(shape):
+        pointer = _axis_weights(extent, resolution, method)[2]
+        points *= int(np.diff(pointer).max())
+        peak = max(peak, points)
+        points = min(points, resolution ** (axis + 1) * int(np.prod(shape[axis + 1:])))
+    return peak
+
+
+def compute_limit_shape(cell_counts: Union[Dict[Tuple, int], Any], 
                         scaling_factor: Optional[float] = None,
-                        dimensions: int = 2) -> Tuple:
+                        dimensions: int = 2,
+                        resolution: Optional[int] = None,
+                        method: str = "auto") -> Tuple:
     """
     Вычисление предельной формы на основе накопленных данных.
     
     Параметры:
     -----------
-    cell_counts : Dict[Tuple, int]
-        Словарь с координатами ячеек в качестве ключей и количеством в качестве значений.
+    cell_counts : Dict[Tuple, int] или SimulationResult
+        Словарь с координатами ячеек в качестве ключей и количеством в качестве
+        значений или результат, массивы которого используются без построения словаря.
     scaling_factor : float, optional
         Коэффициент масштабирования. Если None, используется sqrt(n) для 2D или cbrt(n) для 3D.
     dimensions : int
         Количество измерений (2 или 3).
+    resolution : int, optional
+        Число узлов сетки по каждой оси. По умолчанию 100 для 2D и 50 для 3D.
+    method : str, default="auto"
+        Способ вычисления значений в узлах: "linear", "block", "auto" (см.
+        lattice_limit_shape) или "griddata" -- прежняя интерполяция рассеянных
+        данных scipy (кубическая в 2D, линейная в 3D), очень медленная в 3D.
         
     Возвращает:
     --------
     Кортеж координат сетки и интерполированных значений.
     """
-    if not cell_counts:
-        raise ValueError("Нет данных для вычисления предельной формы")
+    if hasattr(cell_counts, "coords"):
+        # SimulationResult
+        if not cell_counts.size:
+            raise ValueError("Нет данных для вычисления предельной формы")
+        if method == "griddata":
+            return _griddata_limit_shape(cell_counts.to_counts(), scaling_factor, dimensions, resolution)
+        coords = np.asarray(cell_counts.coords, dtype=np.int64)
+        counts = np.asarray(cell_counts.counts, dtype=np.float64)
+    else:
+        if not cell_counts:
+            raise ValueError("Нет данных для вычисления предельной формы")
+        if method == "griddata":
+            return _griddata_limit_shape(cell_counts, scaling_factor, dimensions, resolution)
+        coords = np.array(list(cell_counts.keys()), dtype=np.int64).reshape(-1, dimensions)
+        counts = np.fromiter(cell_counts.values(), dtype=np.float64, count=len(cell_counts))
+    axes, values = lattice_limit_shape(coords, counts, dimensions, scaling_factor, resolution, method)
+    return (*np.meshgrid(*axes, indexing="ij"), values)
+
+
+def _griddata_limit_shape(cell_counts: Dict[Tuple, int], scaling_factor: Optional[float],
+                          dimensions: int, resolution: Optional[int]) -> Tuple:
+    """
+    Предельная форма интерполяцией рассеянных данных (scipy.interpolate.griddata).
+    """
+    # scipy импортируется только при вычислении предельной формы
+    from scipy.interpolate import griddata
+    
+    resolution = complex(0, resolution or DEFAULT_LIMIT_SHAPE_RESOLUTION[dimensions])
     
     # Определение коэффициента масштабирования
     if scaling_factor is None:
@@ -73,7 +314,7 @@ def compute_limit_shape(cell_counts: Dict[Tuple, int],
         # Создание регулярной сетки для интерполяции
         x_max = max(p[0] for p in scaled_points)
         y_max = max(p[1] for p in scaled_points)
-        grid_x, grid_y = np.mgrid[0:x_max:100j, 0:y_max:100j]
+        grid_x, grid_y = np.mgrid[0:x_max:resolution, 0:y_max:resolution]
         
         # Интерполяция данных
         grid_z = griddata(scaled_points, frequencies, (grid_x, grid_y), method='cubic')
@@ -85,7 +326,7 @@ def compute_limit_shape(cell_counts: Dict[Tuple, int],
         x_max = max(p[0] for p in scaled_points)
         y_max = max(p[1] for p in scaled_points)
         z_max = max(p[2] for p in scaled_points)
-        grid_x, grid_y, grid_z = np.mgrid[0:x_max:50j, 0:y_max:50j, 0:z_max:50j]
+        grid_x, grid_y, grid_z = np.mgrid[0:x_max:resolution, 0:y_max:resolution, 0:z_max:resolution]
         
         # Интерполяция данных
         grid_v = griddata(scaled_points, frequencies, (grid_x, grid_y, grid_z), method='linear', fill_value=0)
@@ -0,0 +1,158 @@
+import threading
+import weakref
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from common.result import SimulationResult
+
+
+class VoxelIndex:
+    """
+    Индекс 3D результата для выборок за время, пропорциональное размеру ответа.
+
+    Координаты результата отсортированы по (x, y, z), поэтому ячейки одного
+    столбца (x, y) и одной плоскости x = const идут подряд; для них хранятся
+    только границы диапазонов. Для плоскостей z = const хранится перестановка,
+    сортирующая ячейки по (z, x, y), для порогов по количеству -- перестановка
+    по убыванию количества.
+    """
+    def __init__(self, result: SimulationResult):
+        """
+        Параметры:
+        -----------
+        result : SimulationResult
+            3D результат симуляции.
+        """
+        if result.dimension != 3:
+            raise ValueError("Индекс строится только для 3D результатов")
+        self.result = result
+        coords = np.asarray(result.coords)
+        self.counts = np.asarray(result.counts)
+        n = len(self.counts)
+        self.shape = tuple(int(v) + 1 for v in coords.max(axis=0)) if n else (0, 0, 0)
+        x, y, z = (coords[:, axis] for axis in range(3))
+
+        # Столбцы (x, y): начало и длина диапазона в исходном порядке
+        self.column_start = np.zeros(self.shape[:2], dtype=np.int64)
+        self.heights = np.zeros(self.shape[:2], dtype=np.uint32)
+        if n:
+            column = x.astype(np.int64) * self.shape[1] + y
+            starts = np.flatnonzero(np.r_[True, column[1:] != column[:-1]])
+            lengths = np.diff(np.r_[starts, n])
+            self.column_start.flat[column[starts]] = starts
+            self.heights.flat[column[starts]] = lengths
+
+        # Плоскости x = const: границы диапазонов в исходном порядке
+        self.x_bounds = np.searchsorted(x, np.arange(self.shape[0] + 1)) if n else np.zeros(1, dtype=np.int64)
+
+        # Плоскости z = const: перестановка по (z, x, y) и границы диапазонов
+        self.z_order = np.lexsort((y, x, z)).astype(np.int64) if n else np.zeros(0, dtype=np.int64)
+        self.z_bounds = (np.searchsorted(z[self.z_order], np.arange(self.shape[2] + 1))
+                         if n else np.zeros(1, dtype=np.int64))
+
+        # Убывание количества для пороговых запросов; количества в этом порядке -- для бинарного поиска
+        self.count_order = np.argsort(-self.counts.astype(np.int64), kind="stable")
+        self._sorted_counts = self.counts[self.count_order]
+
+    @property
+    def size(self) -> int:
+        """
+        Количество ячеек.
+        """
+        return len(self.counts)
+
+    def _subset(self, index: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return np.asarray(self.result.coords)[index], self.counts[index]
+
+    def slice(self, axis: str, value: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Ячейки плоскости axis = value.
+
+        Параметры:
+        -----------
+        axis : str
+            Ось: "x", "y" или "z".
+        value : int
+            Координата плоскости.
+
+        Возвращает:
+        --------
+        Tuple[np.ndarray, np.ndarray]
+            Координаты формы (k, 3) и количества ячеек плоскости.
+        """
+        if axis == "x":
+            if not 0 <= value < self.shape[0]:
+                return self._subset(np.zeros(0, dtype=np.int64))
+            return self._subset(np.arange(self.x_bounds[value], self.x_bounds[value + 1]))
+        if axis == "z":
+            if not 0 <= value < self.shape[2]:
+                return self._subset(np.zeros(0, dtype=np.int64))
+            return self._subset(self.z_order[self.z_bounds[value]:self.z_bounds[value + 1]])
+        if axis == "y":
+            if not 0 <= value < self.shape[1]:
+                return self._subset(np.zeros(0, dtype=np.int64))
+            # Столбцы (x, value) для всех x: по одному диапазону на x
+            starts = self.column_start[:, value]
+            lengths = self.heights[:, value].astype(np.int64)
+            present = lengths > 0
+            starts, lengths = starts[present], lengths[present]
+            if not len(starts):
+                return self._subset(np.zeros(0, dtype=np.int64))
+            offsets = np.repeat(starts - np.r_[0, np.cumsum(lengths)[:-1]], lengths)
+            return self._subset(np.arange(lengths.sum()) + offsets)
+        raise ValueError(f"Неизвестная ось: {axis}")
+
+    def column(self, x: int, y: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Профиль столбца (x, y): координаты z и количества ячеек столбца.
+        """
+        if not (0 <= x < self.shape[0] and 0 <= y < self.shape[1]):
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.uint32)
+        start = int(self.column_start[x, y])
+        stop = start + int(self.heights[x, y])
+        return np.asarray(self.result.coords)[start:stop, 2], self.counts[start:stop]
+
+    def threshold(self, min_count: int, limit: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Ячейки с количеством не меньше min_count в порядке убывания количества.
+
+        Параметры:
+        -----------
+        min_count : int
+            Порог количества.
+        limit : int, optional
+            Наибольшее число ячеек в ответе.
+        """
+        # _sorted_counts не возрастает; число элементов >= min_count ищем по -counts
+        stop = int(np.searchsorted(-self._sorted_counts.astype(np.int64), -min_count, side="right"))
+        if limit is not None:
+            stop = min(stop, limit)
+        return self._subset(self.count_order[:stop])
+
+    def info(self) -> Dict[str, Any]:
+        """
+        Размеры индекса.
+        """
+        return {
+            "shape": list(self.shape),
+            "cells": self.size,
+            "max_height": int(self.heights.max()) if self.heights.size else 0,
+            "max_count": self.result.max_count,
+        }
+
+
+_indexes: "weakref.WeakKeyDictionary[SimulationResult, VoxelIndex]" = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def get_index(result: SimulationResult) -> VoxelIndex:
+    """
+    Индекс для результата; строится один раз и живёт, пока жив сам результат.
+    """
+    with _indexes_lock:
+        index = _indexes.get(result)
+        if index is None:
+            index = VoxelIndex(result)
+            _indexes[result] = index
+        return index
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Преобразование текстовых файлов ячеек (*_cells.txt) в бинарный формат результата.
+
+Текстовый файл не содержит параметров симуляции, поэтому они восстанавливаются
+по количествам и имени файла (см. infer_text_params); любой параметр можно
+задать явно.
+
+    python convert_results.py                      # results_2d/ и results_3d/
+    python convert_results.py results_3d/young_diagram_3d_alpha_1.0_cells.txt --seed 7
+    python convert_results.py results_2d --layout sparse --info
+    python convert_results.py results_2d/young_diagram_2d_alpha_1.0_cells.ydr --info
+
+Переданные явно бинарные файлы (*.ydr) не преобразуются: с --info выводится
+их описание.
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from common.result import SimulationResult
+from common.result_file import (LAYOUTS, RESULT_FILE_SUFFIX, infer_text_params, open_result_file,
+                                write_result_file)
+from common.utils import load_cells_from_file
+
+DEFAULT_INPUTS = ("results_2d", "results_3d")
+CELLS_SUFFIX = "_cells.txt"
+
+
+def find_cells_files(inputs: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    Текстовые файлы ячеек (*_cells.txt из путей-файлов и путей-каталогов) и
+    переданные явно бинарные файлы результата; остальные пути пропускаются с сообщением.
+    """
+    paths, result_paths = [], []
+    for path in inputs:
+        if os.path.isdir(path):
+            paths += sorted(glob.glob(os.path.join(path, f"*{CELLS_SUFFIX}")))
+        elif not os.path.exists(path):
+            print(f"Пропуск: {path} не найден", file=sys.stderr)
+        elif path.endswith(CELLS_SUFFIX):
+            paths.append(path)
+        elif path.endswith(RESULT_FILE_SUFFIX):
+            result_paths.append(path)
+        else:
+            print(f"Пропуск: {path} -- не текстовый файл ячеек (*{CELLS_SUFFIX})", file=sys.stderr)
+    return paths, result_paths
+
+
+def output_path(path: str) -> str:
+    """
+    Имя бинарного файла рядом с текстовым: *_cells.txt -> *_cells.ydr.
+    """
+    return os.path.splitext(path)[0] + RESULT_FILE_SUFFIX
+
+
+def convert_file(path: str, layout: str, overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Преобразование одного текстового файла; возвращает сводку для вывода.
+    """
+    started = time.perf_counter()
+    coords, counts = load_cells_from_file(path)
+    dimension = coords.shape[1]
+    params = infer_text_params(path, int(counts.max()) if len(counts) else 0, int(counts.sum(dtype=np.int64)))
+    params.update({name: value for name, value in overrides.items() if value is not None})
+    order = np.lexsort(coords.T[::-1])
+    result = SimulationResult(dimension, coords[order], counts[order], params, runs_completed=params["runs"])
+
+    target = output_path(path)
+    header = write_result_file(result, target, layout=layout,
+                               extra={"source": {"path": os.path.basename(path), "format": "cells-text"}})
+    return {
+        "source": path,
+        "target": target,
+        "layout": header["layout"],
+        "cells": result.size,
+        "text_bytes": os.path.getsize(path),
+        "binary_bytes": os.path.getsize(target),
+        "seconds": time.perf_counter() - started,
+        "params": params,
+    }
+
+
+def describe(path: str) -> None:
+    """
+    Краткое описание бинарного файла результата и время его открытия.
+    """
+    started = time.perf_counter()
+    result_file = open_result_file(path)
+    opened = time.perf_counter() - started
+    header = result_file.header
+    arrays = ", ".join(f"{spec['name']} {spec['dtype']} {tuple(spec['shape'])}" for spec in header["arrays"])
+    print(f"  {path}: {header['dimension']}D, {header['layout']}, {header['cells']} ячеек, "
+          f"открыт за {opened * 1000:.2f} мс; массивы: {arrays}")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Основная функция преобразования файлов результатов.
+    """
+    parser = argparse.ArgumentParser(description="Преобразование *_cells.txt в бинарный формат результата")
+    parser.add_argument("inputs", nargs="*", default=list(DEFAULT_INPUTS),
+                        help="Файлы или каталоги (по умолчанию: results_2d results_3d)")
+    parser.add_argument("--layout", choices=("auto",) + LAYOUTS, default="auto",
+                        help="Раскладка массивов: auto (наименьший файл), sparse, columns или dense")
+    parser.add_argument("--steps", type=int, default=None, help="Число шагов (по умолчанию: по сумме количеств)")
+    parser.add_argument("--runs", type=int, default=None,
+                        help="Число запусков (по умолчанию: наибольшее количество)")
+    parser.add_argument("--alpha", type=float, default=None, help="Параметр alpha (по умолчанию: из имени файла)")
+    parser.add_argument("--seed", type=int, default=None, help="Зерно генератора, если известно")
+    parser.add_argument("--engine", type=str, default=None, help="Версия движка, если известна")
+    parser.add_argument("--info", action="store_true", help="Показать заголовок записанного файла (и переданных файлов .ydr)")
+    args = parser.parse_args(argv)
+
+    overrides = {"steps": args.steps, "runs": args.runs, "alpha": args.alpha, "seed": args.seed,
+                 "engine": args.engine}
+    paths, result_paths = find_cells_files(args.inputs)
+    status = 0
+    for path in result_paths:
+        if args.info:
+            try:
+                describe(path)
+            except (OSError, ValueError) as e:
+                print(f"Ошибка: {path} не прочитан как файл результата: {e}", file=sys.stderr)
+                status = 1
+        else:
+            print(f"Пропуск: {path} уже в бинарном формате (описание -- с --info)", file=sys.stderr)
+    if not paths:
+        if result_paths and args.info:
+            return status
+        print("Нет файлов для преобразования", file=sys.stderr)
+        return 1
+
+    for path in paths:
+        try:
+            summary = convert_file(path, args.layout, overrides)
+        except ValueError as e:
+            # В том числе UnicodeDecodeError: файл с нужным именем, но не текстовый
+            print(f"Ошибка: {path} не прочитан как файл ячеек: {e}", file=sys.stderr)
+            status = 1
+            continue
+        ratio = summary["text_bytes"] / max(summary["binary_bytes"], 1)
+        print(f"{summary['source']} -> {summary['target']}: {summary['cells']} ячеек, "
+              f"{summary['layout']}, {summary['text_bytes']} -> {summary['binary_bytes']} байт "
+              f"(в {ratio:.1f} раза меньше), {summary['seconds']:.3f} с")
+        if args.info:
+            describe(summary["target"])
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
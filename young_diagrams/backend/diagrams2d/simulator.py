@@ -1,14 +1,22 @@
-import matplotlib.pyplot as plt
 import numpy as np
 from collections import defaultdict
-from typing import Dict, Tuple, List, Set, Optional, Union, Any
+from typing import Dict, Tuple, List, Set, Optional, Union, Any, Iterator
 import os
 import sys
+import random
+# matplotlib is imported inside the plotting methods: simulation-only users
+# (the API workers and the CLIs without plots) do not pay for it at startup
 
 # Add parent directory to path to allow imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from common.utils import save_cells_to_file, compute_limit_shape
+from common.cancellation import SimulationBudget
+from common.result import SimulationResult, ENGINE_VERSION
+from common.result_file import write_result_file
+from common.raster import count_grid
+from common.metrics import PhaseTimer
+from common.heights import HeightStatistics, diagram_heights
 from diagrams2d.young_diagram import Diagram2D
 
 
@@ -21,12 +29,53 @@ class DiagramSimulator2D:
         Initialize the simulator with empty cell counts.
         """
         self.total_cell_counts = defaultdict(int)  # Dictionary for counting occurrences of each cell
+        self.runs_completed = 0  # Number of runs grown to the full number of steps
+        self.truncated = False  # Whether the last simulation was stopped early
+        self.stop_reason = None  # Why the last simulation was stopped early
+        self._current_diagram = None  # Diagram of the run in progress, if any
+        self.params = {}  # Parameters of the last simulation
+        self._timer = None  # Phase timer of the simulation in progress, if any
+        self.height_stats = HeightStatistics(2)  # Running mean and variance of the height function
         
-    def simulate(self, n_steps: int = 1000, alpha: float = 1.0, runs: int = 10, 
-                 initial_cells: Optional[Set[Tuple[int, int]]] = None,
-                 callback: Optional[callable] = None) -> None:
+    @property
+    def total_cell_counts(self) -> Dict:
         """
-        Conduct simulation of diagram growth for the specified number of runs.
+        Accumulated cell counts.
+        
+        After ``load_result`` the dictionary is built from the result arrays only
+        on first access; the raster, slice and limit-shape plots read the arrays
+        directly and never build it.
+        """
+        if self._loaded is not None:
+            self._counts = defaultdict(int, self._loaded.to_counts())
+            self._loaded = None
+        return self._counts
+    
+    @total_cell_counts.setter
+    def total_cell_counts(self, counts: Dict) -> None:
+        self._counts = counts
+        self._loaded = None
+    
+    def _has_data(self) -> bool:
+        """
+        Whether there are accumulated counts, without building the dictionary of a loaded result.
+        """
+        if self._loaded is not None:
+            return self._loaded.size > 0
+        return bool(self._counts)
+        
+    def iter_simulate(self, n_steps: int = 1000, alpha: float = 1.0, runs: int = 10,
+                      initial_cells: Optional[Set[Tuple[int, int]]] = None,
+                      chunk_size: int = 100,
+                      seed: Optional[int] = None,
+                      timer: Optional[PhaseTimer] = None) -> Iterator[Tuple[int, Diagram2D, List[Tuple[int, int]]]]:
+        """
+        Resumable chunked simulation of diagram growth.
+        
+        Grows the diagrams run by run in chunks of ``chunk_size`` steps and yields
+        after every chunk, so the caller can pause, inspect progress or stop between
+        chunks. Completed runs are accumulated into ``total_cell_counts`` and their
+        height functions into ``height_stats``.
         
         Parameters:
         -----------
@@ -38,36 +87,142 @@ class DiagramSimulator2D:
             Number of simulations to run.
         initial_cells : Set[Tuple[int, int]], optional
             Initial set of cells for the simulation.
-        callback : callable, optional
-            Function to call after each step with the current state.
+        chunk_size : int, default=100
+            Number of growth steps between yields.
+        seed : int, optional
+            Seed of the random generator shared by all runs; makes the result reproducible.
+        timer : PhaseTimer, optional
+            Accumulates time spent in the growth phases and in accumulation of runs.
+            
+        Yields:
+        -------
+        Tuple[int, Diagram2D, List[Tuple[int, int]]]
+            Current run number, the diagram being grown and the cells added in the chunk.
         """
         # Reset counters for new simulation
         self.total_cell_counts = defaultdict(int)
+        self.height_stats = HeightStatistics(2)
+        self.runs_completed = 0
+        self.truncated = False
+        self.stop_reason = None
+        self.params = {"steps": n_steps, "alpha": alpha, "runs": runs,
+                       "seed": seed, "engine": ENGINE_VERSION}
+        rng = random.Random(seed)
+        self._timer = timer
         
         for run in range(1, runs + 1):
             # Create a new diagram for each run
-            diagram = Diagram2D(initial_cells)
+            diagram = Diagram2D(set(initial_cells) if initial_cells else None, rng=rng, timer=timer)
+            self._current_diagram = diagram
+            steps_done = 0
+            
+            for added in diagram.grow(n_steps=n_steps, alpha=alpha, chunk_size=chunk_size):
+                steps_done += len(added)
+                if steps_done >= n_steps:
+                    # Accumulate before the last yield so a stop right after it keeps the run complete
+                    self._accumulate_run(diagram, run)
+                yield run, diagram, added
+            
+            if self._current_diagram is not None:
+                self._accumulate_run(diagram, run)
+    
+    def _accumulate_run(self, diagram: Diagram2D, run: int) -> None:
+        """
+        Add the cells of a finished run to the accumulated counts.
+        """
+        started = PhaseTimer.now()
+        # Increment counter for each cell that appeared in this simulation
+        for cell in diagram.cells:
+            self.total_cell_counts[cell] += 1
+        self.height_stats.add(diagram_heights(diagram.cells, 2))
+        if self._timer is not None:
+            self._timer.lap("accumulation", started)
+        self.runs_completed += 1
+        self._current_diagram = None
+        
+        print(f'Simulation {run} completed. Diagram size: {len(diagram.cells)} cells.')
+        
+    def simulate(self, n_steps: int = 1000, alpha: float = 1.0, runs: int = 10, 
+                 initial_cells: Optional[Set[Tuple[int, int]]] = None,
+                 callback: Optional[callable] = None,
+                 budget: Optional[SimulationBudget] = None,
+                 chunk_size: int = 100,
+                 seed: Optional[int] = None,
+                 timer: Optional[PhaseTimer] = None) -> None:
+        """
+        Conduct simulation of diagram growth for the specified number of runs.
+        
+        If ``budget`` is exhausted or cancelled, the simulation stops after the current
+        chunk. The partially grown run is dropped, so the counts, ``height_stats`` and
+        ``runs_completed`` all describe the same completed runs; ``truncated`` is set
+        and ``stop_reason`` tells why the simulation stopped.
+        
+        Parameters:
+        -----------
+        n_steps : int, default=1000
+            Number of steps for each simulation.
+        alpha : float, default=1.0
+            Power parameter to control growth behavior.
+        runs : int, default=10
+            Number of simulations to run.
+        initial_cells : Set[Tuple[int, int]], optional
+            Initial set of cells for the simulation.
+        callback : callable, optional
+            Called after each chunk of ``chunk_size`` steps as ``callback(counts, step, run)``:
+            the counts include the diagram being grown and ``step`` is the index of the
+            last step done in the current run.
+        budget : SimulationBudget, optional
+            Time/step budget and cancellation token checked between chunks.
+        chunk_size : int, default=100
+            Number of growth steps between budget checks.
+        seed : int, optional
+            Seed of the random generator; makes the result reproducible.
+        timer : PhaseTimer, optional
+            Accumulates time spent in the growth phases and in accumulation of runs.
+        """
+        chunks = self.iter_simulate(n_steps=n_steps, alpha=alpha, runs=runs,
+                                    initial_cells=initial_cells, chunk_size=chunk_size,
+                                    seed=seed, timer=timer)
+        if budget is not None:
+            budget.start()
             
-            # Define callback function to track growth in real-time if provided
-            def growth_callback(diagram, step):
-                if callback:
-                    # Store current state for external callback
-                    temp_counts = self.total_cell_counts.copy()
+        current_run, steps_done = None, 0
+        for run, diagram, added in chunks:
+            if run != current_run:
+                current_run, steps_done = run, 0
+            steps_done += len(added)
+            if callback:
+                # Store current state for external callback
+                temp_counts = self.total_cell_counts.copy()
+                if self._current_diagram is not None:
                     for cell in diagram.cells:
                         temp_counts[cell] += 1
-                    callback(temp_counts, step, run)
+                callback(temp_counts, steps_done - 1, run)
+                
+            if budget is not None:
+                budget.consume(len(added))
+                if budget.exhausted():
+                    chunks.close()
+                    self.stop_early(budget.reason, runs)
+                    break
+    
+    def stop_early(self, reason: str, runs: int) -> None:
+        """
+        Finish a simulation interrupted between chunks, dropping the partial run.
+        """
+        if self._current_diagram is None and self.runs_completed == runs:
+            # Budget ran out exactly after the last chunk of the last run
+            return
             
-            # Run the simulation
-            diagram.simulate(n_steps=n_steps, alpha=alpha, callback=growth_callback)
+        # The partial run never reached the counts: they are accumulated per finished run
+        self._current_diagram = None
             
-            # Increment counter for each cell that appeared in this simulation
-            for cell in diagram.cells:
-                self.total_cell_counts[cell] += 1
-                
-            print(f'Simulation {run} completed. Diagram size: {len(diagram.cells)} cells.')
+        self.truncated = True
+        self.stop_reason = reason
+        print(f'Simulation stopped early ({reason}) after {self.runs_completed} completed runs.')
     
     def visualize(self, filename: Optional[str] = None, 
-                  cell_size: int = 10, grid: bool = True) -> None:
+                  cell_size: int = 10, grid: bool = True, mode: str = "raster", show: bool = True) -> None:
         """
         Visualize accumulated simulation results.
         
@@ -76,37 +231,57 @@ class DiagramSimulator2D:
         filename : str, optional
             If provided, saves the visualization to this file.
         cell_size : int, default=10
-            Size of each cell in the visualization.
+            Size of each cell in the visualization (scatter mode only).
         grid : bool, default=True
             Whether to display a grid.
+        mode : str, default="raster"
+            "raster" draws the dense count grid as a single image, so the time
+            depends on the image size rather than on the number of cells;
+            "scatter" draws one marker per cell (slow for large diagrams).
+        show : bool, default=True
+            Whether to call ``plt.show()``. Headless batch rendering passes False
+            and closes the returned figure itself.
         """
-        if not self.total_cell_counts:
+        import matplotlib.pyplot as plt
+        
+        if not self._has_data():
             print("No data to visualize. Run simulations first.")
             return
             
-        # Prepare data for visualization
-        x_coords = []
-        y_coords = []
-        frequencies = []
-        
-        max_count = max(self.total_cell_counts.values())
-        
-        for (x, y), count in self.total_cell_counts.items():
-            x_coords.append(x * cell_size)
-            y_coords.append(y * cell_size)
-            frequencies.append(count)
-        
-        # Normalize frequencies for proper display
-        frequencies_normalized = [count / max_count for count in frequencies]
-        
-        # Invert normalized frequencies for color mapping (dark red for high frequency)
-        frequencies_inverted = [1 - f for f in frequencies_normalized]
-        
-        plt.figure(figsize=(10, 10))
-        # Use 'Reds_r' colormap for dark red to light red range
-        scatter = plt.scatter(x_coords, y_coords, c=frequencies_inverted, 
-                             cmap='Reds_r', s=cell_size**2, marker='s')
-        plt.colorbar(scatter, label='Cell frequency')
+        if mode == "raster":
+            frequencies = count_grid(self.get_result())
+            plt.figure(figsize=(10, 10))
+            # Dark red for high frequency, as in the scatter mode; empty cells stay blank
+            image = plt.imshow(frequencies.T, origin='lower', cmap='Reds', vmin=0, vmax=1,
+                               interpolation='nearest',
+                               extent=(-0.5, frequencies.shape[0] - 0.5, -0.5, frequencies.shape[1] - 0.5))
+            plt.colorbar(image, label='Normalized cell frequency')
+        elif mode == "scatter":
+            # Prepare data for visualization
+            x_coords = []
+            y_coords = []
+            frequencies = []
+            
+            max_count = max(self.total_cell_counts.values())
+            
+            for (x, y), count in self.total_cell_counts.items():
+                x_coords.append(x * cell_size)
+                y_coords.append(y * cell_size)
+                frequencies.append(count)
+            
+            # Normalize frequencies for proper display
+            frequencies_normalized = [count / max_count for count in frequencies]
+            
+            # Invert normalized frequencies for color mapping (dark red for high frequency)
+            frequencies_inverted = [1 - f for f in frequencies_normalized]
+            
+            plt.figure(figsize=(10, 10))
+            # Use 'Reds_r' colormap for dark red to light red range
+            scatter = plt.scatter(x_coords, y_coords, c=frequencies_inverted, 
+                                 cmap='Reds_r', s=cell_size**2, marker='s')
+            plt.colorbar(scatter, label='Cell frequency')
+        else:
+            raise ValueError(f"Unknown visualization mode: {mode}")
         
         # Set equal aspect ratio
         plt.gca().set_aspect('equal', adjustable='box')
@@ -121,7 +296,8 @@ class DiagramSimulator2D:
         if filename:
             plt.savefig(filename, dpi=300, bbox_inches='tight')
             
-        plt.show()
+        if show:
+            plt.show()
         
         # Return the figure for web API usage
         return plt.gcf()
@@ -137,8 +313,25 @@ class DiagramSimulator2D:
         """
         save_cells_to_file(self.total_cell_counts, filename)
 
+    def save_result(self, filename: str, layout: str = "auto") -> None:
+        """
+        Save accumulated results to a binary result file.
+        
+        The file keeps the parameters, seed and engine version of the simulation
+        and can be memory-mapped lazily with ``common.result_file.open_result_file``.
+        
+        Parameters:
+        -----------
+        filename : str
+            Output filename, conventionally with the ``.ydr`` extension.
+        layout : str, default="auto"
+            "sparse" (cell coordinates and counts), "columns" (column heights and
+            counts), "dense" (count grid) or "auto" to pick the smallest file.
+        """
+        write_result_file(self.get_result(), filename, layout=layout)
+
     def limit_shape_visualize(self, filename: Optional[str] = None, 
-                             levels: int = 10) -> None:
+                             levels: int = 10, resolution: int = 100, show: bool = True) -> None:
         """
         Visualize the limit shape using a contour plot.
         
@@ -148,14 +341,21 @@ class DiagramSimulator2D:
             If provided, saves the visualization to this file.
         levels : int, default=10
             Number of contour levels.
+        resolution : int, default=100
+            Number of grid nodes along each axis.
+        show : bool, default=True
+            Whether to call ``plt.show()``. Headless batch rendering passes False
+            and closes the returned figure itself.
         """
-        if not self.total_cell_counts:
+        import matplotlib.pyplot as plt
+        
+        if not self._has_data():
             print("No data to visualize. Run simulations first.")
             return
             
         # Compute the limit shape
         grid_x, grid_y, grid_z = compute_limit_shape(
-            self.total_cell_counts, dimensions=2)
+            self.get_result(), dimensions=2, resolution=resolution)
         
         plt.figure(figsize=(10, 10))
         
@@ -177,11 +377,51 @@ class DiagramSimulator2D:
         if filename:
             plt.savefig(filename, dpi=300, bbox_inches='tight')
             
-        plt.show()
+        if show:
+            plt.show()
         
         # Return the figure for web API usage
         return plt.gcf()
         
+    def get_result(self) -> SimulationResult:
+        """
+        Get the accumulated counts as a compact array-based result.
+        
+        Returns:
+        --------
+        SimulationResult
+            Result with the coordinates, counts and parameters of the last simulation.
+        """
+        if self._loaded is not None:
+            # Loaded result is returned as is: its arrays may be memory-mapped from a file
+            return self._loaded
+        return SimulationResult.from_counts(self.total_cell_counts, 2, self.params,
+                                            runs_completed=self.runs_completed,
+                                            truncated=self.truncated,
+                                            stop_reason=self.stop_reason,
+                                            heights=self.height_stats)
+    
+    def load_result(self, result: SimulationResult) -> None:
+        """
+        Replace the accumulated counts with a stored result, e.g. to render it.
+        
+        Parameters:
+        -----------
+        result : SimulationResult
+            2D result, for example loaded with ``common.result_file.open_result_file``.
+        """
+        if result.dimension != 2:
+            raise ValueError(f"Expected a 2D result, got {result.dimension}D")
+        # The counts dictionary is built lazily (see total_cell_counts)
+        self._counts = None
+        self._loaded = result
+        self.params = dict(result.params)
+        self.runs_completed = result.runs_completed
+        self.truncated = result.truncated
+        self.stop_reason = result.stop_reason
+        self.height_stats = result.heights if result.heights is not None else HeightStatistics(2)
+        self._current_diagram = None
+        
     def get_json_data(self):
         """
         Get the data in a JSON-serializable format for the web API.
@@ -191,27 +431,4 @@ class DiagramSimulator2D:
         dict
             Dictionary containing the cell data for visualization.
         """
-        if not self.total_cell_counts:
-            return {"error": "No data available. Run simulations first."}
-            
-        # Convert to a format suitable for JSON serialization
-        cells_data = []
-        max_count = max(self.total_cell_counts.values())
-        
-        for (x, y), count in self.total_cell_counts.items():
-            normalized_count = count / max_count
-            cells_data.append({
-                "x": x,
-                "y": y,
-                "count": count,
-                "normalized_count": normalized_count
-            })
-            
-        return {
-            "cells": cells_data,
-            "max_count": max_count,
-            "dimensions": {
-                "max_x": max(x for x, _ in self.total_cell_counts.keys()) + 1,
-                "max_y": max(y for _, y in self.total_cell_counts.keys()) + 1
-            }
-        } 
\ No newline at end of file
+        return self.get_result().to_json_data()
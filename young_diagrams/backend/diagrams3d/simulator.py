@@ -1,17 +1,24 @@
-import matplotlib.pyplot as plt
 import numpy as np
-from mpl_toolkits.mplot3d import Axes3D
 from collections import defaultdict
-from typing import Dict, Tuple, List, Set, Optional, Union, Any
+from typing import Dict, Tuple, List, Set, Optional, Union, Any, Iterator
 import os
 import sys
-from matplotlib import cm
-import matplotlib.colors as mcolors
+import random
+# matplotlib is imported inside the plotting methods: simulation-only users
+# (the API workers and the CLIs without plots) do not pay for it at startup
 
 # Add parent directory to path to allow imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from common.utils import save_cells_to_file, compute_limit_shape
+from common.cancellation import SimulationBudget
+from common.result import SimulationResult, ENGINE_VERSION
+from common.result_file import write_result_file
+from common.metrics import PhaseTimer
+from common.heights import HeightStatistics, diagram_heights
+from common.voxel_index import VoxelIndex
+from common.mesh import extract_surface, height_map
+from common.raster import render_voxels
 from diagrams3d.young_diagram import Diagram3D
 
 
@@ -24,12 +31,53 @@ class DiagramSimulator3D:
         Initialize the simulator with empty cell counts.
         """
         self.total_cell_counts = defaultdict(int)  # Dictionary for counting occurrences of each cell
+        self.runs_completed = 0  # Number of runs grown to the full number of steps
+        self.truncated = False  # Whether the last simulation was stopped early
+        self.stop_reason = None  # Why the last simulation was stopped early
+        self._current_diagram = None  # Diagram of the run in progress, if any
+        self.params = {}  # Parameters of the last simulation
+        self._timer = None  # Phase timer of the simulation in progress, if any
+        self.height_stats = HeightStatistics(3)  # Running mean and variance of the height function
+        
+    @property
+    def total_cell_counts(self) -> Dict:
+        """
+        Accumulated cell counts.
         
-    def simulate(self, n_steps: int = 1000, alpha: float = 1.0, runs: int = 10, 
-                 initial_cells: Optional[Set[Tuple[int, int, int]]] = None, 
-                 callback: Optional[callable] = None) -> None:
+        After ``load_result`` the dictionary is built from the result arrays only
+        on first access; the raster, slice and limit-shape plots read the arrays
+        directly and never build it.
         """
-        Conduct simulation of diagram growth for the specified number of runs.
+        if self._loaded is not None:
+            self._counts = defaultdict(int, self._loaded.to_counts())
+            self._loaded = None
+        return self._counts
+    
+    @total_cell_counts.setter
+    def total_cell_counts(self, counts: Dict) -> None:
+        self._counts = counts
+        self._loaded = None
+    
+    def _has_data(self) -> bool:
+        """
+        Whether there are accumulated counts, without building the dictionary of a loaded result.
+        """
+        if self._loaded is not None:
+            return self._loaded.size > 0
+        return bool(self._counts)
+        
+    def iter_simulate(self, n_steps: int = 1000, alpha: float = 1.0, runs: int = 10,
+                      initial_cells: Optional[Set[Tuple[int, int, int]]] = None,
+                      chunk_size: int = 100,
+                      seed: Optional[int] = None,
+                      timer: Optional[PhaseTimer] = None) -> Iterator[Tuple[int, Diagram3D, List[Tuple[int, int, int]]]]:
+        """
+        Resumable chunked simulation of diagram growth.
+        
+        Grows the diagrams run by run in chunks of ``chunk_size`` steps and yields
+        after every chunk, so the caller can pause, inspect progress or stop between
+        chunks. Completed runs are accumulated into ``total_cell_counts`` and their
+        height functions into ``height_stats``.
         
         Parameters:
         -----------
@@ -41,36 +89,143 @@ class DiagramSimulator3D:
             Number of simulations to run.
         initial_cells : Set[Tuple[int, int, int]], optional
             Initial set of cells for the simulation.
-        callback : callable, optional
-            Function to call after each step with the current state.
+        chunk_size : int, default=100
+            Number of growth steps between yields.
+        seed : int, optional
+            Seed of the random generator shared by all runs; makes the result reproducible.
+        timer : PhaseTimer, optional
+            Accumulates time spent in the growth phases and in accumulation of runs.
+            
+        Yields:
+        -------
+        Tuple[int, Diagram3D, List[Tuple[int, int, int]]]
+            Current run number, the diagram being grown and the cells added in the chunk.
         """
         # Reset counters for new simulation
         self.total_cell_counts = defaultdict(int)
+        self.height_stats = HeightStatistics(3)
+        self.runs_completed = 0
+        self.truncated = False
+        self.stop_reason = None
+        self.params = {"steps": n_steps, "alpha": alpha, "runs": runs,
+                       "seed": seed, "engine": ENGINE_VERSION}
+        rng = random.Random(seed)
+        self._timer = timer
         
         for run in range(1, runs + 1):
             # Create a new diagram for each run
-            diagram = Diagram3D(initial_cells)
+            diagram = Diagram3D(set(initial_cells) if initial_cells else None, rng=rng, timer=timer)
+            self._current_diagram = diagram
+            steps_done = 0
+            
+            for added in diagram.grow(n_steps=n_steps, alpha=alpha, chunk_size=chunk_size):
+                steps_done += len(added)
+                if steps_done >= n_steps:
+                    # Accumulate before the last yield so a stop right after it keeps the run complete
+                    self._accumulate_run(diagram, run)
+                yield run, diagram, added
             
-            # Define callback function to track growth in real-time if provided
-            def growth_callback(diagram, step):
-                if callback:
-                    # Store current state for external callback
-                    temp_counts = self.total_cell_counts.copy()
+            if self._current_diagram is not None:
+                self._accumulate_run(diagram, run)
+    
+    def _accumulate_run(self, diagram: Diagram3D, run: int) -> None:
+        """
+        Add the cells of a finished run to the accumulated counts.
+        """
+        started = PhaseTimer.now()
+        # Increment counter for each cell that appeared in this simulation
+        for cell in diagram.cells:
+            self.total_cell_counts[cell] += 1
+        self.height_stats.add(diagram_heights(diagram.cells, 3))
+        if self._timer is not None:
+            self._timer.lap("accumulation", started)
+        self.runs_completed += 1
+        self._current_diagram = None
+        
+        print(f'Simulation {run} completed. Diagram size: {len(diagram.cells)} cells.')
+        
+    def simulate(self, n_steps: int = 1000, alpha: float = 1.0, runs: int = 10, 
+                 initial_cells: Optional[Set[Tuple[int, int, int]]] = None,
+                 callback: Optional[callable] = None,
+                 budget: Optional[SimulationBudget] = None,
+                 chunk_size: int = 100,
+                 seed: Optional[int] = None,
+                 timer: Optional[PhaseTimer] = None) -> None:
+        """
+        Conduct simulation of diagram growth for the specified number of runs.
+        
+        If ``budget`` is exhausted or cancelled, the simulation stops after the current
+        chunk. The partially grown run is dropped, so the counts, ``height_stats`` and
+        ``runs_completed`` all describe the same completed runs; ``truncated`` is set
+        and ``stop_reason`` tells why the simulation stopped.
+        
+        Parameters:
+        -----------
+        n_steps : int, default=1000
+            Number of steps for each simulation.
+        alpha : float, default=1.0
+            Power parameter to control growth behavior.
+        runs : int, default=10
+            Number of simulations to run.
+        initial_cells : Set[Tuple[int, int, int]], optional
+            Initial set of cells for the simulation.
+        callback : callable, optional
+            Called after each chunk of ``chunk_size`` steps as ``callback(counts, step, run)``:
+            the counts include the diagram being grown and ``step`` is the index of the
+            last step done in the current run.
+        budget : SimulationBudget, optional
+            Time/step budget and cancellation token checked between chunks.
+        chunk_size : int, default=100
+            Number of growth steps between budget checks.
+        seed : int, optional
+            Seed of the random generator; makes the result reproducible.
+        timer : PhaseTimer, optional
+            Accumulates time spent in the growth phases and in accumulation of runs.
+        """
+        chunks = self.iter_simulate(n_steps=n_steps, alpha=alpha, runs=runs,
+                                    initial_cells=initial_cells, chunk_size=chunk_size,
+                                    seed=seed, timer=timer)
+        if budget is not None:
+            budget.start()
+            
+        current_run, steps_done = None, 0
+        for run, diagram, added in chunks:
+            if run != current_run:
+                current_run, steps_done = run, 0
+            steps_done += len(added)
+            if callback:
+                # Store current state for external callback
+                temp_counts = self.total_cell_counts.copy()
+                if self._current_diagram is not None:
                     for cell in diagram.cells:
                         temp_counts[cell] += 1
-                    callback(temp_counts, step, run)
+                callback(temp_counts, steps_done - 1, run)
+                
+            if budget is not None:
+                budget.consume(len(added))
+                if budget.exhausted():
+                    chunks.close()
+                    self.stop_early(budget.reason, runs)
+                    break
+    
+    def stop_early(self, reason: str, runs: int) -> None:
+        """
+        Finish a simulation interrupted between chunks, dropping the partial run.
+        """
+        if self._current_diagram is None and self.runs_completed == runs:
+            # Budget ran out exactly after the last chunk of the last run
+            return
             
-            # Run the simulation
-            diagram.simulate(n_steps=n_steps, alpha=alpha, callback=growth_callback)
+        # The partial run never reached the counts: they are accumulated per finished run
+        self._current_diagram = None
             
-            # Increment counter for each cell that appeared in this simulation
-            for cell in diagram.cells:
-                self.total_cell_counts[cell] += 1
-                
-            print(f'Simulation {run} completed. Diagram size: {len(diagram.cells)} cells.')
+        self.truncated = True
+        self.stop_reason = reason
+        print(f'Simulation stopped early ({reason}) after {self.runs_completed} completed runs.')
     
     def visualize(self, filename: Optional[str] = None, alpha_cubes: float = 0.7,
-                 elev: int = 20, azim: int = -30) -> None:
+                 elev: int = 20, azim: int = -30, threshold: Optional[float] = None,
+                 mode: str = "raster", width: int = 1600, show: bool = True) -> None:
         """
         Visualize accumulated 3D simulation results using voxels.
         
@@ -84,39 +239,88 @@ class DiagramSimulator3D:
             Elevation angle for the 3D view.
         azim : int, default=-30
             Azimuth angle for the 3D view.
+        threshold : float, optional
+            If provided, draws only the exposed surface of the cells with
+            normalized frequency >= threshold, with coplanar faces merged into
+            rectangles, instead of one cube per cell. The number of drawn
+            polygons then grows with the surface rather than the volume.
+            In raster mode, draws only the cells with normalized frequency >= threshold.
+        mode : str, default="raster"
+            "raster" renders an orthographic, face-shaded image of the cell
+            columns in NumPy (see ``common.raster.render_voxels``), so the time
+            depends on the image size rather than on the number of cells;
+            "voxels" draws the cubes (or the merged surface) with mplot3d, which
+            is slow past a few thousand cells.
+        width : int, default=1600
+            Width of the rendered image in pixels (raster mode only).
+        show : bool, default=True
+            Whether to call ``plt.show()``. Headless batch rendering passes False
+            and closes the returned figure itself.
         """
-        if not self.total_cell_counts:
+        import matplotlib.pyplot as plt
+        from matplotlib import cm
+        from mpl_toolkits.mplot3d import Axes3D  # noqa: F401 (registers the '3d' projection)
+        from mpl_toolkits.mplot3d.art3d import Poly3DCollection
+        
+        if not self._has_data():
             print("No data to visualize. Run simulations first.")
             return
             
+        if mode == "raster":
+            image = render_voxels(self.get_result(), elev=elev, azim=azim, width=width,
+                                  threshold=threshold, alpha=alpha_cubes)
+            fig = plt.figure(figsize=(10, 10))
+            ax = fig.add_subplot(111)
+            ax.imshow(image, interpolation='nearest')
+            ax.set_axis_off()
+            fig.colorbar(cm.ScalarMappable(cmap='plasma'), ax=ax, shrink=0.6, label='Normalized cell frequency')
+            ax.set_title('3D Young Diagram Simulation')
+            if filename:
+                plt.savefig(filename, dpi=300, bbox_inches='tight')
+            if show:
+                plt.show()
+            return fig
+        if mode != "voxels":
+            raise ValueError(f"Unknown visualization mode: {mode}")
+            
         # Find the dimensions of the 3D space
         max_x = max(x for x, _, _ in self.total_cell_counts.keys()) + 1
         max_y = max(y for _, y, _ in self.total_cell_counts.keys()) + 1
         max_z = max(z for _, _, z in self.total_cell_counts.keys()) + 1
         
-        # Create a boolean array for voxel occupancy
-        voxels = np.zeros((max_x, max_y, max_z), dtype=bool)
-        
-        # Create a color array for voxels
-        max_count = max(self.total_cell_counts.values())
-        colors = np.zeros(voxels.shape + (4,))  # RGBA colors
-        
-        # Fill the voxel and color arrays
-        for (x, y, z), count in self.total_cell_counts.items():
-            voxels[x, y, z] = True
-            
-            # Normalize count and create color (heat map from blue to red)
-            normalized_count = count / max_count
-            colors[x, y, z] = cm.plasma(normalized_count) 
-            # Last value is alpha (transparency)
-            colors[x, y, z, 3] = alpha_cubes  
-        
         # Create the figure
         fig = plt.figure(figsize=(10, 10))
         ax = fig.add_subplot(111, projection='3d')
         
-        # Plot the voxels
-        ax.voxels(voxels, facecolors=colors, edgecolor='k', linewidth=0.5)
+        if threshold is not None:
+            # Surface mesh: merged exposed faces, shaded by their orientation
+            surface = extract_surface(height_map(self.get_result(), threshold))
+            shade = np.array([0.8, 0.65, 1.0])[np.abs(surface["normals"]).argmax(axis=1)]
+            colors = np.tile(cm.plasma(threshold), (len(shade), 1))
+            colors[:, :3] *= shade[:, None]
+            colors[:, 3] = alpha_cubes
+            ax.add_collection3d(Poly3DCollection(surface["quads"], facecolors=colors,
+                                                 edgecolor='k', linewidth=0.3))
+        else:
+            # Create a boolean array for voxel occupancy
+            voxels = np.zeros((max_x, max_y, max_z), dtype=bool)
+            
+            # Create a color array for voxels
+            max_count = max(self.total_cell_counts.values())
+            colors = np.zeros(voxels.shape + (4,))  # RGBA colors
+            
+            # Fill the voxel and color arrays
+            for (x, y, z), count in self.total_cell_counts.items():
+                voxels[x, y, z] = True
+                
+                # Normalize count and create color (heat map from blue to red)
+                normalized_count = count / max_count
+                colors[x, y, z] = cm.plasma(normalized_count) 
+                # Last value is alpha (transparency)
+                colors[x, y, z, 3] = alpha_cubes  
+            
+            # Plot the voxels
+            ax.voxels(voxels, facecolors=colors, edgecolor='k', linewidth=0.5)
         
         # Set axis labels
         ax.set_xlabel('X')
@@ -144,13 +348,14 @@ class DiagramSimulator3D:
         if filename:
             plt.savefig(filename, dpi=300, bbox_inches='tight')
             
-        plt.show()
+        if show:
+            plt.show()
         
         # Return the figure for web API usage
         return fig
     
     def visualize_point_cloud(self, filename: Optional[str] = None, 
-                             alpha_points: float = 0.8, size_factor: int = 100) -> None:
+                             alpha_points: float = 0.8, size_factor: int = 100, show: bool = True) -> None:
         """
         Visualize accumulated 3D simulation results using a point cloud with varying sizes.
         
@@ -162,29 +367,24 @@ class DiagramSimulator3D:
             Transparency of points.
         size_factor : int, default=100
             Size multiplier for the points.
+        show : bool, default=True
+            Whether to call ``plt.show()``. Headless batch rendering passes False
+            and closes the returned figure itself.
         """
-        if not self.total_cell_counts:
+        import matplotlib.pyplot as plt
+        from mpl_toolkits.mplot3d import Axes3D  # noqa: F401 (registers the '3d' projection)
+        
+        if not self._has_data():
             print("No data to visualize. Run simulations first.")
             return
             
         # Extract coordinates and counts
-        x_coords = []
-        y_coords = []
-        z_coords = []
-        sizes = []
-        colors = []
-        
-        max_count = max(self.total_cell_counts.values())
-        
-        for (x, y, z), count in self.total_cell_counts.items():
-            x_coords.append(x)
-            y_coords.append(y)
-            z_coords.append(z)
-            
-            # Size proportional to count
-            normalized_count = count / max_count
-            sizes.append(normalized_count * size_factor)
-            colors.append(normalized_count)
+        result = self.get_result()
+        x_coords, y_coords, z_coords = np.asarray(result.coords).T
+        
+        # Size proportional to count
+        colors = np.asarray(result.counts) / result.max_count
+        sizes = colors * size_factor
         
         # Create the figure
         fig = plt.figure(figsize=(10, 10))
@@ -203,7 +403,7 @@ class DiagramSimulator3D:
         ax.set_zlabel('Z')
         
         # Get the maximum size in any dimension
-        max_dim = max(max(x_coords), max(y_coords), max(z_coords)) + 1
+        max_dim = int(max(x_coords.max(), y_coords.max(), z_coords.max())) + 1
         
         # Set equal aspect ratio for all axes
         ax.set_box_aspect([1, 1, 1])
@@ -219,7 +419,8 @@ class DiagramSimulator3D:
         if filename:
             plt.savefig(filename, dpi=300, bbox_inches='tight')
             
-        plt.show()
+        if show:
+            plt.show()
         
         # Return the figure for web API usage
         return fig
@@ -234,9 +435,27 @@ class DiagramSimulator3D:
             Output filename.
         """
         save_cells_to_file(self.total_cell_counts, filename)
+
+    def save_result(self, filename: str, layout: str = "auto") -> None:
+        """
+        Save accumulated results to a binary result file.
+        
+        The file keeps the parameters, seed and engine version of the simulation
+        and can be memory-mapped lazily with ``common.result_file.open_result_file``.
+        
+        Parameters:
+        -----------
+        filename : str
+            Output filename, conventionally with the ``.ydr`` extension.
+        layout : str, default="auto"
+            "sparse" (cell coordinates and counts), "columns" (column heights and
+            counts), "dense" (count grid) or "auto" to pick the smallest file.
+        """
+        write_result_file(self.get_result(), filename, layout=layout)
         
     def visualize_limit_shape(self, filename: Optional[str] = None, 
-                             level: float = 0.5, alpha_surface: float = 0.7) -> None:
+                             level: float = 0.5, alpha_surface: float = 0.7,
+                             resolution: int = 50, show: bool = True) -> None:
         """
         Visualize the limit shape using isosurfaces in 3D.
         
@@ -248,8 +467,16 @@ class DiagramSimulator3D:
             Isosurface level to display (between 0 and 1).
         alpha_surface : float, default=0.7
             Transparency of the surface.
+        resolution : int, default=50
+            Number of grid nodes along each axis.
+        show : bool, default=True
+            Whether to call ``plt.show()``. Headless batch rendering passes False
+            and closes the returned figure itself.
         """
-        if not self.total_cell_counts:
+        import matplotlib.pyplot as plt
+        from mpl_toolkits.mplot3d import Axes3D  # noqa: F401 (registers the '3d' projection)
+        
+        if not self._has_data():
             print("No data to visualize. Run simulations first.")
             return
             
@@ -263,7 +490,7 @@ class DiagramSimulator3D:
             
         # Compute the limit shape
         grid_x, grid_y, grid_z, grid_v = compute_limit_shape(
-            self.total_cell_counts, dimensions=3)
+            self.get_result(), dimensions=3, resolution=resolution)
         
         # Extract the isosurface at the specified level
         verts, faces, _, _ = measure.marching_cubes(grid_v, level=level)
@@ -296,13 +523,14 @@ class DiagramSimulator3D:
         if filename:
             plt.savefig(filename, dpi=300, bbox_inches='tight')
             
-        plt.show()
+        if show:
+            plt.show()
         
         # Return the figure for web API usage
         return fig
         
     def visualize_slices(self, filename: Optional[str] = None, 
-                        num_slices: int = 3) -> None:
+                        num_slices: int = 3, show: bool = True) -> None:
         """
         Visualize 2D slices of the 3D diagram at different z-levels.
         
@@ -312,14 +540,19 @@ class DiagramSimulator3D:
             If provided, saves the visualization to this file.
         num_slices : int, default=3
             Number of z-slices to display.
+        show : bool, default=True
+            Whether to call ``plt.show()``. Headless batch rendering passes False
+            and closes the returned figure itself.
         """
-        if not self.total_cell_counts:
+        import matplotlib.pyplot as plt
+        
+        if not self._has_data():
             print("No data to visualize. Run simulations first.")
             return
             
-        # Find the range of z values
-        z_values = [z for _, _, z in self.total_cell_counts.keys()]
-        min_z, max_z = min(z_values), max(z_values)
+        # The index answers each z-slice without rescanning all cells
+        index = VoxelIndex(self.get_result())
+        min_z, max_z = 0, index.shape[2] - 1
         
         # Determine slice positions
         if num_slices == 1:
@@ -336,25 +569,22 @@ class DiagramSimulator3D:
         fig.suptitle('3D Young Diagram Z-Slices', fontsize=16)
         
         # Maximum count for normalization
-        max_count = max(self.total_cell_counts.values())
+        max_count = index.result.max_count
         
         # Process each slice
         for i, z in enumerate(slice_positions):
             # Extract cells at this z level
-            slice_cells = {(x, y): count for (x, y, z_val), count in self.total_cell_counts.items() if z_val == z}
+            coords, counts = index.slice("z", int(z))
             
-            if not slice_cells:
+            if not len(counts):
                 axes[i].text(0.5, 0.5, f'No cells at z={z}', 
                            horizontalalignment='center', verticalalignment='center')
                 axes[i].set_title(f'z = {z}')
                 continue
                 
             # Prepare data for visualization
-            x_coords, y_coords, frequencies = [], [], []
-            for (x, y), count in slice_cells.items():
-                x_coords.append(x)
-                y_coords.append(y)
-                frequencies.append(count / max_count)
+            x_coords, y_coords = coords[:, 0], coords[:, 1]
+            frequencies = counts / max_count
                 
             # Create the scatter plot for this slice
             scatter = axes[i].scatter(x_coords, y_coords, c=frequencies, cmap='plasma', 
@@ -375,11 +605,51 @@ class DiagramSimulator3D:
         if filename:
             plt.savefig(filename, dpi=300, bbox_inches='tight')
             
-        plt.show()
+        if show:
+            plt.show()
         
         # Return the figure for web API usage
         return fig
         
+    def get_result(self) -> SimulationResult:
+        """
+        Get the accumulated counts as a compact array-based result.
+        
+        Returns:
+        --------
+        SimulationResult
+            Result with the coordinates, counts and parameters of the last simulation.
+        """
+        if self._loaded is not None:
+            # Loaded result is returned as is: its arrays may be memory-mapped from a file
+            return self._loaded
+        return SimulationResult.from_counts(self.total_cell_counts, 3, self.params,
+                                            runs_completed=self.runs_completed,
+                                            truncated=self.truncated,
+                                            stop_reason=self.stop_reason,
+                                            heights=self.height_stats)
+    
+    def load_result(self, result: SimulationResult) -> None:
+        """
+        Replace the accumulated counts with a stored result, e.g. to render it.
+        
+        Parameters:
+        -----------
+        result : SimulationResult
+            3D result, for example loaded with ``common.result_file.open_result_file``.
+        """
+        if result.dimension != 3:
+            raise ValueError(f"Expected a 3D result, got {result.dimension}D")
+        # The counts dictionary is built lazily (see total_cell_counts)
+        self._counts = None
+        self._loaded = result
+        self.params = dict(result.params)
+        self.runs_completed = result.runs_completed
+        self.truncated = result.truncated
+        self.stop_reason = result.stop_reason
+        self.height_stats = result.heights if result.heights is not None else HeightStatistics(3)
+        self._current_diagram = None
+        
     def get_json_data(self):
         """
         Get the data in a JSON-serializable format for the web API.
@@ -389,29 +659,4 @@ class DiagramSimulator3D:
         dict
             Dictionary containing the cell data for visualization.
         """
-        if not self.total_cell_counts:
-            return {"error": "No data available. Run simulations first."}
-            
-        # Convert to a format suitable for JSON serialization
-        cells_data = []
-        max_count = max(self.total_cell_counts.values())
-        
-        for (x, y, z), count in self.total_cell_counts.items():
-            normalized_count = count / max_count
-            cells_data.append({
-                "x": x,
-                "y": y,
-                "z": z,
-                "count": count,
-                "normalized_count": normalized_count
-            })
-            
-        return {
-            "cells": cells_data,
-            "max_count": max_count,
-            "dimensions": {
-                "max_x": max(x for x, _, _ in self.total_cell_counts.keys()) + 1,
-                "max_y": max(y for _, y, _ in self.total_cell_counts.keys()) + 1,
-                "max_z": max(z for _, _, z in self.total_cell_counts.keys()) + 1
-            }
-        } 
\ No newline at end of file
+        return self.get_result().to_json_data()
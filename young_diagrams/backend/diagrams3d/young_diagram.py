@@ -1,5 +1,5 @@
 import random
-from typing import Set, Tuple, List, Dict, Optional, Union
+from typing import Any, Set, Tuple, List, Dict, Optional, Union, Iterator
 
 
 class Diagram3D:
@@ -10,7 +10,8 @@ class Diagram3D:
     Диаграмма следует правилу: если куб с координатами (x,y,z) находится в диаграмме,
     то все кубы с координатами (x',y',z'), где x' <= x, y' <= y, z' <= z, также должны быть в диаграмме.
     """
-    def __init__(self, initial_cells: Optional[Set[Tuple[int, int, int]]] = None):
+    def __init__(self, initial_cells: Optional[Set[Tuple[int, int, int]]] = None,
+                 rng: Optional[random.Random] = None, timer: Optional[Any] = None):
         """
         Инициализация 3D диаграммы Юнга.
         
@@ -18,8 +19,14 @@ class Diagram3D:
         -----------
         initial_cells : Set[Tuple[int, int, int]], optional
             Начальный набор ячеек. Если None, начинается с ячейки (0, 0, 0).
+        rng : random.Random, optional
+            Генератор случайных чисел. Если None, используется глобальный генератор модуля random.
+        timer : PhaseTimer, optional
+            Таймер фаз шага (common.metrics.PhaseTimer). Если None, время не замеряется.
         """
         self.cells: Set[Tuple[int, int, int]] = initial_cells if initial_cells else {(0, 0, 0)}
+        self.rng = rng if rng is not None else random
+        self.timer = timer
         
     def get_addable_cells(self) -> Set[Tuple[int, int, int]]:
         """
@@ -83,6 +90,84 @@ class Diagram3D:
         """
         self.cells.add(cell)
         
+    def step(self, alpha: float = 1.0) -> Optional[Tuple[int, int, int]]:
+        """
+        Выполняет один шаг роста: выбирает ячейку пропорционально весам S(c) и добавляет её.
+        
+        Параметры:
+        -----------
+        alpha : float, default=1.0
+            Параметр, влияющий на поведение роста.
+            
+        Возвращает:
+        --------
+        Tuple[int, int, int] или None
+            Добавленная ячейка или None, если добавить нечего.
+        """
+        timer = self.timer
+        started = timer.now() if timer is not None else 0.0
+        
+        # Получаем все ячейки, которые можно добавить
+        addable_cells = self.get_addable_cells()
+        if not addable_cells:
+            return None
+        if timer is not None:
+            started = timer.lap("frontier", started)
+            
+        # Вычисляем S(c) для каждой добавляемой ячейки
+        cells_list = list(addable_cells)
+        weights = [self.calculate_weight(cell, alpha) for cell in cells_list]
+            
+        # Вычисляем вероятности для каждой ячейки
+        total_weight = sum(weights)
+        probabilities = [w / total_weight for w in weights]
+        if timer is not None:
+            started = timer.lap("weights", started)
+        
+        # Случайно выбираем ячейку для добавления на основе вероятностей
+        cell = self.rng.choices(cells_list, weights=probabilities, k=1)[0]
+        if timer is not None:
+            started = timer.lap("sampling", started)
+        self.add_cell(cell)
+        if timer is not None:
+            timer.lap("frontier", started)
+        return cell
+        
+    def grow(self, n_steps: int = 1000, alpha: float = 1.0,
+             chunk_size: int = 100) -> Iterator[List[Tuple[int, int, int]]]:
+        """
+        Генератор роста диаграммы порциями по chunk_size шагов.
+        
+        После каждой порции возвращает список добавленных в ней ячеек. Всё состояние
+        хранится в самой диаграмме, поэтому между порциями рост можно приостановить,
+        прервать или продолжить новым вызовом grow.
+        
+        Параметры:
+        -----------
+        n_steps : int, default=1000
+            Количество шагов для симуляции.
+        alpha : float, default=1.0
+            Параметр, влияющий на поведение роста.
+        chunk_size : int, default=100
+            Количество шагов в одной порции.
+            
+        Возвращает:
+        --------
+        Iterator[List[Tuple[int, int, int]]]
+            Ячейки, добавленные за каждую порцию.
+        """
+        added = []
+        for _ in range(n_steps):
+            cell = self.step(alpha)
+            if cell is None:  # Если ячеек для добавления нет, останавливаем симуляцию
+                break
+            added.append(cell)
+            if len(added) >= chunk_size:
+                yield added
+                added = []
+        if added:
+            yield added
+        
     def simulate(self, n_steps: int = 1000, alpha: float = 1.0, 
                  callback: Optional[callable] = None) -> None:
         """
@@ -98,26 +183,8 @@ class Diagram3D:
             Функция, которая вызывается после каждого шага с текущим состоянием.
         """
         for step in range(n_steps):
-            # Получаем все ячейки, которые можно добавить
-            addable_cells = self.get_addable_cells()
-            if not addable_cells:  # Если ячеек для добавления нет, останавливаем симуляцию
+            if self.step(alpha) is None:  # Если ячеек для добавления нет, останавливаем симуляцию
                 break
-                
-            # Вычисляем веса для каждой добавляемой ячейки
-            weights = []
-            cells_list = list(addable_cells)
-            
-            # Вычисляем S(c) для каждой добавляемой ячейки
-            for cell in cells_list:
-                weights.append(self.calculate_weight(cell, alpha))
-                
-            # Вычисляем вероятности для каждой ячейки
-            total_weight = sum(weights)
-            probabilities = [w / total_weight for w in weights]
-            
-            # Случайно выбираем ячейку для добавления на основе вероятностей
-            cell = random.choices(cells_list, weights=probabilities, k=1)[0]
-            self.add_cell(cell)
             
             # Вызываем callback, если он предоставлен
             if callback and step % 10 == 0:  # Вызываем callback чаще для визуализации
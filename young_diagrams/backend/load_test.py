@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест API симуляций.
+
+Запускает api.py через uvicorn на свободном порту localhost (или использует
+уже запущенный сервер по --url), подаёт смесь запросов simulate, visualize и
+limit-shape с заданной частотой и печатает пропускную способность и
+p50/p95/p99 задержки по каждому типу запроса. Отчёт сохраняется в JSON, а
+сравнение с сохранённым отчётом завершается кодом 1 при регрессии, поэтому
+скрипт можно запускать перед развёртыванием:
+
+    python load_test.py --rate 20 --duration 30 --output reports/baseline.json
+    python load_test.py --rate 20 --duration 30 --baseline reports/baseline.json
+
+Запросы подаются по расписанию (открытая модель нагрузки): задержка
+отсчитывается от запланированного момента отправки, поэтому время ожидания
+свободного соединения тоже входит в неё и перегрузка сервера не скрывается
+замедлением генератора.
+"""
+import argparse
+import gzip
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import numpy as np
+
+REPORT_VERSION = 1
+
+# Типы запросов: метод, путь и тело; {result_2d}/{result_3d} -- результаты, посчитанные при подготовке
+SCENARIOS = {
+    "simulate_2d": ("POST", "/simulate/2d", "2d"),
+    "simulate_3d": ("POST", "/simulate/3d", "3d"),
+    "visualize_2d": ("GET", "/visualize/2d?result_id={result_2d}", None),
+    "visualize_2d_binary": ("GET", "/visualize/2d?result_id={result_2d}&format=binary", None),
+    "visualize_3d": ("GET", "/visualize/3d/solid?result_id={result_3d}", None),
+    "visualize_3d_binary": ("GET", "/visualize/3d/solid?result_id={result_3d}&format=binary", None),
+    "limit_shape_2d": ("GET", "/limit-shape/2d?result_id={result_2d}", None),
+    "limit_shape_2d_png": ("GET", "/limit-shape/2d?result_id={result_2d}&format=png", None),
+    "limit_shape_3d": ("GET", "/limit-shape/3d?result_id={result_3d}", None),
+    "status": ("GET", "/status", None),
+}
+
+DEFAULT_MIX = "simulate_2d=2,visualize_2d=4,limit_shape_2d=2,simulate_3d=1,visualize_3d=2,limit_shape_3d=1"
+
+PERCENTILES = (50, 95, 99)
+
+
+def parse_mix(value: str) -> Dict[str, float]:
+    """
+    Разбор смеси запросов вида name=weight,name=weight.
+    """
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name not in SCENARIOS:
+            raise ValueError(f"Неизвестный тип запроса: {name} (доступны: {', '.join(SCENARIOS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def free_port() -> int:
+    """
+    Свободный TCP-порт на localhost.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(port: int, workers: int, env: Dict[str, str]) -> subprocess.Popen:
+    """
+    Запуск api.py через uvicorn в отдельном процессе.
+
+    Сервер не запускается в процессе генератора нагрузки: они делили бы GIL,
+    и генератор искажал бы измеряемые задержки.
+    """
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    return subprocess.Popen([sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1",
+                             "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+                            cwd=cwd, env=dict(os.environ, **env), stdout=subprocess.DEVNULL)
+
+
+class Client:
+    """
+    HTTP-клиент с постоянным соединением на каждый поток.
+    """
+    def __init__(self, url: str, accept_encoding: Optional[str], timeout: float):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.https = parts.scheme == "https"
+        self.prefix = parts.path.rstrip("/")
+        self.accept_encoding = accept_encoding
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> http.client.HTTPConnection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            factory = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            connection = self._local.connection = factory(self.host, self.port, timeout=self.timeout)
+        return connection
+
+    def request(self, method: str, path: str, body: Optional[Dict[str, Any]] = None,
+                decode: bool = False) -> Tuple[int, bytes]:
+        """
+        Запрос; возвращает код ответа и тело. При разрыве соединения повторяется один раз.
+
+        Тело возвращается как пришло по сети (возможно, сжатым), а с decode=True -- распакованным.
+        """
+        headers = {"Accept": "*/*"}
+        if self.accept_encoding:
+            headers["Accept-Encoding"] = self.accept_encoding
+        data = None
+        if body is not None:
+            data = json.dumps(body).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(method, self.prefix + path, body=data, headers=headers)
+                response = connection.getresponse()
+                data = response.read()
+                if decode and response.getheader("Content-Encoding") == "gzip":
+                    data = gzip.decompress(data)
+                return response.status, data
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+        raise RuntimeError("unreachable")
+
+
+def wait_ready(client: Client, timeout: float, server: Optional[subprocess.Popen]) -> None:
+    """
+    Ожидание ответа /status.
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server is not None and server.poll() is not None:
+            raise RuntimeError(f"Сервер завершился с кодом {server.returncode}")
+        try:
+            if client.request("GET", "/status")[0] == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Сервер не ответил за {timeout:.0f} с")
+
+
+def prepare(client: Client, mix: Dict[str, float], args: argparse.Namespace) -> Dict[str, str]:
+    """
+    Результаты, к которым обращаются запросы visualize и limit-shape.
+    """
+    context = {}
+    for dimension in ("2d", "3d"):
+        if not any(f"{{result_{dimension}}}" in SCENARIOS[name][1] for name in mix):
+            continue
+        status, body = client.request("POST", f"/simulate/{dimension}",
+                                      {"steps": args.prepare_steps, "alpha": 1.0, "runs": args.runs, "seed": 1},
+                                      decode=True)
+        if status != 200:
+            raise RuntimeError(f"Не удалось подготовить результат {dimension}: {status} {body[:200]!r}")
+        context[f"result_{dimension}"] = json.loads(body)["result_id"]
+    return context
+
+
+def simulate_body(args: argparse.Namespace, rng: random.Random) -> Dict[str, Any]:
+    """
+    Тело запроса simulate: с --fresh каждый запрос считается заново, иначе может быть ответом из кэша.
+    """
+    body = {"steps": args.steps, "alpha": 1.0, "runs": args.runs}
+    if args.fresh:
+        body["seed"] = rng.randrange(2 ** 62)
+    return body
+
+
+def run_load(client: Client, mix: Dict[str, float], context: Dict[str, str],
+             args: argparse.Namespace) -> Tuple[List[Dict[str, Any]], float]:
+    """
+    Подача запросов по расписанию: rate запросов в секунду в течение duration секунд.
+
+    Возвращает:
+    --------
+    Tuple[List[Dict[str, Any]], float]
+        Записи по запросам и фактическая длительность теста в секундах.
+    """
+    rng = random.Random(args.seed)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    total = int(args.rate * args.duration)
+    records: List[Dict[str, Any]] = []
+    lock = threading.Lock()
+
+    def execute(name: str, scheduled: float, body: Optional[Dict[str, Any]]) -> None:
+        method, path, _ = SCENARIOS[name]
+        sent = time.perf_counter()
+        try:
+            status, data = client.request(method, path.format(**context), body)
+            error = None if status < 400 else f"HTTP {status}"
+            size = len(data)
+        except Exception as e:
+            status, error, size = None, f"{type(e).__name__}: {e}", 0
+        finished = time.perf_counter()
+        with lock:
+            records.append({"name": name, "status": status, "error": error, "bytes": size,
+                            "latency": finished - scheduled, "service": finished - sent, "finished": finished})
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        for index in range(total):
+            scheduled = started + index / args.rate
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            name = rng.choices(names, weights)[0]
+            body = simulate_body(args, rng) if SCENARIOS[name][2] else None
+            pool.submit(execute, name, scheduled, body)
+    return records, time.perf_counter() - started
+
+
+def summarize(records: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    """
+    Пропускная способность, ошибки и процентили задержки (в миллисекундах) по записям запросов.
+    """
+    def distribution(values: List[float]) -> Dict[str, float]:
+        if not values:
+            return {}
+        array = np.asarray(values) * 1000
+        stats = {f"p{q}": float(np.percentile(array, q)) for q in PERCENTILES}
+        stats.update(mean=float(array.mean()), max=float(array.max()))
+        return stats
+
+    ok = [record for record in records if record["error"] is None]
+    status_codes: Dict[str, int] = {}
+    for record in records:
+        key = str(record["status"]) if record["status"] is not None else "error"
+        status_codes[key] = status_codes.get(key, 0) + 1
+    return {
+        "requests": len(records),
+        "errors": len(records) - len(ok),
+        "error_rate": (len(records) - len(ok)) / len(records) if records else 0.0,
+        "throughput_rps": len(ok) / elapsed if elapsed > 0 else 0.0,
+        "status_codes": status_codes,
+        "latency_ms": distribution([record["latency"] for record in ok]),
+        "service_ms": distribution([record["service"] for record in ok]),
+        "bytes_mean": float(np.mean([record["bytes"] for record in ok])) if ok else 0.0,
+        "sample_errors": sorted({record["error"] for record in records if record["error"]})[:5],
+    }
+
+
+def git_commit() -> Optional[str]:
+    """
+    Текущий коммит репозитория, если он доступен.
+    """
+    try:
+        completed = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return completed.stdout.strip() or None
+
+
+def build_report(records: List[Dict[str, Any]], elapsed: float, args: argparse.Namespace,
+                 mix: Dict[str, float], url: str) -> Dict[str, Any]:
+    """
+    Отчёт: условия теста, итог и показатели по каждому типу запроса.
+    """
+    return {
+        "version": REPORT_VERSION,
+        "label": args.label,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": git_commit(),
+        "machine": {"platform": platform.platform(), "python": platform.python_version(),
+                    "cpu_count": os.cpu_count()},
+        "target": url,
+        "config": {"rate": args.rate, "duration": args.duration, "concurrency": args.concurrency,
+                   "mix": mix, "fresh": args.fresh, "steps": args.steps, "runs": args.runs,
+                   "workers": args.workers if not args.url else None, "seed": args.seed,
+                   "accept_encoding": args.accept_encoding},
+        "duration_seconds": elapsed,
+        "summary": summarize(records, elapsed),
+        "endpoints": {name: summarize([record for record in records if record["name"] == name], elapsed)
+                      for name in mix},
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    """
+    Таблица показателей по типам запросов.
+    """
+    print(f"{'запрос':<22} {'число':>6} {'ошибки':>6} {'rps':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    rows = list(report["endpoints"].items()) + [("всего", report["summary"])]
+    for name, stats in rows:
+        latency = stats["latency_ms"]
+        print(f"{name:<22} {stats['requests']:>6} {stats['errors']:>6} {stats['throughput_rps']:>7.2f} "
+              + " ".join(f"{latency.get(f'p{q}', float('nan')):>9.1f}" for q in PERCENTILES))
+    for name, stats in report["endpoints"].items():
+        for error in stats["sample_errors"]:
+            print(f"    {name}: {error}")
+
+
+def compare_reports(report: Dict[str, Any], baseline: Dict[str, Any], max_regression: float,
+                    min_delta_ms: float) -> Tuple[List[str], List[str]]:
+    """
+    Регрессии относительно сохранённого отчёта.
+
+    Процентиль p95 или p99 считается регрессией, если он вырос больше чем в
+    1 + max_regression раз и больше чем на min_delta_ms; доля ошибок -- если
+    она выросла больше чем на один процентный пункт.
+
+    Возвращает:
+    --------
+    Tuple[List[str], List[str]]
+        Регрессии и предупреждения о несопоставимых условиях тестов.
+    """
+    problems, warnings = [], []
+    for key in ("mix", "rate", "steps", "runs", "fresh"):
+        if baseline.get("config", {}).get(key) != report["config"][key]:
+            warnings.append(f"предупреждение: отчёты сняты с разным значением {key}")
+    if baseline.get("machine") != report["machine"]:
+        warnings.append("предупреждение: отчёты сняты на разных машинах")
+    for name, stats in report["endpoints"].items():
+        old = baseline.get("endpoints", {}).get(name)
+        if not old or not old["latency_ms"] or not stats["latency_ms"]:
+            continue
+        for q in ("p95", "p99"):
+            before, after = old["latency_ms"][q], stats["latency_ms"][q]
+            if after > before * (1 + max_regression) and after - before > min_delta_ms:
+                problems.append(f"{name}: {q} {before:.1f} -> {after:.1f} ms")
+        if stats["error_rate"] > old["error_rate"] + 0.01:
+            problems.append(f"{name}: доля ошибок {old['error_rate']:.1%} -> {stats['error_rate']:.1%}")
+    return problems, warnings
+
+
+def main():
+    """
+    Нагрузочный тест: подготовка, подача запросов, отчёт и сравнение с базовым.
+    """
+    parser = argparse.ArgumentParser(description='Нагрузочный тест API симуляций')
+    parser.add_argument('--url', type=str, default=None,
+                      help='Адрес запущенного API; по умолчанию api.py запускается на свободном порту')
+    parser.add_argument('--workers', type=int, default=1,
+                      help='Число процессов uvicorn при запуске API (по умолчанию: 1)')
+    parser.add_argument('--mix', type=str, default=DEFAULT_MIX,
+                      help=f'Смесь запросов name=weight через запятую (по умолчанию: {DEFAULT_MIX}); '
+                           f'доступны: {", ".join(SCENARIOS)}')
+    parser.add_argument('--rate', type=float, default=10.0,
+                      help='Частота запросов в секунду (по умолчанию: 10)')
+    parser.add_argument('--duration', type=float, default=20.0,
+                      help='Длительность подачи запросов в секундах (по умолчанию: 20)')
+    parser.add_argument('--concurrency', type=int, default=32,
+                      help='Наибольшее число одновременных запросов (по умолчанию: 32)')
+    parser.add_argument('--steps', type=int, default=100,
+                      help='Число шагов в запросах simulate (по умолчанию: 100)')
+    parser.add_argument('--runs', type=int, default=2,
+                      help='Число запусков в запросах simulate (по умолчанию: 2)')
+    parser.add_argument('--prepare-steps', type=int, default=500,
+                      help='Число шагов результатов для visualize и limit-shape (по умолчанию: 500)')
+    parser.add_argument('--fresh', action='store_true',
+                      help='Новое зерно в каждом запросе simulate, чтобы он не обслуживался из кэша')
+    parser.add_argument('--accept-encoding', type=str, default='gzip',
+                      help='Заголовок Accept-Encoding запросов; пустая строка -- без сжатия (по умолчанию: gzip)')
+    parser.add_argument('--timeout', type=float, default=120.0,
+                      help='Таймаут одного запроса в секундах (по умолчанию: 120)')
+    parser.add_argument('--seed', type=int, default=0,
+                      help='Зерно выбора запросов из смеси (по умолчанию: 0)')
+    parser.add_argument('--label', type=str, default=None, help='Метка отчёта')
+    parser.add_argument('--output', type=str, default=None, help='Файл для сохранения отчёта JSON')
+    parser.add_argument('--baseline', type=str, default=None,
+                      help='Отчёт JSON для сравнения; при регрессии код возврата 1')
+    parser.add_argument('--max-regression', type=float, default=0.25,
+                      help='Допустимый относительный рост p95/p99 (по умолчанию: 0.25)')
+    parser.add_argument('--min-delta-ms', type=float, default=5.0,
+                      help='Рост задержки меньше этого значения не считается регрессией (по умолчанию: 5)')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    server = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        # Отдельное хранилище в памяти: тест не смешивается с сохранёнными результатами
+        server = start_server(port, args.workers, {"YOUNG_RESULT_STORE": os.environ.get("YOUNG_RESULT_STORE",
+                                                                                          "memory://")})
+    client = Client(url, args.accept_encoding or None, args.timeout)
+
+    try:
+        wait_ready(client, 60.0, server)
+        context = prepare(client, mix, args)
+        print(f"Нагрузка на {url}: {args.rate:g} запросов/с в течение {args.duration:g} с")
+        records, elapsed = run_load(client, mix, context, args)
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+
+    report = build_report(records, elapsed, args, mix, url)
+    print_report(report)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Отчёт сохранён в {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems, warnings = compare_reports(report, baseline, args.max_regression, args.min_delta_ms)
+        for line in warnings + problems:
+            print(line)
+        if problems:
+            print(f"Регрессия относительно {args.baseline}")
+            sys.exit(1)
+        print(f"Регрессий относительно {args.baseline} нет")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Объединение частей ансамбля, посчитанных независимыми задачами, в один результат.
+
+Части -- бинарные файлы результатов (.ydr) или текстовые файлы *_cells.txt.
+Проверяется, что у них одна размерность и одни steps, alpha (beta, gamma) и
+версия движка, а зёрна различаются; количества ячеек и числа запусков
+складываются. Слияние идёт порциями, поэтому части не загружаются в память
+целиком. В заголовок результата записывается происхождение: пути, зёрна и
+запуски частей.
+
+    python merge_results.py shards/*.ydr -o merged.ydr
+    python merge_results.py results_2d/*_cells.txt -o merged.ydr --cells-txt merged_cells.txt
+"""
+import argparse
+import os
+import sys
+import time
+from typing import List, Optional
+
+from common.merge import merge_shards
+from common.result_file import LAYOUTS, open_result_file
+
+
+def write_cells_text(path: str, cells_path: str, chunk_cells: int) -> None:
+    """
+    Запись объединённого результата в текстовом формате save_cells_to_file (порциями).
+    """
+    with open(cells_path, "w") as f:
+        for coords, counts in open_result_file(path).iter_chunks(chunk_cells):
+            rows = [",".join(map(str, cell)) + f",{count}\n" for cell, count in zip(coords.tolist(), counts.tolist())]
+            f.writelines(rows)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Основная функция объединения частей.
+    """
+    parser = argparse.ArgumentParser(description="Объединение частей ансамбля в один результат")
+    parser.add_argument("shards", nargs="+", help="Файлы частей (.ydr или *_cells.txt)")
+    parser.add_argument("-o", "--output", required=True, help="Путь к объединённому файлу .ydr")
+    parser.add_argument("--chunk-cells", type=int, default=1 << 20,
+                        help="Размер порции чтения каждой части в ячейках (по умолчанию: 1048576)")
+    parser.add_argument("--layout", choices=("auto",) + LAYOUTS, default="sparse",
+                        help="Раскладка результата; всё, кроме sparse, перезаписывает результат в памяти "
+                             "(по умолчанию: sparse)")
+    parser.add_argument("--allow-duplicate-seeds", action="store_true",
+                        help="Разрешить части с одинаковым зерном")
+    parser.add_argument("--cells-txt", type=str, default=None,
+                        help="Также записать результат в текстовом формате *_cells.txt")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    try:
+        header = merge_shards(args.shards, args.output, chunk_cells=args.chunk_cells, layout=args.layout,
+                              allow_duplicate_seeds=args.allow_duplicate_seeds)
+    except ValueError as e:
+        print(f"Ошибка: {e}", file=sys.stderr)
+        return 1
+    if args.cells_txt:
+        write_cells_text(args.output, args.cells_txt, args.chunk_cells)
+
+    params = header["params"]
+    print(f"Объединено частей: {len(args.shards)} -> {args.output} "
+          f"({os.path.getsize(args.output)} байт, {time.perf_counter() - started:.2f} с)")
+    print(f"{header['dimension']}D, steps={params.get('steps')}, alpha={params.get('alpha')}, "
+          f"запусков: {header['runs_completed']}, ячеек: {header['cells']}, "
+          f"статистика высот: {header['provenance']['heights']}")
+    if header["truncated"]:
+        print(f"Среди частей есть остановленные досрочно: {header['stop_reason']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -3,8 +3,14 @@
 Скрипт для запуска 2D симуляций диаграмм Юнга.
 """
 import os
+import signal
+import contextlib
+import time
 import argparse
 from diagrams2d import DiagramSimulator2D
+from common.cancellation import CancellationToken, SimulationBudget
+from common.profiling import PROFILE_TOP, PROFILERS, JobProfiler
+from common.rendering import VISUALIZATIONS, render_batch, report, visualization_tasks
 
 
 def main():
@@ -20,6 +26,17 @@ def main():
                       help='Количество запусков симуляции (по умолчанию: 10)')
     parser.add_argument('--output-dir', type=str, default='results_2d',
                       help='Директория для сохранения выходных файлов (по умолчанию: results_2d)')
+    parser.add_argument('--time-budget', type=float, default=None,
+                      help='Ограничение времени симуляции в секундах (по умолчанию: без ограничения)')
+    parser.add_argument('--profile', type=str, choices=list(PROFILERS), default=None,
+                      help='Выполнить симуляцию под профилировщиком (cprofile -- детерминированный, '
+                           'sampling -- выборочный) и сохранить профиль рядом с результатами')
+    parser.add_argument('--profile-top', type=int, default=PROFILE_TOP,
+                      help=f'Число функций в сводке профиля (по умолчанию: {PROFILE_TOP})')
+    parser.add_argument('--workers', type=int, default=0,
+                      help='Число процессов для рисования визуализаций (по умолчанию: 0 -- по числу ядер)')
+    parser.add_argument('--show', action='store_true',
+                      help='Показывать визуализации в окнах по очереди вместо параллельного рисования в файлы')
     
     args = parser.parse_args()
     
@@ -30,9 +47,21 @@ def main():
     print(f"Шагов на симуляцию: {args.steps}")
     print(f"Количество запусков: {args.runs}")
     
-    # Создаем и запускаем симулятор
+    # Ctrl+C останавливает симуляцию после текущей порции шагов, результаты сохраняются
+    token = CancellationToken()
+    signal.signal(signal.SIGINT, lambda signum, frame: token.cancel())
+    budget = SimulationBudget(time_limit=args.time_budget, token=token)
+    
+    # Создаем и запускаем симулятор (при --profile -- под профилировщиком)
     simulator = DiagramSimulator2D()
-    simulator.simulate(n_steps=args.steps, alpha=args.alpha, runs=args.runs)
+    profiler = JobProfiler(args.profile) if args.profile else contextlib.nullcontext()
+    with profiler:
+        simulator.simulate(n_steps=args.steps, alpha=args.alpha, runs=args.runs, budget=budget)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    
+    if simulator.truncated:
+        print(f"Симуляция остановлена досрочно ({simulator.stop_reason}), "
+              f"завершено запусков: {simulator.runs_completed} из {args.runs}")
     
     # Базовое имя файла для выходных данных
     base_filename = f"{args.output_dir}/young_diagram_2d_alpha_{args.alpha}"
@@ -42,15 +71,29 @@ def main():
     
     # Сохраняем количество ячеек в файл
     simulator.save_cells(f"{base_filename}_cells.txt")
+    # И в бинарном формате с параметрами симуляции
+    simulator.save_result(f"{base_filename}_cells.ydr")
+    if args.profile:
+        paths = profiler.save(base_filename, args.profile_top)
+        print(f"Профиль симуляции ({args.profile}, {profiler.elapsed:.2f} с): {', '.join(paths)}")
     
-    # Генерируем визуализации
+    # Генерируем визуализации: накопленная диаграмма и предельная форма
     print("Генерация визуализаций...")
+    visualizations = ['heatmap', 'limit_shape']
     
-    # Накопленная диаграмма
-    simulator.visualize(filename=f"{base_filename}_heatmap.png")
-    
-    # Предельная форма
-    simulator.limit_shape_visualize(filename=f"{base_filename}_limit_shape.png")
+    if args.show:
+        # Интерактивно: окна по очереди в текущем процессе
+        import matplotlib.pyplot as plt
+        methods = {name: getattr(simulator, VISUALIZATIONS[2][name][0]) for name in visualizations}
+        for name, filename, options in visualization_tasks(2, base_filename, visualizations):
+            methods[name](filename=filename, **options)
+            plt.close('all')
+    else:
+        # Без экрана: Agg, визуализации параллельно из общего файла результата
+        started = time.perf_counter()
+        records = render_batch(f"{base_filename}_cells.ydr", 2,
+                               visualization_tasks(2, base_filename, visualizations), workers=args.workers)
+        report(records, time.perf_counter() - started)
     
     print("Готово!")
     
@@ -0,0 +1,82 @@
+"""
+Решения контроля допуска и подстройка под задержку дешёвых запросов (запуск из backend: python -m pytest tests).
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.admission import (ADMIT, CHEAP, DOWNGRADE, EXPENSIVE, QUEUE, REJECT, AdmissionController,
+                              CostModel)
+
+IDLE = {"limit": 1, "in_flight": 0, "held": 0, "running_cost": 0.0, "held_cost": 0.0}
+
+
+def busy(seconds):
+    # Одна выполняющаяся дорогая задача и ожидающие общей стоимостью seconds
+    return {"limit": 1, "in_flight": 1, "held": 1, "running_cost": 0.0, "held_cost": seconds}
+
+
+@pytest.fixture
+def admission():
+    return AdmissionController(CostModel(), workers=2, cheap_seconds=2.0, max_queue_wait=60.0, target_latency=1.0)
+
+
+def test_cheap_request_is_admitted(admission):
+    decision = admission.decide(2, 100, 1, busy(1000))
+    assert decision.action == ADMIT
+    assert decision.lane == CHEAP
+    assert decision.estimate <= admission.cheap_seconds
+
+
+def test_expensive_request_lanes(admission):
+    steps = 5000
+    assert admission.decide(2, steps, 10, IDLE).action == ADMIT
+    assert admission.decide(2, steps, 10, IDLE).lane == EXPENSIVE
+    assert admission.decide(2, steps, 10, busy(30)).action == QUEUE
+
+
+def test_overloaded_lane_rejects_with_retry_after(admission):
+    decision = admission.decide(2, 5000, 10, busy(200))
+    assert decision.action == REJECT
+    assert decision.retry_after == pytest.approx(200 - admission.max_queue_wait)
+    # Без права на отказ запрос ставится в очередь
+    assert admission.decide(2, 5000, 10, busy(200), allow_reject=False).action == QUEUE
+
+
+def test_downgrade_fits_cheap_budget(admission):
+    decision = admission.decide(3, 3000, 10, busy(200), allow_downgrade=True)
+    assert decision.action == DOWNGRADE
+    assert decision.lane == CHEAP
+    assert decision.runs <= 10 and decision.steps <= 3000
+    assert decision.estimate <= admission.cheap_seconds
+    assert admission.stats[DOWNGRADE] == 1
+
+
+def test_latency_adaptation_on_small_pool(admission):
+    # При двух процессах полосу дорогих задач сузить некуда: снижается порог дешёвых запросов
+    assert admission.expensive_limit == 1
+    for _ in range(20):
+        admission.observe_latency(CHEAP, 5.0)
+    assert admission.expensive_limit == 1
+    assert admission.cheap_seconds == 1.0
+    for _ in range(200):
+        admission.observe_latency(CHEAP, 5.0)
+    assert admission.cheap_seconds == admission.base_cheap_seconds / 8
+
+    # Окно p99 сначала вытесняет прежние задержки, затем порог растёт по шагу на окно
+    for _ in range(600):
+        admission.observe_latency(CHEAP, 0.1)
+    assert admission.cheap_seconds == admission.base_cheap_seconds
+
+
+def test_latency_adaptation_narrows_lane_first():
+    admission = AdmissionController(CostModel(), workers=4, cheap_seconds=2.0, target_latency=1.0)
+    for _ in range(41):
+        admission.observe_latency(CHEAP, 5.0)
+    assert (admission.expensive_limit, admission.cheap_seconds) == (1, 2.0)
+    # Задержки дорогих задач не учитываются
+    admission.observe_latency(EXPENSIVE, 100.0)
+    assert admission.cheap_p99() == 5.0
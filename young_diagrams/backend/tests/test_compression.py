@@ -0,0 +1,82 @@
+"""
+ETag, 304 и сжатие ответов по Accept-Encoding (запуск из backend: python -m pytest tests).
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# Хранилище в памяти: проверки не пишут в каталог результатов
+os.environ.setdefault("YOUNG_RESULT_STORE", "memory://")
+
+from fastapi.testclient import TestClient
+
+import api
+from common.compression import choose_encoding, encoded_etag, etag_matches
+from common.encoding import decode_binary
+from diagrams2d.simulator import DiagramSimulator2D
+
+
+@pytest.fixture(scope="module")
+def client():
+    simulator = DiagramSimulator2D()
+    simulator.simulate(n_steps=500, alpha=1.0, runs=2, seed=5)
+    result = simulator.get_result()
+    result.result_id = "compression-test"
+    api.result_cache.put(result.result_id, result)
+    return TestClient(api.app), result
+
+
+def get(client, **headers):
+    return client.get("/results/compression-test?format=binary", headers=headers)
+
+
+def test_gzip_response_has_own_etag(client):
+    client, result = client
+    plain = get(client, **{"Accept-Encoding": "identity"})
+    gzipped = get(client, **{"Accept-Encoding": "gzip"})
+
+    assert plain.status_code == gzipped.status_code == 200
+    assert "content-encoding" not in plain.headers
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzipped.headers["etag"] == encoded_etag(plain.headers["etag"], "gzip")
+    assert "Accept-Encoding" in gzipped.headers["vary"]
+    # Клиент распаковывает тело: содержимое совпадает с несжатым
+    assert gzipped.content == plain.content
+    assert decode_binary(plain.content)["n"] == result.size
+
+
+def test_if_none_match_returns_304(client):
+    client, _ = client
+    first = get(client, **{"Accept-Encoding": "gzip"})
+    etag = first.headers["etag"]
+
+    again = get(client, **{"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+    assert not again.content
+
+    # Сравнение слабое: ETag сжатого представления подходит и для несжатого запроса
+    plain = get(client, **{"Accept-Encoding": "identity", "If-None-Match": f"W/{etag}"})
+    assert plain.status_code == 304
+
+    other = get(client, **{"Accept-Encoding": "gzip", "If-None-Match": '"other"'})
+    assert other.status_code == 200
+
+
+def test_choose_encoding():
+    assert choose_encoding(None) is None
+    assert choose_encoding("identity") is None
+    assert choose_encoding("gzip, deflate") == "gzip"
+    assert choose_encoding("gzip;q=0") is None
+    assert choose_encoding("*") in ("br", "gzip")
+
+
+def test_etag_matches():
+    etag = '"abc"'
+    assert etag_matches(None, etag) is None
+    assert etag_matches('"abc-gzip"', etag) == '"abc-gzip"'
+    assert etag_matches('"x", W/"abc"', etag) == 'W/"abc"'
+    assert etag_matches("*", etag) == etag
+    assert etag_matches('"abd"', etag) is None
@@ -0,0 +1,61 @@
+"""
+Колоночные форматы ответа: бинарный формат и раскладка по строкам (запуск из backend: python -m pytest tests).
+"""
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.encoding import decode_binary, encode_result, grid_layout
+from common.result import SimulationResult
+from diagrams2d.simulator import DiagramSimulator2D
+from diagrams3d.simulator import DiagramSimulator3D
+
+
+def simulated(simulator, steps=300, runs=3, seed=1):
+    simulator.simulate(n_steps=steps, alpha=1.0, runs=runs, seed=seed)
+    return simulator.get_result()
+
+
+@pytest.mark.parametrize("simulator", [DiagramSimulator2D, DiagramSimulator3D])
+def test_binary_round_trip(simulator):
+    result = simulated(simulator())
+    decoded = decode_binary(encode_result(result, "binary", extra={"result_id": "r1"}))
+
+    assert decoded["dimension"] == result.dimension
+    assert decoded["n"] == result.size
+    assert decoded["max_count"] == result.max_count
+    assert decoded["runs_completed"] == result.runs_completed
+    assert decoded["result_id"] == "r1"
+    coords = np.stack([decoded[axis] for axis in "xyz"[:result.dimension]], axis=1)
+    assert np.array_equal(coords, result.coords)
+    assert np.array_equal(decoded["count"], result.counts)
+
+
+def test_columnar_json_matches_binary():
+    result = simulated(DiagramSimulator2D())
+    columnar = json.loads(encode_result(result, "columnar"))
+    binary = decode_binary(encode_result(result, "binary"))
+    for name in ("x", "y", "count"):
+        assert columnar[name] == binary[name].tolist()
+
+
+def test_grid_layout_restores_cells():
+    result = simulated(DiagramSimulator2D())
+    decoded = decode_binary(encode_result(result, "binary", layout="grid"))
+    assert decoded["layout"] == "grid"
+
+    # Строка y занимает ячейки x = 0 .. row_lengths[y] - 1, количества идут по строкам
+    cells = [(x, y) for y, length in enumerate(decoded["row_lengths"]) for x in range(length)]
+    assert dict(zip(cells, decoded["counts"].tolist())) == result.to_counts()
+
+
+def test_grid_layout_needs_2d():
+    with pytest.raises(ValueError):
+        grid_layout(simulated(DiagramSimulator3D(), steps=50, runs=1))
+    empty = SimulationResult.from_counts({}, 2, {"steps": 0, "runs": 1})
+    assert grid_layout(empty)["row_lengths"].size == 0
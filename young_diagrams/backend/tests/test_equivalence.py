@@ -0,0 +1,37 @@
+"""
+Объединение редких исходов в критерии хи-квадрат (запуск из backend: python -m pytest tests).
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+from scipy import stats
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.equivalence import MIN_EXPECTED, pooled_chisquare
+
+
+def test_pools_until_every_bin_is_large():
+    # 1 + 2 -> 3, 3 + 3 -> 6, 4 + 6 -> 10: остаются исходы 7, 10, 50, 100
+    expected = np.array([100.0, 4.0, 1.0, 50.0, 7.0, 3.0, 2.0])
+    observed = np.array([96.0, 7.0, 0.0, 52.0, 5.0, 4.0, 3.0])
+    p_value, dof = pooled_chisquare(observed, expected)
+
+    pooled_expected = np.array([7.0, 10.0, 50.0, 100.0])
+    pooled_observed = np.array([5.0, 7.0 + 0.0 + 4.0 + 3.0, 52.0, 96.0])
+    assert dof == 3
+    assert p_value == pytest.approx(stats.chisquare(pooled_observed, pooled_expected).pvalue)
+
+
+def test_no_pooling_when_all_bins_are_large():
+    expected = np.array([10.0, 20.0, 30.0])
+    observed = np.array([12.0, 18.0, 30.0])
+    assert pooled_chisquare(observed, expected) == pytest.approx(
+        (stats.chisquare(observed, expected).pvalue, 2))
+
+
+def test_everything_rare_gives_single_bin():
+    expected = np.full(4, MIN_EXPECTED / 8)
+    assert pooled_chisquare(np.ones(4), expected) == (1.0, 0)
@@ -0,0 +1,62 @@
+"""
+Объединение статистик функции высоты против одного прохода (запуск из backend: python -m pytest tests).
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.heights import HeightStatistics
+
+
+def random_heights(rng, dimension):
+    # Запуски разной протяжённости: сетки разной формы
+    shape = tuple(rng.integers(1, 12, size=dimension - 1))
+    return rng.integers(0, 20, size=shape).astype(np.float64)
+
+
+def padded(runs, dimension):
+    shape = tuple(max(run.shape[axis] for run in runs) for axis in range(dimension - 1))
+    return np.stack([np.pad(run, [(0, size - n) for size, n in zip(shape, run.shape)]) for run in runs])
+
+
+@pytest.mark.parametrize("dimension", [2, 3])
+def test_merge_matches_single_pass(dimension):
+    rng = np.random.default_rng(dimension)
+    runs = [random_heights(rng, dimension) for _ in range(30)]
+
+    single = HeightStatistics(dimension)
+    for heights in runs:
+        single.add(heights)
+
+    # Части разного размера, включая пустую
+    merged = HeightStatistics(dimension)
+    for part in np.split(np.arange(len(runs)), [0, 4, 5, 17]):
+        stats = HeightStatistics(dimension)
+        for index in part:
+            stats.add(runs[index])
+        merged = merged.merge(stats)
+
+    assert merged.runs == single.runs == len(runs)
+    assert merged.mean.shape == single.mean.shape
+    assert np.allclose(merged.mean, single.mean)
+    assert np.allclose(merged.m2, single.m2)
+
+    stacked = padded(runs, dimension)
+    assert np.allclose(single.mean, stacked.mean(axis=0))
+    assert np.allclose(single.variance, stacked.var(axis=0, ddof=1))
+
+
+def test_merge_keeps_operands():
+    a, b = HeightStatistics(2), HeightStatistics(2)
+    a.add(np.array([1.0, 2.0]))
+    b.add(np.array([3.0]))
+    merged = a.merge(b)
+    merged.mean[0] = -1
+    assert a.mean.tolist() == [1.0, 2.0] and b.mean.tolist() == [3.0]
+
+    with pytest.raises(ValueError):
+        a.merge(HeightStatistics(3))
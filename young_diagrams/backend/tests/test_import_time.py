@@ -0,0 +1,19 @@
+"""
+Время запуска API и CLI в пределах бюджета (запуск из backend: python -m pytest tests).
+"""
+import os
+import sys
+
+import pytest
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+from common.import_time import DEFAULT_BUDGETS, check_import
+
+
+@pytest.mark.parametrize("module", sorted(DEFAULT_BUDGETS))
+def test_import_time_within_budget(module):
+    elapsed, eager = check_import(module, BACKEND)
+    assert not eager, f"{module}: при старте загружены {', '.join(eager)}"
+    assert elapsed <= DEFAULT_BUDGETS[module], f"{module}: {elapsed:.1f} ms, бюджет {DEFAULT_BUDGETS[module]} ms"
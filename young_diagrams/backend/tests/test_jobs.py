@@ -0,0 +1,53 @@
+"""
+Регрессионные проверки очереди задач (запуск из backend: python -m pytest tests).
+"""
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.jobs import JOB_CANCELLED, JobManager
+
+# Долгая задача: занимает процесс пула до отмены
+LONG_PARAMS = {"steps": 10 ** 7, "alpha": 1.0, "runs": 1, "seed": 0}
+
+
+def stop(manager: JobManager) -> None:
+    # Выполняющиеся задачи дожидаются отмены, пока менеджер событий ещё доступен
+    for job in list(manager.jobs.values()):
+        manager.cancel(job.id)
+        asyncio.run(manager.wait(job, timeout=30))
+    manager.shutdown()
+
+
+def test_wait_on_cancelled_queued_job():
+    manager = JobManager(max_workers=1)
+    try:
+        # Первые задачи ProcessPoolExecutor сразу передаёт процессам, последняя остаётся в очереди
+        jobs = [manager.submit(2, LONG_PARAMS) for _ in range(4)]
+        queued = jobs[-1]
+        manager.cancel(queued.id)
+        assert queued.future.cancelled()
+
+        waited = asyncio.run(manager.wait(queued, timeout=2))
+        assert waited is queued
+        assert queued.status == JOB_CANCELLED
+        assert queued.result is None
+    finally:
+        stop(manager)
+
+
+def test_wait_on_cancelled_held_job():
+    manager = JobManager(max_workers=1)
+    manager.set_lane_limit("expensive", 1)
+    try:
+        running = manager.submit(2, LONG_PARAMS, lane="expensive")
+        held = manager.submit(2, LONG_PARAMS, lane="expensive")
+        manager.cancel(held.id)
+
+        asyncio.run(manager.wait(held, timeout=2))
+        assert held.status == JOB_CANCELLED
+        assert running.status != JOB_CANCELLED
+    finally:
+        stop(manager)
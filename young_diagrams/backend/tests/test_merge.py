@@ -0,0 +1,65 @@
+"""
+Объединение частей ансамбля против суммы количеств (запуск из backend: python -m pytest tests).
+"""
+import os
+import sys
+from collections import Counter
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.heights import HeightStatistics
+from common.merge import merge_shards
+from common.result_file import open_result_file, write_result_file
+from diagrams2d.simulator import DiagramSimulator2D
+from diagrams3d.simulator import DiagramSimulator3D
+
+
+def write_shards(simulator, directory, seeds, layouts):
+    results, paths = [], []
+    for seed, layout in zip(seeds, layouts):
+        sim = simulator()
+        sim.simulate(n_steps=200, alpha=1.0, runs=2, seed=seed)
+        result = sim.get_result()
+        path = str(directory / f"shard_{seed}.ydr")
+        write_result_file(result, path, layout)
+        results.append(result)
+        paths.append(path)
+    return results, paths
+
+
+@pytest.mark.parametrize("simulator", [DiagramSimulator2D, DiagramSimulator3D])
+@pytest.mark.parametrize("chunk_cells", [5, 1 << 20])
+def test_merge_sums_counts(simulator, chunk_cells, tmp_path):
+    results, paths = write_shards(simulator, tmp_path, [1, 2, 3], ["sparse", "columns", "dense"])
+    output = str(tmp_path / "merged.ydr")
+    header = merge_shards(paths, output, chunk_cells=chunk_cells)
+
+    expected = Counter()
+    for result in results:
+        expected.update(result.to_counts())
+    merged = open_result_file(output).to_result()
+    assert merged.to_counts() == dict(expected)
+    assert header["cells"] == len(expected)
+    assert merged.runs_completed == sum(result.runs_completed for result in results)
+    assert merged.params["runs"] == sum(result.params["runs"] for result in results)
+    # Ячейки объединённого файла отсортированы лексикографически без повторов
+    keys = [tuple(cell) for cell in merged.coords.tolist()]
+    assert keys == sorted(set(keys))
+
+    heights = HeightStatistics(results[0].dimension)
+    for result in results:
+        heights = heights.merge(result.heights)
+    assert merged.heights.runs == heights.runs
+    assert np.allclose(merged.heights.mean, heights.mean)
+    assert np.allclose(merged.heights.m2, heights.m2)
+
+
+def test_merge_rejects_duplicate_seeds(tmp_path):
+    _, paths = write_shards(DiagramSimulator2D, tmp_path, [7], ["sparse"])
+    with pytest.raises(ValueError):
+        merge_shards(paths * 2, str(tmp_path / "merged.ydr"))
+    header = merge_shards(paths * 2, str(tmp_path / "merged.ydr"), allow_duplicate_seeds=True)
+    assert header["max_count"] == 2 * open_result_file(paths[0]).header["max_count"]
@@ -0,0 +1,72 @@
+"""
+Поверхность 3D результата по карте высот (запуск из backend: python -m pytest tests).
+"""
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.mesh import PLANE_AXES, extract_surface, height_map
+from common.result import SimulationResult
+
+
+def plane_partition(heights):
+    return {(x, y, z) for (x, y), h in np.ndenumerate(np.asarray(heights)) for z in range(h)}
+
+
+def unit_faces(surface):
+    # Прямоугольники раскладываются обратно на единичные грани (ось, знак, плоскость, u, v)
+    faces = set()
+    for quad, normal in zip(surface["quads"], surface["normals"]):
+        axis = int(np.flatnonzero(normal)[0])
+        u_axis, v_axis = PLANE_AXES[axis]
+        lo, hi = quad.min(axis=0), quad.max(axis=0)
+        faces |= {(axis, int(normal[axis]), int(lo[axis]), u, v)
+                  for u in range(lo[u_axis], hi[u_axis]) for v in range(lo[v_axis], hi[v_axis])}
+    return faces
+
+
+def exposed_faces(cells):
+    faces = set()
+    for cell in cells:
+        for axis in range(3):
+            u_axis, v_axis = PLANE_AXES[axis]
+            for sign in (-1, 1):
+                neighbour = list(cell)
+                neighbour[axis] += sign
+                if tuple(neighbour) not in cells:
+                    plane = cell[axis] + (1 if sign > 0 else 0)
+                    faces.add((axis, sign, plane, cell[u_axis], cell[v_axis]))
+    return faces
+
+
+def test_surface_matches_exposed_faces():
+    heights = np.array([[4, 3, 3, 1], [3, 3, 2, 0], [2, 1, 1, 0]])
+    cells = plane_partition(heights)
+    counts = {cell: 2 for cell in cells}
+    # Ячейки ниже порога не входят в поверхность
+    counts[(3, 0, 0)] = 1
+    result = SimulationResult.from_counts(counts, 3, {"steps": len(counts), "runs": 2})
+
+    assert (height_map(result, 0.75) == heights).all()
+    surface = extract_surface(height_map(result, 0.75))
+    expected = exposed_faces(cells)
+    assert unit_faces(surface) == expected
+    assert surface["faces"][0] == len(expected)
+    assert len(surface["quads"]) < len(expected)
+
+    quads = surface["quads"].astype(float)
+    outward = np.cross(quads[:, 1] - quads[:, 0], quads[:, 2] - quads[:, 1])
+    assert (np.sign(outward) == surface["normals"]).all()
+
+
+def test_long_thin_result_stays_small():
+    # Три ребра длиной 1500: ограничивающий параллелепипед -- 3.4e9 ячеек
+    n = 1500
+    cells = {(x, 0, 0) for x in range(n)} | {(0, y, 0) for y in range(n)} | {(0, 0, z) for z in range(n)}
+    result = SimulationResult.from_counts({cell: 1 for cell in cells}, 3, {"steps": len(cells), "runs": 1})
+    heights = height_map(result)
+    assert heights.shape == (n, n)
+    assert extract_surface(heights)["faces"][0] == len(exposed_faces(cells))
@@ -0,0 +1,82 @@
+"""
+Запись и чтение файлов результата .ydr во всех раскладках (запуск из backend: python -m pytest tests).
+"""
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.result import SimulationResult
+from common.result_file import LAYOUTS, choose_arrays, layout_nbytes, open_result_file, write_result_file
+from diagrams2d.simulator import DiagramSimulator2D
+from diagrams3d.simulator import DiagramSimulator3D
+
+
+def simulated(simulator, steps=300, runs=3, seed=2):
+    simulator.simulate(n_steps=steps, alpha=1.0, runs=runs, seed=seed)
+    return simulator.get_result()
+
+
+@pytest.fixture(scope="module", params=[DiagramSimulator2D, DiagramSimulator3D])
+def result(request):
+    return simulated(request.param())
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+def test_round_trip(result, layout, tmp_path):
+    path = str(tmp_path / f"result_{layout}.ydr")
+    header = write_result_file(result, path, layout)
+    assert header["layout"] == layout
+    assert header["cells"] == result.size
+
+    loaded = open_result_file(path)
+    assert loaded.layout == layout
+    assert np.array_equal(loaded.coords, result.coords)
+    assert np.array_equal(loaded.counts, result.counts)
+
+    restored = loaded.to_result()
+    assert restored.params == result.params
+    assert restored.runs_completed == result.runs_completed
+    assert restored.heights.runs == result.heights.runs
+    assert np.array_equal(restored.heights.mean, result.heights.mean)
+    assert np.array_equal(restored.heights.m2, result.heights.m2)
+
+
+@pytest.mark.parametrize("layout", LAYOUTS)
+@pytest.mark.parametrize("chunk_cells", [1, 7, 1 << 20])
+def test_iter_chunks(result, layout, chunk_cells, tmp_path):
+    path = str(tmp_path / f"chunks_{layout}.ydr")
+    write_result_file(result, path, layout)
+    chunks = list(open_result_file(path).iter_chunks(chunk_cells))
+
+    assert all(len(coords) == len(counts) for coords, counts in chunks)
+    assert np.array_equal(np.concatenate([coords for coords, _ in chunks]), result.coords)
+    assert np.array_equal(np.concatenate([counts for _, counts in chunks]), result.counts)
+
+
+def test_auto_layout_is_smallest(result, tmp_path):
+    layout, _ = choose_arrays(result)
+    assert layout_nbytes(result, layout) == min(layout_nbytes(result, other) for other in LAYOUTS)
+
+    header = write_result_file(result, str(tmp_path / "auto.ydr"))
+    assert header["layout"] == layout
+
+
+def test_columns_needs_contiguous_columns(tmp_path):
+    # Столбец с пропуском: раскладка columns недоступна, auto выбирает другую
+    result = SimulationResult.from_counts({(0, 0): 1, (0, 2): 1}, 2, {"steps": 1, "runs": 1})
+    with pytest.raises(ValueError):
+        write_result_file(result, str(tmp_path / "gap.ydr"), "columns")
+    assert write_result_file(result, str(tmp_path / "gap.ydr"))["layout"] != "columns"
+
+
+def test_long_thin_result_is_sparse():
+    cells = {}
+    for i in range(1500):
+        cells[(i, 0, 0)] = cells[(0, i, 0)] = cells[(0, 0, i)] = 1
+    result = SimulationResult.from_counts(cells, 3, {"steps": 1, "runs": 1})
+    assert layout_nbytes(result, "dense") > 1000 * layout_nbytes(result, "sparse")
+    assert choose_arrays(result)[0] == "sparse"
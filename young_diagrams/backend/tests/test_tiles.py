@@ -0,0 +1,54 @@
+"""
+Разреженная пирамида плиток против плотного суммирования (запуск из backend: python -m pytest tests).
+"""
+import os
+import random
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.result import SimulationResult
+from common.tiles import CountPyramid
+
+
+def dense_level(cells, dimension, level):
+    shape = tuple(max(c[axis] for c in cells) + 1 for axis in range(dimension))
+    grid = np.zeros(tuple(-(-size // 2 ** level) for size in shape), dtype=np.uint32)
+    for cell, count in cells.items():
+        grid[tuple(v >> level for v in cell)] += count
+    return grid
+
+
+def test_tiles_match_dense_levels():
+    rng = random.Random(3)
+    for dimension in (2, 3):
+        cells = {tuple(rng.randint(0, 60) for _ in range(dimension)): rng.randint(1, 9) for _ in range(300)}
+        result = SimulationResult.from_counts(cells, dimension, {"steps": 1, "runs": 1})
+        pyramid = CountPyramid(result, tile_size=8)
+        for level in range(len(pyramid.levels)):
+            grid = dense_level(cells, dimension, level)
+            assert pyramid.levels[level].shape == grid.shape
+            lo = [rng.randint(0, 30) for _ in range(dimension)]
+            hi = [value + rng.randint(1, 40) for value in lo]
+            seen = set()
+            for index, tile in pyramid.tiles(level, lo, hi):
+                window = tuple(slice(i * 8, i * 8 + 8) for i in index)
+                assert np.array_equal(tile, grid[window])
+                seen.add(index)
+            # Все непустые плитки, пересекающие область, возвращены
+            scale = 2 ** level
+            for cell in zip(*np.nonzero(grid)):
+                if all(l // scale <= c < -(-h // scale) for c, l, h in zip(cell, lo, hi)):
+                    assert tuple(c // 8 for c in cell) in seen
+
+
+def test_long_thin_pyramid_stays_small():
+    cells = {}
+    for i in range(1500):
+        cells[(i, 0, 0)] = cells[(0, i, 0)] = cells[(0, 0, i)] = 1
+    pyramid = CountPyramid(SimulationResult.from_counts(cells, 3, {"steps": 1, "runs": 1}))
+    assert pyramid.levels[0].shape == (1500, 1500, 1500)
+    assert pyramid.nbytes < 1024 * 1024
+    assert sum(int(tile.sum()) for _, tile in pyramid.tiles(len(pyramid.levels) - 1, [0] * 3, [1500] * 3)) == 4498